@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark de categorize_component() : version courante (moteur de
+règles compilé depuis language_rules.json) contre une version de référence lue
+dans l'historique git. Vérifie aussi que les deux versions donnent les mêmes
+résultats sur le jeu de composants synthétique.
+
+Usage:
+    python scripts/bench_categorize.py [--components 200000] [--baseline-ref HEAD]
+
+--baseline-ref désigne le commit dont src/language_mappings.py sert de
+référence (ex: le commit précédant la modification mesurée).
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+import language_mappings  # noqa: E402
+
+RUNTIME_VERSIONS = {"go": "v1.24.11"}
+COMPONENT_TEMPLATES = [
+    ("pkg:deb/debian/lib{i}@1.{i}", "lib{i}"),
+    ("pkg:apk/alpine/busybox{i}@1.36.{i}-r0", "busybox{i}"),
+    ("pkg:rpm/redhat/openssl{i}@3.0.{i}", "openssl{i}"),
+    ("pkg:pypi/package{i}@2.{i}.0", "package{i}"),
+    ("pkg:npm/%40scope/module{i}@4.{i}.1", "@scope/module{i}"),
+    ("pkg:golang/github.com/org/mod{i}@v0.{i}.0", "github.com/org/mod{i}"),
+    ("pkg:golang/usr/local/go/bin/go{i}", "usr/local/go/bin/go{i}"),
+    ("pkg:maven/org.example/artifact{i}@1.{i}", "org.example:artifact{i}"),
+    ("pkg:cargo/crate{i}@0.{i}.0", "crate{i}"),
+    ("pkg:nuget/Package{i}@6.{i}.0", "Package{i}"),
+    ("", "usr/local/bin/tool{i}"),
+    ("", "debian"),
+]
+
+
+def load_baseline(ref: str):
+    """Charge src/language_mappings.py tel qu'au commit `ref` comme module indépendant"""
+    source = subprocess.run(
+        ["git", "show", f"{ref}:src/language_mappings.py"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    module = types.ModuleType("language_mappings_baseline")
+    module.__file__ = str(ROOT / "src" / "language_mappings.py")
+    exec(compile(source, f"{ref}:src/language_mappings.py", "exec"), module.__dict__)
+    return module
+
+
+def synthetic_components(count: int, templates=COMPONENT_TEMPLATES) -> list:
+    return [
+        (purl.format(i=i), name.format(i=i))
+        for i in range(count)
+        for purl, name in [templates[i % len(templates)]]
+    ]
+
+
+def measure(categorize, components) -> tuple[float, list]:
+    start = time.perf_counter()
+    results = [
+        categorize(purl, name, "docker-image", "Dockerfile (api)", RUNTIME_VERSIONS)
+        for purl, name in components
+    ]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--components", type=int, default=200_000)
+    parser.add_argument("--baseline-ref", default="HEAD")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline_ref)
+    components = synthetic_components(args.components)
+
+    baseline_time, baseline_results = measure(baseline.categorize_component, components)
+    current_time, current_results = measure(language_mappings.categorize_component, components)
+
+    if current_results != baseline_results:
+        print("❌ Résultats différents de la référence", file=sys.stderr)
+        return 1
+
+    print(f"Composants            : {args.components}")
+    print(f"Référence ({args.baseline_ref:>8}) : {baseline_time:.3f} s")
+    print(f"Courant               : {current_time:.3f} s  (x{baseline_time / current_time:.2f})")
+
+    # Détail par famille de composants
+    per_family = max(args.components // len(COMPONENT_TEMPLATES), 1)
+    print()
+    print(f"{'Famille':45} {'référence':>10} {'courant':>10}")
+    for template in COMPONENT_TEMPLATES:
+        family = synthetic_components(per_family, [template])
+        reference, _ = measure(baseline.categorize_component, family)
+        current, _ = measure(language_mappings.categorize_component, family)
+        label = template[0].split("{")[0] or template[1].split("{")[0]
+        print(f"{label:45} {reference * 1e6 / per_family:>8.2f}µs {current * 1e6 / per_family:>8.2f}µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark mémoire (tracemalloc) sur un même projet synthétique :
+
+- fusion : merge_sboms() d'une version de référence lue dans l'historique git
+  (documents chargés par son propre chargeur) contre la version courante
+  (documents lus un par un par iter_sbom_files(), chaînes répétées internées) ;
+- index de generate_metadata() : ref -> source et component_sources en dicts,
+  comme avant le modèle compact, contre load_source_sboms() et
+  categorize_merged_components() (SourceInfo partagés, ComponentSource).
+
+Usage:
+    python scripts/bench_memory.py [--components 1000000] [--baseline-ref HEAD]
+
+--baseline-ref désigne le commit dont src/merge_sbom.py sert de référence
+(ex: le commit précédant la modification mesurée).
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT))
+
+from language_mappings import categorize_component  # noqa: E402
+from merge_sbom import component_identity, iter_sbom_files, list_sbom_files, merge_sboms  # noqa: E402
+from metadata import categorize_merged_components, load_source_sboms, source_info_for  # noqa: E402
+from test.synthetic_sbom import SyntheticProject  # noqa: E402
+
+
+def load_baseline(ref: str):
+    """Charge src/merge_sbom.py tel qu'au commit `ref` comme module indépendant"""
+    source = subprocess.run(
+        ["git", "show", f"{ref}:src/merge_sbom.py"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    module = types.ModuleType("merge_sbom_baseline")
+    module.__file__ = str(ROOT / "src" / "merge_sbom.py")
+    exec(compile(source, f"{ref}:src/merge_sbom.py", "exec"), module.__dict__)
+    return module
+
+
+def measure(function, *args) -> tuple[int, int, object]:
+    """Pic et mémoire retenue (résultat encore vivant) d'un appel"""
+    tracemalloc.start()
+    result = function(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, retained, result
+
+
+def baseline_merge(module, sbom_dir: Path) -> dict:
+    """merge_sboms() de référence, alimenté comme par son propre main()"""
+    loader = getattr(module, "iter_sbom_files", None) or module.load_sbom_files
+    return module.merge_sboms(loader(sbom_dir))
+
+
+def current_merge(sbom_dir: Path) -> dict:
+    return merge_sboms(iter_sbom_files(sbom_dir))
+
+
+def dict_indexes(sbom_dir: Path, components: list) -> tuple[dict, dict]:
+    """ref -> source et component_sources en dicts, comme generate_metadata() avant le modèle compact"""
+    ref_to_source = {}
+    for sbom_file in list_sbom_files(sbom_dir):
+        with open(sbom_file, "r", encoding="utf-8") as f:
+            sbom = json.load(f)
+        source = source_info_for(sbom_file)
+        for component in sbom.get("components", []):
+            ref = component.get("bom-ref") or component.get("purl")
+            if ref and ref not in ref_to_source:
+                ref_to_source[ref] = {"source_type": source.source_type, "source_file": source.source_file}
+    component_sources = {}
+    unknown = {"source_type": "unknown", "source_file": "unknown"}
+    for component in components:
+        ref = component.get("bom-ref") or component.get("purl")
+        if not ref:
+            continue
+        source = ref_to_source.get(ref, unknown)
+        category = categorize_component(component.get("purl", ""), component.get("name", ""),
+                                        source["source_type"], source["source_file"], {})
+        component_sources[ref] = {
+            "package_name": component.get("name", ""),
+            "version": category.get("version", component.get("version")),
+            "purl": component.get("purl", ""),
+            "source_file": category["source_file"],
+            "source_type": category["source_type"],
+        }
+    return ref_to_source, component_sources
+
+
+def compact_indexes(sbom_dir: Path, components: list) -> tuple[dict, dict]:
+    _, ref_to_source = load_source_sboms(sbom_dir)
+    return ref_to_source, categorize_merged_components(components, ref_to_source, {})
+
+
+def mib(size: int) -> str:
+    return f"{size / 1024 / 1024:>9,.1f} MiB"
+
+
+def report(label: str, baseline: tuple, current: tuple) -> None:
+    print(f"{label}")
+    print(f"  pic      : référence {mib(baseline[0])}  courant {mib(current[0])}  "
+          f"({100 * (current[0] / baseline[0] - 1):+.1f} %)")
+    print(f"  retenu   : référence {mib(baseline[1])}  courant {mib(current[1])}  "
+          f"({100 * (current[1] / baseline[1] - 1):+.1f} %)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--components", type=int, default=1_000_000, help="Taille du projet synthétique")
+    parser.add_argument("--baseline-ref", default="HEAD")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline_ref)
+    with tempfile.TemporaryDirectory() as tmp:
+        sbom_dir = Path(tmp) / "sbom"
+        SyntheticProject(args.components, seed=args.components).write(sbom_dir)
+
+        merge_baseline = measure(baseline_merge, baseline, sbom_dir)
+        baseline_identities = [component_identity(c) for c in merge_baseline[2]["components"]]
+        merge_baseline = merge_baseline[:2]
+        merge_current = measure(current_merge, sbom_dir)
+        merged = merge_current[2]
+        if [component_identity(c) for c in merged["components"]] != baseline_identities:
+            print("❌ Composants fusionnés différents de la référence", file=sys.stderr)
+            return 1
+
+        # Les composants du SBOM fusionné sont alloués avant la mesure : seuls les index comptent
+        components = merged["components"]
+        indexes_dict = measure(dict_indexes, sbom_dir, components)[:2]
+        indexes_compact = measure(compact_indexes, sbom_dir, components)[:2]
+
+    print(f"Projet synthétique : {args.components:,} composants, {len(components):,} après fusion")
+    report(f"merge_sboms() ({args.baseline_ref} -> courant)", merge_baseline, merge_current[:2])
+    report("Index de generate_metadata() (dicts -> SourceInfo/ComponentSource)", indexes_dict, indexes_compact)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
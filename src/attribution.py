@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module maps package URLs to the dependency files (lockfiles) that
+declare them, so image components can be attributed to their real source.
+"""
+
+from merge_sbom import normalize_purl
+
+# Propriété ajoutée par trivy_scan.py aux SBOM de fichiers de dépendances (metadata.properties)
+SOURCE_FILE_PROPERTY = "fulltrivyscan:SourceFile"
+
+# Séparateur des chemins d'un purl déclaré par plusieurs fichiers, pour l'affichage (source_file)
+PATH_SEPARATOR = ", "
+
+
+def attribution_key(purl: str) -> str:
+    """Clé d'attribution : purl normalisé sans qualifiers ni subpath (pkg:maven/a/b@1?type=jar -> pkg:maven/a/b@1)"""
+    return normalize_purl(purl).partition("?")[0].partition("#")[0]
+
+
+def source_files(source_file) -> list:
+    """
+    Fichiers sources d'un source_file affiché (chemins joints par ", " quand
+    plusieurs fichiers de dépendances déclarent le paquet). Les clés (index
+    par fichier source, delta) portent sur chaque fichier, jamais sur la
+    chaîne jointe : ajouter un fichier de dépendances ne change pas les autres clés.
+    """
+    if not source_file:
+        return [source_file]
+    return source_file.split(PATH_SEPARATOR)
+
+
+def annotated_source_file(sbom: dict):
+    """Chemin du fichier de dépendances annoté dans metadata.properties d'un SBOM (None si absent)"""
+    for prop in (sbom.get("metadata") or {}).get("properties", []):
+        if prop.get("name") == SOURCE_FILE_PROPERTY:
+            return prop.get("value")
+    return None
+
+
+class LockfileIndex:
+    """
+    Index purl -> fichiers de dépendances qui le déclarent, construit une fois
+    par exécution depuis les SBOM des fichiers de dépendances.
+
+    `paths` peut être un dict ou un SpillDict (mode mémoire bornée). Les
+    chemins d'un même purl sont gardés en liste triée, joints par ", "
+    uniquement pour l'affichage (lookup).
+    """
+
+    def __init__(self, paths=None):
+        self._paths = {} if paths is None else paths
+
+    def __len__(self):
+        return len(self._paths)
+
+    def add(self, purl: str, source_file: str) -> None:
+        if not purl or not source_file:
+            return
+        key = attribution_key(purl)
+        known = self._paths.get(key)
+        if known is None:
+            self._paths[key] = [source_file]
+        elif source_file not in known:
+            # Réaffectation explicite : la liste n'est pas partagée si le mapping est sur disque
+            self._paths[key] = sorted([*known, source_file])
+
+    def paths(self, purl: str) -> list:
+        """Fichiers de dépendances déclarant `purl` (liste triée, vide si inconnu)"""
+        if not purl:
+            return []
+        return self._paths.get(attribution_key(purl)) or []
+
+    def lookup(self, purl: str):
+        """source_file affiché : fichier(s) de dépendances déclarant `purl`, joints par ", ", ou None"""
+        return PATH_SEPARATOR.join(self.paths(purl)) or None
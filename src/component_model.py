@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module provides a memory-compact internal model for components and their sources.
+
+The merge keeps CycloneDX component dicts (they are its output) and only
+interns their repeated strings; the slotted records back the ref -> source and
+component_sources indexes of metadata.py.
+"""
+
+import sys
+
+_intern = sys.intern
+
+
+def intern_str(value):
+    """Interne une chaîne (les autres valeurs sont retournées telles quelles)"""
+    return _intern(value) if isinstance(value, str) else value
+
+
+def intern_component(component: dict) -> dict:
+    """
+    Interne en place les champs très répétés d'un composant CycloneDX conservé
+    par merge_sboms() : type et noms/valeurs des propriétés (ex:
+    aquasecurity:trivy:PkgType). Le composant reste un dict.
+    """
+    if "type" in component:
+        component["type"] = intern_str(component["type"])
+    for prop in component.get("properties", ()):
+        if "name" in prop:
+            prop["name"] = intern_str(prop["name"])
+        if "value" in prop:
+            prop["value"] = intern_str(prop["value"])
+    return component
+
+
+class SourceInfo:
+    """Origine d'un composant (type de source + fichier source), partagée par tous les composants d'un SBOM"""
+
+    __slots__ = ("source_type", "source_file")
+
+    def __init__(self, source_type: str, source_file: str):
+        self.source_type = intern_str(source_type)
+        self.source_file = intern_str(source_file)
+
+    def __eq__(self, other):
+        if not isinstance(other, SourceInfo):
+            return NotImplemented
+        return self.source_type == other.source_type and self.source_file == other.source_file
+
+    def __hash__(self):
+        return hash((self.source_type, self.source_file))
+
+    def __repr__(self):
+        return f"SourceInfo({self.source_type!r}, {self.source_file!r})"
+
+    def as_tuple(self) -> tuple:
+        return (self.source_type, self.source_file)
+
+    def as_dict(self) -> dict:
+        return {"source_type": self.source_type, "source_file": self.source_file}
+
+
+UNKNOWN_SOURCE = SourceInfo("unknown", "unknown")
+
+
+class ComponentSource:
+    """Entrée compacte de component_sources, matérialisée en dict uniquement à la sérialisation"""
+
+    __slots__ = ("package_name", "version", "purl", "source_file", "source_type")
+
+    def __init__(self, package_name: str, version, purl: str, source_file: str, source_type: str):
+        self.package_name = package_name
+        self.version = intern_str(version)
+        self.purl = purl
+        self.source_file = intern_str(source_file)
+        self.source_type = intern_str(source_type)
+
+    def __eq__(self, other):
+        if not isinstance(other, ComponentSource):
+            return NotImplemented
+        return self.as_tuple() == other.as_tuple()
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __repr__(self):
+        return f"ComponentSource{self.as_tuple()!r}"
+
+    def as_tuple(self) -> tuple:
+        return (self.package_name, self.version, self.purl, self.source_file, self.source_type)
+
+    def as_dict(self) -> dict:
+        return {
+            "package_name": self.package_name,
+            "version": self.version,
+            "purl": self.purl,
+            "source_file": self.source_file,
+            "source_type": self.source_type,
+        }
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module compares two runs (metadata.json or SQLite snapshot) and reports
+new, resolved and changed vulnerable packages.
+"""
+
+import argparse
+import json
+import logging
+from pathlib import Path
+
+from attribution import source_files
+from json_stream import iter_fields, iter_items
+from metadata_db import iter_run_affected_packages, latest_run
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Champs d'en-tête de metadata.json identifiant une exécution
+RUN_FIELDS = ("generated_at", "repository", "branch", "commit", "run_id")
+
+# Champs dont la modification classe une entrée dans "changed"
+CHANGE_FIELDS = ("severity", "fix_status", "fixed_version")
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+
+def delta_key(row: dict) -> tuple:
+    """Clé d'une ligne paquet affecté : (id de vulnérabilité, purl, fichier source)"""
+    return (row.get("vulnerability_id"), row.get("purl"), row.get("source_file"))
+
+
+def iter_per_source_file(rows):
+    """Une ligne par fichier source : un paquet déclaré par plusieurs fichiers de dépendances est comparé fichier par fichier"""
+    for row in rows:
+        files = source_files(row.get("source_file"))
+        if len(files) == 1:
+            yield row
+            continue
+        for source_file in files:
+            yield dict(row, source_file=source_file)
+
+
+def iter_metadata_rows(metadata_path: Path):
+    """Lignes à plat (vulnérabilité + paquet affecté) d'un metadata.json, lu en flux"""
+    for vuln in iter_items(metadata_path, "vulnerabilities"):
+        for package in vuln.get("affected_packages", []):
+            yield {"vulnerability_id": vuln.get("vulnerability_id"), "severity": vuln.get("severity"), **package}
+
+
+def read_metadata_context(metadata_path: Path) -> dict:
+    """Champs d'en-tête d'un metadata.json, sans lire le reste du fichier"""
+    context = {}
+    for key, value in iter_fields(metadata_path, streamed=("vulnerabilities",)):
+        if key in RUN_FIELDS:
+            context[key] = value
+        if len(context) == len(RUN_FIELDS):
+            break
+    return context
+
+
+def is_sqlite(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+
+
+def load_run(path: Path, current: dict = None, exclude_run: int = None) -> tuple[dict, object]:
+    """
+    Contexte et lignes d'une exécution : metadata.json, ou base SQLite
+    (export --sqlite, dernière exécution enregistrée du dépôt et de la branche
+    de `current`, hors exécution courante). Contexte None si la base ne contient
+    aucune exécution retenue.
+    """
+    if is_sqlite(path):
+        context = latest_run(path, current, exclude_run)
+        if context is None:
+            return None, iter(())
+        run = context.pop("run")
+        return context, iter_run_affected_packages(path, run)
+    return read_metadata_context(path), iter_metadata_rows(path)
+
+
+def diff_runs(previous_rows, current_rows) -> dict:
+    """
+    Compare deux exécutions en temps linéaire (index haché sur delta_key).
+    Retourne {"new": [...], "resolved": [...], "changed": [...]} ; une entrée
+    "changed" porte la ligne courante et les valeurs précédentes des CHANGE_FIELDS modifiés.
+    Les lignes de plusieurs fichiers sources (source_file joint) sont comparées par fichier.
+    """
+    previous = {}
+    for row in iter_per_source_file(previous_rows):
+        previous.setdefault(delta_key(row), row)
+
+    new, changed = [], []
+    seen = set()
+    for row in iter_per_source_file(current_rows):
+        key = delta_key(row)
+        if key in seen:
+            continue
+        seen.add(key)
+        before = previous.pop(key, None)
+        if before is None:
+            new.append(row)
+            continue
+        changes = {field: before.get(field) for field in CHANGE_FIELDS if before.get(field) != row.get(field)}
+        if changes:
+            changed.append({**row, "previous": changes})
+
+    return {"new": new, "resolved": list(previous.values()), "changed": changed}
+
+
+def write_delta_report(previous_path: Path, current_path: Path, output: Path, exclude_run: int = None) -> dict:
+    """
+    Écrit delta.json (exécution précédente -> metadata.json courant) et retourne
+    le rapport. Sans référence (fichier absent ou vide, base sans exécution du
+    dépôt et de la branche : première exécution), toutes les entrées sont nouvelles.
+    `exclude_run` : identifiant de l'exécution courante si elle a déjà été
+    ajoutée à la base `previous_path`.
+    """
+    current_context, current_rows = load_run(current_path)
+    previous_context, previous_rows = None, iter(())
+    if previous_path.exists() and previous_path.stat().st_size > 0:
+        previous_context, previous_rows = load_run(previous_path, current_context, exclude_run)
+    if previous_context is None:
+        logger.warning(f"⚠️ Aucune exécution précédente dans {previous_path} : toutes les entrées sont nouvelles")
+    delta = diff_runs(previous_rows, current_rows)
+
+    report = {
+        "previous": previous_context,
+        "current": current_context,
+        "stats": {section: len(rows) for section, rows in delta.items()},
+        **delta,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    stats = report["stats"]
+    logger.info(
+        f"Δ {output} : {stats['new']} nouvelles, {stats['resolved']} résolues, {stats['changed']} modifiées"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare deux exécutions (metadata.json ou base SQLite) et écrit delta.json")
+    parser.add_argument("previous", type=Path, help="metadata.json ou base SQLite de l'exécution précédente")
+    parser.add_argument("current", type=Path, help="metadata.json de l'exécution courante")
+    parser.add_argument("--output", "-o", type=Path, default=Path("sbom/delta.json"), help="Rapport à écrire")
+    args = parser.parse_args()
+
+    write_delta_report(args.previous, args.current, args.output)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module caches Trivy vulnerability findings per component, keyed by
+normalised purl and Trivy DB version, so unchanged packages skip `trivy sbom`.
+"""
+
+import json
+import logging
+import sqlite3
+from pathlib import Path
+
+from merge_sbom import normalize_purl
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS findings (
+    purl TEXT NOT NULL,
+    db_version TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (purl, db_version)
+);
+"""
+
+
+def component_cache_key(component: dict):
+    """Clé de cache d'un composant : purl normalisé (None si pas de purl)"""
+    purl = component.get("purl")
+    return normalize_purl(purl) if purl else None
+
+
+class EnrichmentCache:
+    """
+    Cache persistant (SQLite) des résultats Trivy par composant.
+
+    Payload d'un composant :
+        {"vulnerabilities": [{"vulnerability": <vuln sans affects>, "affect": <affect sans ref>}],
+         "fixed_versions": {<VulnerabilityID>: <FixedVersion>}}
+    Un payload vide est aussi mis en cache : "aucune vulnérabilité" est un résultat.
+    """
+
+    def __init__(self, db_path: Path, db_version: str):
+        self.db_path = Path(db_path)
+        self.db_version = db_version
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_many(self, keys) -> dict:
+        """Retourne {clé: payload} pour les clés présentes dans le cache"""
+        keys = list(dict.fromkeys(key for key in keys if key))
+        found = {}
+        # Par lots pour rester sous la limite de paramètres SQLite
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT purl, payload FROM findings WHERE db_version = ? AND purl IN ({placeholders})",
+                [self.db_version, *batch],
+            )
+            for purl, payload in rows:
+                found[purl] = json.loads(payload)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, payloads: dict) -> None:
+        """Enregistre {clé: payload} pour la version de base courante"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO findings (purl, db_version, payload) VALUES (?, ?, ?)",
+                (
+                    (key, self.db_version, json.dumps(payload, ensure_ascii=False))
+                    for key, payload in payloads.items()
+                ),
+            )
+
+
+def split_findings(components: list, enriched_sbom: dict, trivy_vulnerabilities) -> dict:
+    """
+    Découpe les résultats Trivy d'un SBOM réduit (SBOM CycloneDX enrichi + vulnérabilités
+    du rapport JSON, voir iter_trivy_vulnerabilities) en payloads par composant.
+    Retourne {bom-ref: payload}.
+    """
+    payloads = {
+        component["bom-ref"]: {"vulnerabilities": [], "fixed_versions": {}}
+        for component in components
+        if component.get("bom-ref")
+    }
+    purl_to_ref = {
+        component_cache_key(component): component["bom-ref"]
+        for component in components
+        if component.get("bom-ref") and component.get("purl")
+    }
+
+    for vuln in enriched_sbom.get("vulnerabilities", []):
+        body = {key: value for key, value in vuln.items() if key != "affects"}
+        for affect in vuln.get("affects", []):
+            payload = payloads.get(affect.get("ref"))
+            if payload is not None:
+                affect_body = {key: value for key, value in affect.items() if key != "ref"}
+                payload["vulnerabilities"].append({"vulnerability": body, "affect": affect_body})
+
+    for vuln in trivy_vulnerabilities:
+        vuln_id = vuln.get("VulnerabilityID")
+        fixed_version = vuln.get("FixedVersion")
+        if not (vuln_id and fixed_version):
+            continue
+        identifier = vuln.get("PkgIdentifier", {})
+        ref = identifier.get("BOMRef")
+        if ref not in payloads and identifier.get("PURL"):
+            ref = purl_to_ref.get(normalize_purl(identifier["PURL"]))
+        if ref in payloads:
+            payloads[ref]["fixed_versions"][vuln_id] = fixed_version
+
+    return payloads
+
+
+def assemble_vulnerabilities(component_payloads: list) -> list:
+    """
+    Reconstruit la section vulnerabilities d'un SBOM depuis des couples
+    (bom-ref, payload) : une entrée par vulnérabilité, affects unifiés.
+    """
+    vulnerabilities = {}
+    for ref, payload in component_payloads:
+        for finding in payload.get("vulnerabilities", []):
+            body = finding["vulnerability"]
+            vuln_id = body.get("id")
+            vuln = vulnerabilities.get(vuln_id)
+            if vuln is None:
+                vuln = vulnerabilities[vuln_id] = dict(body, affects=[])
+            vuln["affects"].append(dict(finding.get("affect", {}), ref=ref))
+    return list(vulnerabilities.values())
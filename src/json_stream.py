@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module streams items out of large JSON documents (Trivy JSON reports,
+CycloneDX SBOMs) without loading the whole document in memory.
+"""
+
+import json
+import re
+from pathlib import Path
+
+try:
+    import ijson
+except ImportError:  # dépendance optionnelle
+    ijson = None
+
+# Champs conservés pour chaque vulnérabilité du rapport JSON Trivy
+TRIVY_VULNERABILITY_FIELDS = ("VulnerabilityID", "FixedVersion", "PkgIdentifier")
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+# Caractères pouvant suivre un nombre complet
+_NUMBER_DELIMITERS = frozenset(" \t\n\r,]}")
+
+
+class _Scanner:
+    """
+    Lecteur incrémental : la structure (objets/tableaux traversés) est parcourue
+    en Python, les valeurs elles-mêmes sont décodées par le décodeur C de json.
+    Seule la fenêtre de texte non consommée est gardée en mémoire.
+    """
+
+    def __init__(self, f, chunk_size: int = 1 << 16):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        if self._pos > len(self._buffer) // 2:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        # Lecture au moins égale au texte en attente : une valeur très longue est
+        # retentée un nombre logarithmique de fois
+        chunk = self._file.read(max(self._chunk_size, len(self._buffer) - self._pos))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def advance(self) -> str:
+        char = self.peek()
+        self._pos += 1
+        return char
+
+    def expect(self, char: str) -> None:
+        found = self.advance()
+        if found != char:
+            raise json.JSONDecodeError(f"'{char}' attendu, '{found}' trouvé", self._buffer, self._pos - 1)
+
+    def decode(self):
+        """Décode la valeur suivante (complète) et avance après elle"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # Un nombre non suivi d'un délimiteur peut être tronqué ("12." puis "5", "1e" puis "-3")
+            if (
+                isinstance(value, (int, float)) and not isinstance(value, bool)
+                and (end == len(self._buffer) or self._buffer[end] not in _NUMBER_DELIMITERS)
+                and self._fill()
+            ):
+                continue
+            self._pos = end
+            return value
+
+    def skip(self) -> None:
+        """Saute la valeur suivante sans la matérialiser en entier"""
+        char = self.peek()
+        if char == "[":
+            self.advance()
+            if self.peek() == "]":
+                self.advance()
+                return
+            while True:
+                self.skip()
+                if self._separator("]"):
+                    return
+        elif char == "{":
+            self.advance()
+            if self.peek() == "}":
+                self.advance()
+                return
+            while True:
+                self.decode()
+                self.expect(":")
+                self.skip()
+                if self._separator("}"):
+                    return
+        else:
+            self.decode()
+
+    def _separator(self, closing: str) -> bool:
+        """Consomme ',' ou le caractère fermant ; retourne True en fin de conteneur"""
+        char = self.advance()
+        if char == closing:
+            return True
+        if char != ",":
+            raise json.JSONDecodeError(f"',' ou '{closing}' attendu, '{char}' trouvé", self._buffer, self._pos - 1)
+        return False
+
+
+def _iter_object(scanner: _Scanner, keys: tuple):
+    if scanner.peek() != "{":
+        scanner.skip()
+        return
+    scanner.advance()
+    if scanner.peek() == "}":
+        scanner.advance()
+        return
+    while True:
+        key = scanner.decode()
+        scanner.expect(":")
+        if key == keys[0]:
+            yield from _iter_array(scanner, keys)
+        else:
+            scanner.skip()
+        if scanner._separator("}"):
+            return
+
+
+def _iter_array(scanner: _Scanner, keys: tuple):
+    if scanner.peek() != "[":
+        scanner.skip()
+        return
+    scanner.advance()
+    if scanner.peek() == "]":
+        scanner.advance()
+        return
+    while True:
+        if len(keys) == 1:
+            yield scanner.decode()
+        else:
+            yield from _iter_object(scanner, keys[1:])
+        if scanner._separator("]"):
+            return
+
+
+def iter_items(path: Path, *keys: str, backend: str = "auto"):
+    """
+    Itère sur les éléments du tableau désigné par `keys`, chaque clé intermédiaire
+    désignant un tableau d'objets parcouru élément par élément.
+
+    Exemple: iter_items("report.json", "Results", "Vulnerabilities") parcourt
+    Results[].Vulnerabilities[] ; iter_items("sbom.cdx.json", "components") parcourt components[].
+
+    backend : "builtin", "ijson" ou "auto" (ijson s'il est installé).
+    """
+    if not keys:
+        raise ValueError("Au moins une clé est nécessaire")
+    if backend == "auto":
+        backend = "ijson" if ijson is not None else "builtin"
+
+    if backend == "ijson":
+        if ijson is None:
+            raise ImportError("Le backend ijson nécessite le paquet ijson")
+        prefix = ".".join(f"{key}.item" for key in keys)
+        with open(path, "rb") as f:
+            yield from ijson.items(f, prefix, use_float=True)
+        return
+
+    if backend != "builtin":
+        raise ValueError(f"Backend inconnu : {backend}")
+    with open(path, "r", encoding="utf-8") as f:
+        yield from _iter_object(_Scanner(f), keys)
+
+
+def iter_fields(path: Path, streamed: tuple = ()):
+    """
+    Parcourt les champs de premier niveau d'un document JSON, dans l'ordre du fichier.
+    Les tableaux dont la clé est dans `streamed` sont renvoyés sous forme d'itérateur
+    (à consommer avant de passer au champ suivant, sinon le reste est sauté) ;
+    les autres valeurs sont décodées entièrement.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        scanner = _Scanner(f)
+        scanner.expect("{")
+        if scanner.peek() == "}":
+            return
+        while True:
+            key = scanner.decode()
+            scanner.expect(":")
+            if key in streamed and scanner.peek() == "[":
+                items = _iter_array(scanner, (key,))
+                yield key, items
+                for _ in items:
+                    pass
+            else:
+                yield key, scanner.decode()
+            if scanner._separator("}"):
+                return
+
+
+def iter_trivy_vulnerabilities(path: Path, backend: str = "auto"):
+    """Parcourt Results[].Vulnerabilities[] d'un rapport JSON Trivy en ne gardant que les champs utiles"""
+    for vuln in iter_items(path, "Results", "Vulnerabilities", backend=backend):
+        yield {field: vuln[field] for field in TRIVY_VULNERABILITY_FIELDS if field in vuln}
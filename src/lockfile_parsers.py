@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module parses common lockfiles in-process and builds CycloneDX SBOMs
+from them, as a fast alternative to `trivy fs` for dependency files.
+"""
+
+import json
+import re
+import tomllib
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote
+
+from attribution import SOURCE_FILE_PROPERTY
+
+PKG_TYPE_PROPERTY = "aquasecurity:trivy:PkgType"
+TOOL_NAME = "fulltrivyscan-lockfile-parser"
+
+# Caractères laissés tels quels dans les segments d'un purl
+_PURL_SAFE = "-._~+!"
+
+REQUIREMENT_PATTERN = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*===?\s*([^\s;#,]+)")
+GEMFILE_SPEC_PATTERN = re.compile(r"^    (\S+) \(([^)]+)\)$")
+
+
+def package_url(purl_type: str, name: str, version: str, namespace: str = None) -> str:
+    """purl d'un paquet : pkg:<type>/<namespace>/<name>@<version>, segments encodés"""
+    path = "/".join(quote(segment, safe=_PURL_SAFE) for segment in name.split("/"))
+    if namespace:
+        path = f"{quote(namespace, safe=_PURL_SAFE)}/{path}"
+    return f"pkg:{purl_type}/{path}@{quote(version, safe=_PURL_SAFE)}"
+
+
+def pypi_purl(name: str, version: str) -> str:
+    return package_url("pypi", re.sub(r"[-_.]+", "-", name).lower(), version)
+
+
+def npm_purl(name: str, version: str) -> str:
+    # @scope/name : le scope est le namespace (encodé %40scope)
+    if name.startswith("@") and "/" in name:
+        scope, _, bare = name.partition("/")
+        return package_url("npm", bare, version, namespace=scope)
+    return package_url("npm", name, version)
+
+
+def parse_requirements(path: Path):
+    """requirements.txt : dépendances épinglées (nom==version), ligne par ligne"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(("#", "-")):
+                continue
+            match = REQUIREMENT_PATTERN.match(line)
+            if match:
+                name, version = match.groups()
+                yield name, version, pypi_purl(name, version)
+
+
+def _npm_name_from_path(package_path: str) -> str:
+    # node_modules/a/node_modules/@scope/b -> @scope/b
+    return package_path.rsplit("node_modules/", 1)[-1]
+
+
+def _is_npm_dev(entry: dict) -> bool:
+    # Dépendances de développement, exclues comme Trivy
+    return bool(entry.get("dev") or entry.get("devOptional"))
+
+
+def _iter_npm_v1(dependencies: dict):
+    for name, entry in dependencies.items():
+        version = entry.get("version", "")
+        if version and not version.startswith(("file:", "link:")) and not _is_npm_dev(entry):
+            yield name, version
+        yield from _iter_npm_v1(entry.get("dependencies", {}))
+
+
+def parse_package_lock(path: Path):
+    """
+    package-lock.json : section packages (lockfileVersion 2/3) ou dependencies (v1),
+    hors dépendances de développement (dev/devOptional, exclues comme Trivy)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lock = json.load(f)
+    if "packages" in lock:
+        entries = (
+            (entry.get("name") or _npm_name_from_path(package_path), entry.get("version"))
+            for package_path, entry in lock["packages"].items()
+            # "" : le projet lui-même ; link : paquet local du workspace
+            if package_path and "node_modules/" in package_path and not entry.get("link") and not _is_npm_dev(entry)
+        )
+    else:
+        entries = _iter_npm_v1(lock.get("dependencies", {}))
+    for name, version in entries:
+        if version:
+            yield name, version, npm_purl(name, version)
+
+
+def _yarn_spec_name(spec: str) -> str:
+    # "@babel/core@^7.0.0" -> @babel/core ; "lodash@npm:^4.17.21" -> lodash
+    spec = spec.strip().strip('"')
+    at = spec.find("@", 1)
+    return spec[:at] if at > 0 else spec
+
+
+def _yarn_dependency_spec(line: str) -> str:
+    # v1 : `lodash "^4"` ; berry : `lodash: "npm:^4"` -> lodash@^4 / lodash@npm:^4
+    name, _, version_range = line.strip().partition(" ")
+    return name.rstrip(":").strip('"') + "@" + version_range.strip().strip('"')
+
+
+def _iter_yarn_entries(path: Path):
+    """(nom, version, spécificateurs du bloc, spécificateurs des dépendances) par bloc de yarn.lock"""
+    entry = None
+    in_dependencies = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            if not line[0].isspace():
+                if entry and entry[1]:
+                    yield entry
+                header = line.rstrip().rstrip(":")
+                specs = [spec.strip().strip('"') for spec in header.split(",")]
+                # __metadata (berry) et paquets du workspace ne sont pas des dépendances publiées
+                if specs[0].startswith("__metadata") or "@workspace:" in specs[0]:
+                    entry = None
+                else:
+                    entry = [_yarn_spec_name(specs[0]), None, specs, []]
+                in_dependencies = False
+                continue
+            if entry is None:
+                continue
+            stripped = line.strip()
+            if not line.startswith("    "):
+                in_dependencies = stripped.rstrip(":") in ("dependencies", "optionalDependencies")
+                if stripped.startswith("version ") or stripped.startswith("version:"):
+                    entry[1] = stripped[len("version"):].lstrip(" :").strip('"')
+            elif in_dependencies:
+                entry[3].append(_yarn_dependency_spec(stripped))
+    if entry and entry[1]:
+        yield entry
+
+
+def _yarn_production_entries(path: Path, entries: list):
+    """
+    Indices des blocs atteignables depuis dependencies/optionalDependencies du
+    package.json voisin, ou None si les dépendances de développement ne peuvent
+    pas être distinguées (pas de package.json, workspaces, racine introuvable)
+    """
+    manifest_path = path.with_name("package.json")
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("workspaces"):
+        return None
+    by_spec = {spec: index for index, entry in enumerate(entries) for spec in entry[2]}
+
+    def resolve(spec):
+        # package.json "^4" correspond à lodash@^4 (v1) ou lodash@npm:^4 (berry)
+        name, _, version_range = spec.rpartition("@")
+        return by_spec.get(spec, by_spec.get(f"{name}@npm:{version_range}"))
+
+    roots = {**manifest.get("dependencies", {}), **manifest.get("optionalDependencies", {})}
+    pending = []
+    for name, version_range in roots.items():
+        index = resolve(f"{name}@{version_range}")
+        if index is None:
+            return None
+        pending.append(index)
+    reachable = set()
+    while pending:
+        index = pending.pop()
+        if index in reachable:
+            continue
+        reachable.add(index)
+        pending.extend(found for found in map(resolve, entries[index][3]) if found is not None)
+    return reachable
+
+
+def parse_yarn_lock(path: Path):
+    """
+    yarn.lock (v1 et berry) : un bloc par ensemble de spécificateurs. Comme Trivy,
+    les paquets atteignables uniquement depuis devDependencies (package.json voisin)
+    sont exclus.
+    """
+    entries = list(_iter_yarn_entries(path))
+    production = _yarn_production_entries(path, entries)
+    for index, (name, version, _, _) in enumerate(entries):
+        if production is None or index in production:
+            yield name, version, npm_purl(name, version)
+
+
+def parse_go_sum(path: Path):
+    """go.sum : modules du build (lignes sans suffixe /go.mod), ligne par ligne"""
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 3 or parts[1].endswith("/go.mod"):
+                continue
+            module, version = parts[0], parts[1]
+            if (module, version) not in seen:
+                seen.add((module, version))
+                yield module, version, package_url("golang", module, version)
+
+
+def _toml_packages(path: Path) -> list:
+    with open(path, "rb") as f:
+        return tomllib.load(f).get("package", [])
+
+
+def parse_cargo_lock(path: Path):
+    """Cargo.lock : crates issues d'un registre ou d'un dépôt (hors crates du workspace)"""
+    for package in _toml_packages(path):
+        if package.get("source") and package.get("version"):
+            yield package["name"], package["version"], package_url("cargo", package["name"], package["version"])
+
+
+def parse_poetry_lock(path: Path):
+    """poetry.lock : une entrée [[package]] par dépendance"""
+    for package in _toml_packages(path):
+        if package.get("version"):
+            yield package["name"], package["version"], pypi_purl(package["name"], package["version"])
+
+
+def parse_composer_lock(path: Path):
+    """composer.lock : section packages (packages-dev exclus, comme Trivy)"""
+    with open(path, "r", encoding="utf-8") as f:
+        lock = json.load(f)
+    for package in lock.get("packages", []):
+        name, version = package.get("name"), package.get("version")
+        if name and version:
+            yield name, version, package_url("composer", name, version)
+
+
+def parse_gemfile_lock(path: Path):
+    """
+    Gemfile.lock : gems de la section GEM/specs (indentation de 4 espaces), ligne
+    par ligne, sans suffixe de plateforme ; une gem publiée pour plusieurs
+    plateformes n'est émise qu'une fois
+    """
+    seen = set()
+    in_specs = False
+    section = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.startswith(" "):
+                in_specs = False
+                section = line.strip()
+                continue
+            if line.strip() == "specs:":
+                in_specs = section == "GEM"
+                continue
+            match = GEMFILE_SPEC_PATTERN.match(line) if in_specs else None
+            if match:
+                name, version = match.groups()
+                # nokogiri (1.15.4-x86_64-linux) : la plateforme ne fait pas partie de la version
+                version = version.split("-", 1)[0]
+                if (name, version) not in seen:
+                    seen.add((name, version))
+                    yield name, version, package_url("gem", name, version)
+
+
+# Nom de fichier -> (parseur, PkgType Trivy)
+PARSERS = {
+    "requirements.txt": (parse_requirements, "pip"),
+    "requirements-dev.txt": (parse_requirements, "pip"),
+    "package-lock.json": (parse_package_lock, "npm"),
+    "yarn.lock": (parse_yarn_lock, "yarn"),
+    "go.sum": (parse_go_sum, "gomod"),
+    "Cargo.lock": (parse_cargo_lock, "cargo"),
+    "poetry.lock": (parse_poetry_lock, "poetry"),
+    "composer.lock": (parse_composer_lock, "composer"),
+    "Gemfile.lock": (parse_gemfile_lock, "bundler"),
+}
+
+
+def has_native_parser(dep_file: Path) -> bool:
+    return dep_file.name in PARSERS
+
+
+def build_lockfile_sbom(dep_file: Path, source_file: str) -> dict:
+    """
+    SBOM CycloneDX d'un fichier de dépendances, sans Trivy : un composant par
+    paquet (bom-ref = purl, dédupliqué), annoté avec `source_file` comme les
+    SBOM produits par trivy_scan.py. Sans vulnérabilités : elles sont ajoutées
+    par `trivy sbom` dans metadata.py.
+    """
+    parser, pkg_type = PARSERS[dep_file.name]
+    components = {}
+    for name, version, purl in parser(dep_file):
+        components.setdefault(purl, {
+            "bom-ref": purl,
+            "type": "library",
+            "name": name,
+            "version": version,
+            "purl": purl,
+            "properties": [{"name": PKG_TYPE_PROPERTY, "value": pkg_type}],
+        })
+    return {
+        "$schema": "http://cyclonedx.org/schema/bom-1.6.schema.json",
+        "bomFormat": "CycloneDX",
+        "specVersion": "1.6",
+        "serialNumber": f"urn:uuid:{uuid.uuid4()}",
+        "version": 1,
+        "metadata": {
+            "timestamp": datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+            "tools": {"components": [{"type": "application", "name": TOOL_NAME}]},
+            "component": {"bom-ref": str(uuid.uuid4()), "type": "application", "name": source_file},
+            "properties": [{"name": SOURCE_FILE_PROPERTY, "value": source_file}],
+        },
+        "components": list(components.values()),
+        "dependencies": [],
+    }
+
+
+def write_lockfile_sbom(dep_file: Path, source_file: str, out_file: Path) -> int:
+    """Écrit le SBOM natif de `dep_file` dans `out_file` ; retourne le nombre de composants"""
+    sbom = build_lockfile_sbom(dep_file, source_file)
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(sbom, f, indent=2)
+    return len(sbom["components"])
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module maintains a persistent SQLite merge index for incremental SBOM merges.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import sqlite3
+from pathlib import Path
+
+from merge_sbom import (
+    merge_properties, component_identity, merge_dependency, merge_vulnerability, new_merged_document, rekeyed_ref,
+)
+
+logger = logging.getLogger(__name__)
+
+# Incrémenté à chaque changement de schéma : un index d'une version antérieure est reconstruit
+SCHEMA_VERSION = 2
+
+TABLES = (
+    "inputs", "components", "vulnerabilities", "dependencies", "tools", "merged",
+    "merged_components", "merged_vulnerabilities", "merged_dependencies", "merged_tools",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inputs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS components (
+    input_id INTEGER NOT NULL REFERENCES inputs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    identity TEXT NOT NULL,
+    bom_ref TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_components_identity ON components(identity);
+CREATE INDEX IF NOT EXISTS idx_components_input ON components(input_id);
+CREATE TABLE IF NOT EXISTS vulnerabilities (
+    input_id INTEGER NOT NULL REFERENCES inputs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    vuln_id TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_vulnerabilities_id ON vulnerabilities(vuln_id);
+CREATE INDEX IF NOT EXISTS idx_vulnerabilities_input ON vulnerabilities(input_id);
+CREATE TABLE IF NOT EXISTS dependencies (
+    input_id INTEGER NOT NULL REFERENCES inputs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    dep_key TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_dependencies_key ON dependencies(dep_key);
+CREATE INDEX IF NOT EXISTS idx_dependencies_input ON dependencies(input_id);
+CREATE TABLE IF NOT EXISTS tools (
+    input_id INTEGER NOT NULL REFERENCES inputs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    tool_key TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tools_key ON tools(tool_key);
+CREATE INDEX IF NOT EXISTS idx_tools_input ON tools(input_id);
+CREATE TABLE IF NOT EXISTS merged_components (
+    identity TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS merged_vulnerabilities (
+    vuln_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS merged_dependencies (
+    dep_key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS merged_tools (
+    tool_key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS merged (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    body TEXT NOT NULL
+);
+"""
+
+# Table des lignes par entrée -> (table fusionnée, colonne clé)
+ROW_TABLES = {
+    "components": ("merged_components", "identity"),
+    "vulnerabilities": ("merged_vulnerabilities", "vuln_id"),
+    "dependencies": ("merged_dependencies", "dep_key"),
+    "tools": ("merged_tools", "tool_key"),
+}
+
+
+def file_sha256(path: Path) -> str:
+    """Calcule le hash SHA-256 du contenu d'un fichier"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _ref_key(ref, local_identities: dict):
+    """
+    Clé stable d'une référence (dependencies, affects) : "id:<identité>" si elle
+    désigne un composant du même SBOM, sinon "ref:<bom-ref>". La bom-ref finale
+    n'est résolue qu'à l'assemblage, elle peut changer sans réécrire les lignes.
+    """
+    if not ref:
+        return ref
+    identity = local_identities.get(ref)
+    return f"id:{identity}" if identity is not None else f"ref:{ref}"
+
+
+def _fold_component(rows: list) -> dict:
+    """Composant fusionné d'une identité : première occurrence, propriétés et bom-ref des suivantes"""
+    kept = json.loads(rows[0])
+    for body in rows[1:]:
+        component = json.loads(body)
+        merge_properties(kept, component)
+        if not kept.get("bom-ref") and component.get("bom-ref"):
+            kept["bom-ref"] = component["bom-ref"]
+    return kept
+
+
+def _fold_dependency(rows: list) -> dict:
+    seen, dependencies = {}, []
+    for body in rows:
+        dep = json.loads(body)
+        merge_dependency(seen, dependencies, dep, dep["ref"], dep.get("dependsOn", []))
+    return dependencies[0]
+
+
+def _fold_vulnerability(rows: list) -> dict:
+    seen, vulnerabilities = {}, []
+    for body in rows:
+        vuln = json.loads(body)
+        merge_vulnerability(seen, vulnerabilities, vuln, [(affect.get("ref"), affect) for affect in vuln.get("affects", [])])
+    return vulnerabilities[0]
+
+
+FOLDS = {
+    "components": _fold_component,
+    "vulnerabilities": _fold_vulnerability,
+    "dependencies": _fold_dependency,
+    "tools": lambda rows: json.loads(rows[0]),
+}
+
+
+class MergeIndex:
+    """
+    Index de fusion persistant (SQLite).
+
+    Chaque SBOM d'entrée est enregistré avec son hash de contenu ; ses composants
+    (clés par identité canonique), vulnérabilités, dépendances et outils sont stockés
+    ligne par ligne. L'index conserve aussi le résultat fusionné par clé (identité,
+    id de vulnérabilité, ref de dépendance, outil) : à chaque synchronisation, seules
+    les clés présentes dans les entrées ajoutées, modifiées ou retirées sont
+    recalculées, puis le SBOM fusionné est assemblé depuis ces lignes.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Index d'un format antérieur (ou neuf) : c'est un cache, il est reconstruit
+            with self.conn:
+                for table in TABLES:
+                    self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def sync(self, sbom_files: list) -> dict:
+        """
+        Synchronise l'index avec la liste des fichiers SBOM d'entrée.
+        Retourne les compteurs added / updated / removed / unchanged.
+        """
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        known = {
+            path: (input_id, size, mtime_ns, sha256)
+            for input_id, path, size, mtime_ns, sha256
+            in self.conn.execute("SELECT id, path, size, mtime_ns, sha256 FROM inputs")
+        }
+        current = {str(Path(sbom_file)): Path(sbom_file) for sbom_file in sbom_files}
+        touched = {table: set() for table in ROW_TABLES}
+
+        with self.conn:
+            for path in sorted(set(known) - set(current)):
+                self._remove_input(known[path][0], touched)
+                stats["removed"] += 1
+
+            for path, sbom_file in sorted(current.items()):
+                stat = sbom_file.stat()
+                previous = known.get(path)
+                if previous and previous[1] == stat.st_size and previous[2] == stat.st_mtime_ns:
+                    stats["unchanged"] += 1
+                    continue
+
+                sha256 = file_sha256(sbom_file)
+                if previous and previous[3] == sha256:
+                    self.conn.execute(
+                        "UPDATE inputs SET size = ?, mtime_ns = ? WHERE id = ?",
+                        (stat.st_size, stat.st_mtime_ns, previous[0]),
+                    )
+                    stats["unchanged"] += 1
+                    continue
+
+                if previous:
+                    self._remove_input(previous[0], touched)
+                    stats["updated"] += 1
+                else:
+                    stats["added"] += 1
+                self._insert_input(path, stat, sha256, sbom_file, touched)
+
+            if stats["added"] or stats["updated"] or stats["removed"]:
+                self.conn.execute("DELETE FROM merged")
+                refreshed = self._refresh(touched)
+                logger.info(f"Index de fusion : {refreshed} clés fusionnées recalculées")
+
+        logger.info(
+            f"Index de fusion : {stats['added']} ajoutés, {stats['updated']} modifiés, "
+            f"{stats['removed']} retirés, {stats['unchanged']} inchangés"
+        )
+        return stats
+
+    def _remove_input(self, input_id: int, touched: dict) -> None:
+        """Retire une entrée ; ses clés sont à recalculer"""
+        for table, (_, key_column) in ROW_TABLES.items():
+            touched[table].update(
+                key for key, in self.conn.execute(f"SELECT {key_column} FROM {table} WHERE input_id = ?", (input_id,))
+            )
+        self.conn.execute("DELETE FROM inputs WHERE id = ?", (input_id,))
+
+    def _insert_input(self, path: str, stat, sha256: str, sbom_file: Path, touched: dict) -> None:
+        """Décompose un SBOM d'entrée en lignes de l'index ; ses clés sont à recalculer"""
+        with open(sbom_file, "r", encoding="utf-8") as f:
+            sbom = json.load(f)
+
+        cursor = self.conn.execute(
+            "INSERT INTO inputs (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, sha256),
+        )
+        input_id = cursor.lastrowid
+
+        tool_rows = [
+            (input_id, position, f"{tool.get('name', '')}@{tool.get('version', '')}", json.dumps(tool))
+            for position, tool in enumerate(sbom.get("metadata", {}).get("tools", {}).get("components", []))
+        ]
+        # bom-ref locale -> identité (la première l'emporte, comme dans merge_sboms)
+        local_identities = {}
+        component_rows = []
+        for position, component in enumerate(sbom.get("components", [])):
+            identity = component_identity(component)
+            if component.get("bom-ref"):
+                local_identities.setdefault(component["bom-ref"], identity)
+            component_rows.append((input_id, position, identity, component.get("bom-ref"), json.dumps(component)))
+
+        dependency_rows = []
+        for position, dep in enumerate(sbom.get("dependencies", [])):
+            if not dep.get("ref"):
+                continue
+            dep_key = _ref_key(dep["ref"], local_identities)
+            dep = dict(dep, ref=dep_key)
+            if "dependsOn" in dep:
+                dep["dependsOn"] = [_ref_key(ref, local_identities) for ref in dep["dependsOn"]]
+            dependency_rows.append((input_id, position, dep_key, json.dumps(dep)))
+
+        vulnerability_rows = []
+        for position, vuln in enumerate(sbom.get("vulnerabilities", [])):
+            if not vuln.get("id"):
+                continue
+            if "affects" in vuln:
+                vuln = dict(vuln, affects=[
+                    dict(affect, ref=_ref_key(affect.get("ref"), local_identities)) if affect.get("ref") else affect
+                    for affect in vuln["affects"]
+                ])
+            vulnerability_rows.append((input_id, position, vuln["id"], json.dumps(vuln)))
+
+        for table, rows in (
+            ("tools", tool_rows), ("components", component_rows),
+            ("dependencies", dependency_rows), ("vulnerabilities", vulnerability_rows),
+        ):
+            touched[table].update(row[2] for row in rows)
+        self.conn.executemany("INSERT INTO tools (input_id, position, tool_key, body) VALUES (?, ?, ?, ?)", tool_rows)
+        self.conn.executemany(
+            "INSERT INTO components (input_id, position, identity, bom_ref, body) VALUES (?, ?, ?, ?, ?)", component_rows
+        )
+        self.conn.executemany(
+            "INSERT INTO dependencies (input_id, position, dep_key, body) VALUES (?, ?, ?, ?)", dependency_rows
+        )
+        self.conn.executemany(
+            "INSERT INTO vulnerabilities (input_id, position, vuln_id, body) VALUES (?, ?, ?, ?)", vulnerability_rows
+        )
+
+    def _refresh(self, touched: dict) -> int:
+        """Recalcule les lignes fusionnées des clés touchées, depuis les seules lignes qui les portent"""
+        refreshed = 0
+        for table, keys in touched.items():
+            if not keys:
+                continue
+            merged_table, key_column = ROW_TABLES[table]
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS touched_keys (key TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM touched_keys")
+            self.conn.executemany("INSERT INTO touched_keys (key) VALUES (?)", ((key,) for key in keys))
+            self.conn.execute(f"DELETE FROM {merged_table} WHERE {key_column} IN (SELECT key FROM touched_keys)")
+            rows = self.conn.execute(
+                f"SELECT t.{key_column}, inputs.path, t.position, t.body FROM {table} t "
+                f"JOIN inputs ON inputs.id = t.input_id "
+                f"WHERE t.{key_column} IN (SELECT key FROM touched_keys) "
+                f"ORDER BY t.{key_column}, inputs.path, t.position"
+            )
+            fold = FOLDS[table]
+            merged_rows = []
+            for key, group in itertools.groupby(rows, key=lambda row: row[0]):
+                group = list(group)
+                merged_rows.append((key, group[0][1], group[0][2], json.dumps(fold([row[3] for row in group]))))
+            self.conn.executemany(
+                f"INSERT INTO {merged_table} ({key_column}, path, position, body) VALUES (?, ?, ?, ?)", merged_rows
+            )
+            refreshed += len(keys)
+        return refreshed
+
+    def _assemble(self) -> dict:
+        """
+        Assemble le SBOM fusionné depuis les lignes fusionnées, dans l'ordre de
+        première occurrence (chemin, position) et avec les bom-ref régénérées de
+        merge_sboms() (rekeyed_ref) : même document qu'une fusion complète des
+        entrées triées par nom (list_sbom_files). L'assemblage relit toutes les
+        lignes fusionnées (O(N), comme l'écriture du SBOM) ; seul le calcul des
+        clés touchées est incrémental.
+        """
+        merged = new_merged_document()
+
+        def merged_rows(table, key_column):
+            return self.conn.execute(f"SELECT {key_column}, body FROM {table} ORDER BY path, position")
+
+        merged["metadata"]["tools"]["components"] = [
+            json.loads(body) for _, body in merged_rows("merged_tools", "tool_key")
+        ]
+
+        # bom-ref finale de chaque identité : en cas de collision, la première occurrence la garde
+        identity_refs = {}
+        claimed = set()
+        for identity, body in merged_rows("merged_components", "identity"):
+            component = json.loads(body)
+            ref = component.get("bom-ref")
+            if ref:
+                if ref in claimed:
+                    ref = component["bom-ref"] = rekeyed_ref(identity)
+                claimed.add(ref)
+                identity_refs[identity] = ref
+            merged["components"].append(component)
+
+        def resolve(key):
+            if not key:
+                return key
+            kind, _, value = key.partition(":")
+            return identity_refs.get(value, value) if kind == "id" else value
+
+        # Les clés sont résolues en bom-ref finales, puis unifiées comme dans merge_sboms
+        seen_dependencies = {}
+        for _, body in merged_rows("merged_dependencies", "dep_key"):
+            dep = json.loads(body)
+            depends_on = [resolve(key) for key in dep.get("dependsOn", [])]
+            merge_dependency(seen_dependencies, merged["dependencies"], dep, resolve(dep["ref"]), depends_on)
+
+        seen_vulnerabilities = {}
+        for _, body in merged_rows("merged_vulnerabilities", "vuln_id"):
+            vuln = json.loads(body)
+            affects = [(resolve(affect.get("ref")), affect) for affect in vuln.get("affects", [])]
+            merge_vulnerability(seen_vulnerabilities, merged["vulnerabilities"], vuln, affects)
+
+        if not merged["vulnerabilities"]:
+            del merged["vulnerabilities"]
+        return merged
+
+    def build_merged(self) -> dict:
+        """
+        Retourne le SBOM fusionné, assemblé depuis les lignes fusionnées de l'index.
+        S'il n'a pas changé depuis la dernière génération, le document mémorisé est
+        réutilisé avec un numéro de série et un horodatage neufs. Sans entrée, le
+        SBOM fusionné est vide (aucun composant).
+        """
+        row = self.conn.execute("SELECT body FROM merged WHERE id = 1").fetchone()
+        if row:
+            logger.info("Index de fusion inchangé : SBOM fusionné réutilisé")
+            merged = json.loads(row[0])
+            fresh = new_merged_document()
+            merged["serialNumber"] = fresh["serialNumber"]
+            merged["metadata"]["timestamp"] = fresh["metadata"]["timestamp"]
+            return merged
+
+        merged = self._assemble()
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO merged (id, body) VALUES (1, ?)", (json.dumps(merged),))
+        return merged
+
+    def find_component(self, identity: str) -> list:
+        """Retourne les chemins des SBOM d'entrée contenant un composant d'identité donnée"""
+        rows = self.conn.execute(
+            "SELECT DISTINCT inputs.path FROM components JOIN inputs ON inputs.id = components.input_id "
+            "WHERE components.identity = ? ORDER BY inputs.path",
+            (identity,),
+        )
+        return [path for path, in rows]
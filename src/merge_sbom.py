@@ -8,12 +8,22 @@ Licensed under the MIT License - see LICENSE file for details
 This module merges multiple CycloneDX SBOM files into a single consolidated SBOM.
 """
 
+import argparse
 import json
 from pathlib import Path
+from urllib.parse import unquote
 from datetime import datetime, timezone
 import uuid
 import os
 import logging
+import time
+
+from component_model import intern_component
+from sbom_io import index_path_for, write_sbom
+from slim_sbom import write_slim_sbom
+from metrics import write_metrics
+from profiling import enable_profiling, profile_stage, write_profiles
+from tracing import enable_tracing, span, write_trace
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,24 +31,171 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def list_sbom_files(sbom_dir: Path) -> list:
+    """
+    Liste les fichiers .cdx.json du dossier sbom/, hors SBOM fusionnés générés,
+    par nom : l'ordre de fusion (première occurrence conservée) est celui de
+    l'index de fusion (merge_index.py), quel que soit l'ordre du système de fichiers.
+    """
+    return sorted(
+        sbom_file for sbom_file in sbom_dir.glob("*.cdx.json")
+        if "merged-sbom" not in sbom_file.name
+    )
+
+def iter_sbom_files(sbom_dir: Path):
+    """Charge les fichiers .cdx.json un par un, pour que chaque document soit libéré après fusion"""
+    for sbom_file in list_sbom_files(sbom_dir):
+        with span("parse_sbom", file=sbom_file.name, bytes_read=sbom_file.stat().st_size) as s:
+            with open(sbom_file, 'r', encoding='utf-8') as f:
+                sbom = json.load(f)
+            s.set(components=len(sbom.get("components", [])))
+        yield sbom
+
 def load_sbom_files(sbom_dir: Path):
     """Charge tous les fichiers .cdx.json du dossier sbom/"""
-    sbom_files = list(sbom_dir.glob("*.cdx.json"))
+    sbom_files = list_sbom_files(sbom_dir)
     sboms = []
     for sbom_file in sbom_files:
         with open(sbom_file, 'r', encoding='utf-8') as f:
             sboms.append(json.load(f))
     return sboms
 
-def merge_sboms(sboms: list) -> dict:
-    """Fusionne plusieurs SBOM CycloneDX en un seul, sans doublons"""
-    if not sboms:
-        return {}
-    
+# Types purl dont le namespace et le nom sont insensibles à la casse
+CASE_INSENSITIVE_PURL_TYPES = {"pypi", "npm", "github", "bitbucket", "composer", "deb", "apk"}
+
+
+def normalize_purl(purl: str) -> str:
+    """
+    Normalise un purl pour servir de clé d'identité entre plusieurs SBOM.
+    Exemple: pkg:PyPI/Django_Rest@3.0?b=2&a=1 -> pkg:pypi/django-rest@3.0?a=1&b=2
+    """
+    purl = purl.strip()
+    if not purl.lower().startswith("pkg:"):
+        return purl
+
+    remainder = purl[4:].lstrip("/")
+    remainder, _, subpath = remainder.partition("#")
+    remainder, _, qualifiers = remainder.partition("?")
+
+    version = ""
+    at_index = remainder.rfind("@")
+    if at_index > remainder.rfind("/"):
+        remainder, version = remainder[:at_index], remainder[at_index + 1:]
+
+    purl_type, _, path = remainder.partition("/")
+    purl_type = purl_type.lower()
+    path = unquote(path.strip("/"))
+    if purl_type in CASE_INSENSITIVE_PURL_TYPES:
+        path = path.lower()
+    if purl_type == "pypi":
+        path = path.replace("_", "-")
+
+    normalized = f"pkg:{purl_type}/{path}"
+    if version:
+        normalized += f"@{unquote(version)}"
+    if qualifiers:
+        pairs = sorted(
+            (key.lower(), value)
+            for key, _, value in (item.partition("=") for item in qualifiers.split("&"))
+            if key and value
+        )
+        if pairs:
+            normalized += "?" + "&".join(f"{key}={value}" for key, value in pairs)
+    if subpath.strip("/"):
+        normalized += f"#{subpath.strip('/')}"
+    return normalized
+
+
+def component_identity(component: dict) -> str:
+    """
+    Identité canonique d'un composant : purl normalisé, sinon name@version@type.
+    Les bom-ref (UUID Trivy ou uuid4 des runtimes) ne sont jamais utilisés,
+    car ils diffèrent pour un même package d'une image à l'autre.
+    """
+    purl = component.get("purl")
+    if purl:
+        return normalize_purl(purl)
+    name = component.get("name", "")
+    version = component.get("version", "")
+    if not name and component.get("bom-ref"):
+        return component["bom-ref"]
+    return f"{name}@{version}@{component.get('type', 'library')}"
+
+
+# Espace de noms des bom-ref régénérées (collision entre identités) : stables d'une fusion à l'autre
+REF_NAMESPACE = uuid.UUID("5d1c8f2e-8a4b-4f57-9a53-3f4c0b0e6a11")
+
+
+def rekeyed_ref(identity: str) -> str:
+    """
+    bom-ref donnée à un composant dont la bom-ref est déjà portée par un autre
+    composant. Dérivée de son identité : metadata.py la recalcule depuis les SBOM
+    par source pour retrouver la source du composant.
+    """
+    return str(uuid.uuid5(REF_NAMESPACE, identity))
+
+
+def merge_properties(kept: dict, duplicate: dict) -> None:
+    """Ajoute au composant conservé les propriétés du doublon qu'il ne porte pas encore"""
+    new_properties = duplicate.get("properties")
+    if not new_properties:
+        return
+    properties = kept.get("properties", [])
+    known = {(prop.get("name"), prop.get("value")) for prop in properties}
+    added = [
+        prop for prop in new_properties
+        if (prop.get("name"), prop.get("value")) not in known
+    ]
+    if added:
+        kept["properties"] = properties + added
+
+
+def merge_dependency(seen: dict, dependencies: list, dep: dict, dep_ref: str, depends_on: list) -> None:
+    """
+    Ajoute une entrée `dependencies` (ref et dependsOn déjà réécrits) : la première
+    entrée d'une ref est conservée, les dependsOn suivants y sont unifiés.
+    `seen` : ref -> (entrée fusionnée, refs déjà présentes dans dependsOn).
+    """
+    entry = seen.get(dep_ref)
+    if entry is None:
+        merged_dep = dict(dep, ref=dep_ref)
+        if "dependsOn" in dep:
+            merged_dep["dependsOn"] = []
+        entry = seen[dep_ref] = (merged_dep, set())
+        dependencies.append(merged_dep)
+    merged_dep, targets = entry
+    for ref in depends_on:
+        if ref not in targets and ref != dep_ref:
+            targets.add(ref)
+            merged_dep.setdefault("dependsOn", []).append(ref)
+
+
+def merge_vulnerability(seen: dict, vulnerabilities: list, vuln: dict, affects: list) -> None:
+    """
+    Ajoute une vulnérabilité ; `affects` : paires (ref réécrite, affect d'origine).
+    La première occurrence d'un id est conservée, les affects suivants y sont unifiés.
+    `seen` : id -> (vulnérabilité fusionnée, refs déjà présentes dans affects).
+    """
+    vuln_id = vuln["id"]
+    entry = seen.get(vuln_id)
+    if entry is None:
+        merged_vuln = dict(vuln)
+        if "affects" in vuln:
+            merged_vuln["affects"] = []
+        entry = seen[vuln_id] = (merged_vuln, set())
+        vulnerabilities.append(merged_vuln)
+    merged_vuln, affect_refs = entry
+    for ref, affect in affects:
+        if ref in affect_refs:
+            continue
+        affect_refs.add(ref)
+        merged_vuln.setdefault("affects", []).append(dict(affect, ref=ref) if ref else affect)
+
+
+def new_merged_document() -> dict:
+    """Squelette du SBOM fusionné (numéro de série et horodatage neufs, listes vides)"""
     repo_full = os.environ.get('GITHUB_REPOSITORY', 'unknown/unknown')
-    
-    # Structure de base du SBOM fusionné
-    merged = {
+    return {
         "$schema": "http://cyclonedx.org/schema/bom-1.6.schema.json",
         "bomFormat": "CycloneDX",
         "specVersion": "1.6",
@@ -60,14 +217,34 @@ def merge_sboms(sboms: list) -> dict:
         "dependencies": [],
         "vulnerabilities": []
     }
+
+
+def merge_sboms(sboms: list) -> dict:
+    """
+    Fusionne plusieurs SBOM CycloneDX en un seul, sans doublons.
+
+    Les composants sont dédupliqués par identité canonique (voir component_identity).
+    Pour chaque SBOM, une table de réécriture bom-ref local -> bom-ref conservé est
+    construite, puis appliquée aux dépendances et aux `affects` des vulnérabilités.
+    
+    `sboms` peut être un itérable (ex: iter_sbom_files) : les documents sont alors
+    consommés un par un et seuls les composants conservés restent en mémoire.
+    """
+    
+    merged = new_merged_document()
     
     # Pour déduplication
-    seen_components = {}  # bom-ref ou purl -> component
-    seen_vulnerabilities = {}  # id -> vuln
-    seen_dependencies = {}  # ref -> dep
+    seen_components = {}  # identité canonique -> component
+    seen_vulnerabilities = {}  # id -> (vuln, refs déjà présents dans affects)
+    seen_dependencies = {}  # ref -> (dep, refs déjà présents dans dependsOn)
     seen_tools = {}  # name+version -> tool
+    emitted_refs = {}  # bom-ref conservé -> numéro du SBOM qui l'a introduit
+    collapsed = 0
+    rekeyed = 0
+    merged_count = 0
     
     for sbom in sboms:
+        merged_count += 1
         # Fusionner les outils
         if "metadata" in sbom and "tools" in sbom["metadata"]:
             tools_comps = sbom["metadata"]["tools"].get("components", [])
@@ -77,33 +254,65 @@ def merge_sboms(sboms: list) -> dict:
                     seen_tools[tool_key] = tool
                     merged["metadata"]["tools"]["components"].append(tool)
         
-        # Fusionner les composants
+        # Fusionner les composants et construire la table de réécriture des refs
+        ref_rewrite = {}  # bom-ref local -> bom-ref conservé dans le SBOM fusionné
         for component in sbom.get("components", []):
-            # Clé unique : bom-ref ou purl ou name+version
-            bom_ref = component.get("bom-ref")
-            purl = component.get("purl")
-            name = component.get("name", "")
-            version = component.get("version", "")
+            identity = component_identity(component)
+            local_ref = component.get("bom-ref")
+            kept = seen_components.get(identity)
             
-            comp_key = bom_ref or purl or f"{name}@{version}"
-            
-            if comp_key and comp_key not in seen_components:
-                seen_components[comp_key] = component
+            if kept is None:
+                # Copie : les documents d'entrée ne sont pas modifiés
+                component = dict(component)
+                if "properties" in component:
+                    component["properties"] = [dict(prop) for prop in component["properties"]]
+                if local_ref and local_ref in emitted_refs:
+                    # bom-ref déjà portée par un autre composant : nouvelle ref unique
+                    component["bom-ref"] = rekeyed_ref(identity)
+                    rekeyed += 1
+                    if emitted_refs[local_ref] != merged_count:
+                        # Les références de ce SBOM désignent ce composant, pas celui déjà conservé
+                        ref_rewrite[local_ref] = component["bom-ref"]
+                if component.get("bom-ref"):
+                    emitted_refs[component["bom-ref"]] = merged_count
+                seen_components[identity] = intern_component(component)
                 merged["components"].append(component)
+                continue
+            
+            collapsed += 1
+            merge_properties(kept, component)
+            if not kept.get("bom-ref") and local_ref:
+                kept["bom-ref"] = local_ref if local_ref not in emitted_refs else rekeyed_ref(identity)
+                emitted_refs[kept["bom-ref"]] = merged_count
+            canonical_ref = kept.get("bom-ref")
+            if local_ref and canonical_ref and local_ref != canonical_ref:
+                ref_rewrite[local_ref] = canonical_ref
         
-        # Fusionner les dépendances
+        # Fusionner les dépendances (refs réécrites)
         for dep in sbom.get("dependencies", []):
             dep_ref = dep.get("ref")
-            if dep_ref and dep_ref not in seen_dependencies:
-                seen_dependencies[dep_ref] = dep
-                merged["dependencies"].append(dep)
+            if not dep_ref:
+                continue
+            dep_ref = ref_rewrite.get(dep_ref, dep_ref)
+            depends_on = [ref_rewrite.get(ref, ref) for ref in dep.get("dependsOn", [])]
+            merge_dependency(seen_dependencies, merged["dependencies"], dep, dep_ref, depends_on)
         
-        # Fusionner les vulnérabilités (si présentes)
+        # Fusionner les vulnérabilités (si présentes), affects réécrits
         for vuln in sbom.get("vulnerabilities", []):
-            vuln_id = vuln.get("id")
-            if vuln_id and vuln_id not in seen_vulnerabilities:
-                seen_vulnerabilities[vuln_id] = vuln
-                merged["vulnerabilities"].append(vuln)
+            if not vuln.get("id"):
+                continue
+            affects = [
+                (ref_rewrite.get(affect.get("ref"), affect.get("ref")), affect) for affect in vuln.get("affects", [])
+            ]
+            merge_vulnerability(seen_vulnerabilities, merged["vulnerabilities"], vuln, affects)
+    
+    if not merged_count:
+        return {}
+    
+    if collapsed:
+        logger.info(f"Déduplication : {collapsed} composants fusionnés par identité canonique")
+    if rekeyed:
+        logger.info(f"Collisions de bom-ref : {rekeyed} composants distincts ont reçu une nouvelle bom-ref")
     
     # Nettoyer les listes vides
     if not merged["vulnerabilities"]:
@@ -111,7 +320,53 @@ def merge_sboms(sboms: list) -> dict:
     
     return merged
 
-if __name__ == "__main__":
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fusionne les SBOM CycloneDX du dossier sbom/")
+    parser.add_argument(
+        "--index", type=Path, default=None,
+        help="Index SQLite persistant pour une fusion incrémentale (créé si absent)",
+    )
+    parser.add_argument(
+        "--write-index", action="store_true",
+        help="Écrit un index des plages d'octets (bom-ref, purl, id de vulnérabilité) à côté du SBOM fusionné",
+    )
+    parser.add_argument(
+        "--slim", action="store_true",
+        help="Déplace description/advisories/references des vulnérabilités dans merged-sbom.vuln-text.json",
+    )
+    parser.add_argument(
+        "--trace", action="store_true",
+        help="Chronomètre chaque étape et l'ajoute à sbom/trace.json (Chrome trace) et sbom/trace-summary.txt",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Profile chaque étape : sbom/profile/*.pstats (cProfile) et *.memory.txt (tracemalloc, pic RSS)",
+    )
+    parser.add_argument(
+        "--metrics-file", type=Path, default=None,
+        help="Métriques de l'exécution au format texte Prometheus (collecteur textfile de node-exporter)",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Les métriques sont calculées à partir des étapes enregistrées
+    tracer = enable_tracing() if args.trace or args.metrics_file else None
+    if args.profile:
+        enable_profiling()
+    start = time.perf_counter()
+    try:
+        run_merge(args)
+    finally:
+        sbom_dir = Path.cwd() / "sbom"
+        if args.trace and sbom_dir.exists():
+            write_trace(sbom_dir, "merge_sbom")
+        if args.profile and sbom_dir.exists():
+            write_profiles(sbom_dir, "merge_sbom")
+        if args.metrics_file:
+            write_metrics(args.metrics_file, tracer.spans, "merge_sbom", time.perf_counter() - start)
+
+def run_merge(args):
     root_dir = Path.cwd()
     sbom_dir = root_dir / "sbom"
     
@@ -119,16 +374,33 @@ if __name__ == "__main__":
         logger.error(f"Dossier {sbom_dir} introuvable.")
         exit(1)
     
-    logger.info(f"Chargement des fichiers SBOM depuis : {sbom_dir}")
-    sboms = load_sbom_files(sbom_dir)
-    logger.info(f"Fichiers SBOM trouvés : {len(sboms)}")
-    
-    if not sboms:
-        logger.info("Aucun fichier SBOM à fusionner.")
-        exit(0)
-    
-    logger.info("Fusion des SBOM...")
-    merged_sbom = merge_sboms(sboms)
+    if args.index:
+        from merge_index import MergeIndex
+        
+        logger.info(f"Synchronisation de l'index de fusion : {args.index}")
+        with MergeIndex(args.index) as index:
+            with span("merge_index_sync", index=str(args.index)) as s, profile_stage("merge_index_sync"):
+                stats = index.sync(list_sbom_files(sbom_dir))
+                s.set(**stats)
+            if not any(stats.values()):
+                logger.info("Aucun fichier SBOM à fusionner.")
+                exit(0)
+            with span("merge", incremental=True) as s, profile_stage("merge"):
+                merged_sbom = index.build_merged()
+                s.set(components=len(merged_sbom.get("components", [])))
+    else:
+        logger.info(f"Chargement des fichiers SBOM depuis : {sbom_dir}")
+        sbom_files = list_sbom_files(sbom_dir)
+        logger.info(f"Fichiers SBOM trouvés : {len(sbom_files)}")
+        
+        if not sbom_files:
+            logger.info("Aucun fichier SBOM à fusionner.")
+            exit(0)
+        
+        logger.info("Fusion des SBOM...")
+        with span("merge", sboms=len(sbom_files)) as s, profile_stage("merge"):
+            merged_sbom = merge_sboms(iter_sbom_files(sbom_dir))
+            s.set(components=len(merged_sbom.get("components", [])))
     
     # Statistiques
     total_components = len(merged_sbom.get("components", []))
@@ -137,7 +409,17 @@ if __name__ == "__main__":
     
     # Sauvegarde du SBOM fusionné
     output_file = sbom_dir / "merged-sbom.cdx.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(merged_sbom, f, indent=2, ensure_ascii=False)
+    index_file = index_path_for(output_file) if args.write_index else None
+    with span("write_sbom", file=output_file.name, components=total_components) as s, profile_stage("write_sbom"):
+        if args.slim:
+            write_slim_sbom(merged_sbom, output_file, index_file)
+        else:
+            write_sbom(merged_sbom, output_file, index_file)
+        s.set(bytes_written=output_file.stat().st_size)
     
     logger.info(f"SBOM fusionné sauvegardé dans : {output_file}")
+    if index_file:
+        logger.info(f"Index des plages d'octets sauvegardé dans : {index_file}")
+
+if __name__ == "__main__":
+    main()
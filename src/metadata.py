@@ -8,11 +8,30 @@ Licensed under the MIT License - see LICENSE file for details
 This module generates enriched metadata from merged SBOMs with Trivy vulnerability data.
 """
 
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import json
 from pathlib import Path
 import os
 import subprocess
-from language_mappings import categorize_component, detect_runtime_versions
+import time
+from language_mappings import categorize_component, categorize_components, detect_runtime_versions_iter
+from merge_sbom import component_identity, list_sbom_files, normalize_purl, rekeyed_ref
+from enrichment_cache import EnrichmentCache, assemble_vulnerabilities, component_cache_key, split_findings
+from json_stream import iter_fields, iter_items, iter_trivy_vulnerabilities
+from metadata_db import UNKNOWN_RUN_ID, export_metadata_sqlite
+from delta_report import write_delta_report
+from component_model import ComponentSource, SourceInfo, UNKNOWN_SOURCE
+from severity import vulnerability_severity
+from sbom_io import JsonArrayStream, JsonObjectStream, SbomWriter, dump_streamed, index_path_for, write_sbom
+from slim_sbom import TextStoreWriter, owns_text_store, sbom_serial_number, slim_vulnerability, text_store_path_for
+from slim_sbom import write_slim_sbom
+from spill_store import SpillDict
+from attribution import LockfileIndex, annotated_source_file, source_files
+from metrics import write_metrics
+from profiling import enable_profiling, profile_stage, write_profiles
+from tracing import enable_tracing, span, write_trace
 import logging
 
 logging.basicConfig(
@@ -22,10 +41,82 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def run_trivy_sbom_enrichment(sbom_dir: Path) -> tuple[Path, dict]:
+def run_trivy_sbom(input_sbom: Path, output: Path, output_format: str) -> None:
+    """Lance `trivy sbom` (scanner vuln) sur un SBOM CycloneDX"""
+    with span("trivy_sbom", file=Path(input_sbom).name, format=output_format) as s:
+        subprocess.run(
+            [
+                "trivy", "sbom",
+                str(input_sbom),
+                "--scanners", "vuln",
+                "--format", output_format,
+                "--output", str(output),
+                "--skip-db-update",
+                "--quiet",
+            ],
+            check=True,
+        )
+        s.set(bytes_written=Path(output).stat().st_size)
+
+
+def trivy_db_version():
+    """
+    Retourne un identifiant de la base de vulnérabilités Trivy locale
+    (version du schéma + date de mise à jour), ou None si indéterminable.
+    """
+    try:
+        result = subprocess.run(
+            ["trivy", "version", "--format", "json"],
+            capture_output=True, text=True, check=True,
+        )
+        db = json.loads(result.stdout).get("VulnerabilityDB") or {}
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logger.warning(f"⚠️ Version de la base Trivy indéterminable : {e}")
+        return None
+    if not db.get("UpdatedAt"):
+        return None
+    return f"{db.get('Version', '')}:{db['UpdatedAt']}"
+
+
+def build_fixed_version_index(trivy_vulnerabilities, index: dict = None) -> dict:
+    """
+    Construit en une passe sur les vulnérabilités du rapport JSON Trivy
+    (Results[].Vulnerabilities[], voir iter_trivy_vulnerabilities) l'index
+    (VulnerabilityID, paquet) -> FixedVersion, où le paquet est identifié à la fois
+    par son BOMRef et par son purl normalisé (PkgIdentifier).
+    `index` permet de fournir le conteneur à remplir (ex: SpillDict).
+    """
+    index = {} if index is None else index
+    for vuln in trivy_vulnerabilities:
+        add_fixed_version(index, vuln.get("VulnerabilityID"), vuln.get("FixedVersion"), vuln.get("PkgIdentifier"))
+    return index
+
+
+def add_fixed_version(index: dict, vuln_id, fixed_version, pkg_identifier) -> None:
+    """Ajoute une entrée à l'index des versions corrigées (première valeur conservée)"""
+    if not (vuln_id and fixed_version and pkg_identifier):
+        return
+    if pkg_identifier.get("BOMRef"):
+        index.setdefault((vuln_id, pkg_identifier["BOMRef"]), fixed_version)
+    if pkg_identifier.get("PURL"):
+        index.setdefault((vuln_id, normalize_purl(pkg_identifier["PURL"])), fixed_version)
+
+
+def lookup_fixed_version(index: dict, vuln_id: str, ref: str, purl: str):
+    """Version corrigée d'une vulnérabilité pour un paquet donné (bom-ref puis purl), en O(1)"""
+    fixed_version = index.get((vuln_id, ref))
+    if fixed_version is None and purl:
+        fixed_version = index.get((vuln_id, normalize_purl(purl)))
+    return fixed_version
+
+
+def run_trivy_sbom_enrichment(sbom_dir: Path, cache_path: Path = None, fixed_version_index: dict = None) -> tuple[Path, dict]:
     """
     Enrichit le SBOM avec Trivy (fixed_version, status, etc.)
-    Retourne le SBOM enrichi + un mapping CVE -> FixedVersion
+    Retourne le SBOM enrichi + l'index (CVE, paquet) -> FixedVersion
+
+    Avec `cache_path`, seuls les composants absents du cache d'enrichissement
+    (clé : purl normalisé + version de la base Trivy) sont envoyés à Trivy.
     """
     input_sbom = sbom_dir / "merged-sbom.cdx.json"
     output_sbom = sbom_dir / "merged-sbom.enriched.cdx.json"
@@ -33,51 +124,92 @@ def run_trivy_sbom_enrichment(sbom_dir: Path) -> tuple[Path, dict]:
 
     print("🔎 Enrichissement SBOM via Trivy…")
 
+    if cache_path:
+        db_version = trivy_db_version()
+        if db_version:
+            with EnrichmentCache(cache_path, db_version) as cache:
+                fixed_version_index = run_cached_enrichment(sbom_dir, cache, fixed_version_index)
+            return output_sbom, fixed_version_index
+        logger.warning("⚠️ Cache d'enrichissement désactivé pour cette exécution")
+
     # Scan CycloneDX
-    subprocess.run(
-        [
-            "trivy", "sbom",
-            str(input_sbom),
-            "--scanners", "vuln",
-            "--format", "cyclonedx",
-            "--output", str(output_sbom),
-            "--skip-db-update",
-            "--quiet",
-        ],
-        check=True,
-    )
+    run_trivy_sbom(input_sbom, output_sbom, "cyclonedx")
 
     # Scan JSON pour extraire les FixedVersion
-    subprocess.run(
-        [
-            "trivy", "sbom",
-            str(input_sbom),
-            "--scanners", "vuln",
-            "--format", "json",
-            "--output", str(output_json),
-            "--skip-db-update",
-            "--quiet",
-        ],
-        check=True,
-    )
+    run_trivy_sbom(input_sbom, output_json, "json")
 
-    # Extraire les FixedVersion depuis le JSON
-    vuln_fixed_versions = {}
-    with open(output_json, "r", encoding="utf-8") as f:
-        trivy_json = json.load(f)
-    
-    for result in trivy_json.get("Results", []):
-        for vuln in result.get("Vulnerabilities", []):
-            vuln_id = vuln.get("VulnerabilityID")
-            fixed_version = vuln.get("FixedVersion")
-            if vuln_id and fixed_version:
-                # Stocker toutes les fixed versions pour cette CVE
-                if vuln_id not in vuln_fixed_versions:
-                    vuln_fixed_versions[vuln_id] = []
-                if fixed_version not in vuln_fixed_versions[vuln_id]:
-                    vuln_fixed_versions[vuln_id].append(fixed_version)
+    # Extraire les FixedVersion depuis le JSON, par (CVE, paquet), en flux
+    fixed_version_index = build_fixed_version_index(iter_trivy_vulnerabilities(output_json), fixed_version_index)
 
-    return output_sbom, vuln_fixed_versions
+    return output_sbom, fixed_version_index
+
+
+def run_cached_enrichment(sbom_dir: Path, cache: EnrichmentCache, fixed_version_index: dict = None) -> dict:
+    """
+    Enrichissement incrémental : les composants déjà en cache réutilisent leurs
+    résultats, les autres passent par Trivy dans un SBOM réduit puis sont mis en
+    cache. Trivy n'est pas lancé du tout si tous les composants sont en cache.
+    Les composants sans purl (composant operating-system, binaires…) n'ont pas de
+    clé : ils ne déclenchent pas Trivy mais accompagnent les composants à analyser
+    dans le SBOM réduit (l'OS est nécessaire à l'analyse des paquets système).
+    Écrit merged-sbom.enriched.cdx.json et retourne l'index (CVE, paquet) -> FixedVersion.
+    """
+    input_sbom = sbom_dir / "merged-sbom.cdx.json"
+    output_sbom = sbom_dir / "merged-sbom.enriched.cdx.json"
+
+    with open(input_sbom, "r", encoding="utf-8") as f:
+        sbom = json.load(f)
+    components = sbom.get("components", [])
+
+    with span("enrichment_cache_lookup", components=len(components)) as s:
+        keys = {id(component): component_cache_key(component) for component in components}
+        cached = cache.get_many(keys.values())
+        missing = [component for component in components if keys[id(component)] and keys[id(component)] not in cached]
+        s.set(hits=cache.hits, misses=len(missing))
+    logger.info(f"Cache d'enrichissement : {cache.hits} composants en cache, {len(missing)} à analyser")
+
+    fresh = {}
+    if missing:
+        reduced_sbom = sbom_dir / "merged-sbom.delta.cdx.json"
+        reduced_output = sbom_dir / "merged-sbom.delta.enriched.cdx.json"
+        reduced_json = sbom_dir / "merged-sbom.delta.enriched.json"
+        reduced = {key: value for key, value in sbom.items() if key not in ("dependencies", "vulnerabilities")}
+        reduced["components"] = [
+            component for component in components
+            if keys[id(component)] is None or keys[id(component)] not in cached
+        ]
+        write_sbom(reduced, reduced_sbom)
+
+        run_trivy_sbom(reduced_sbom, reduced_output, "cyclonedx")
+        run_trivy_sbom(reduced_sbom, reduced_json, "json")
+
+        with open(reduced_output, "r", encoding="utf-8") as f:
+            enriched = json.load(f)
+        fresh = split_findings(reduced["components"], enriched, iter_trivy_vulnerabilities(reduced_json))
+
+        cache.put_many({
+            keys[id(component)]: fresh[component["bom-ref"]]
+            for component in missing
+            if keys[id(component)] and component.get("bom-ref") in fresh
+        })
+    else:
+        logger.info("✅ Tous les composants sont en cache : Trivy n'est pas relancé")
+
+    component_payloads = []
+    fixed_version_index = {} if fixed_version_index is None else fixed_version_index
+    for component in components:
+        ref = component.get("bom-ref")
+        payload = cached.get(keys[id(component)]) or fresh.get(ref)
+        if ref and payload:
+            component_payloads.append((ref, payload))
+            identifier = {"BOMRef": ref, "PURL": component.get("purl")}
+            for vuln_id, fixed_version in payload["fixed_versions"].items():
+                add_fixed_version(fixed_version_index, vuln_id, fixed_version, identifier)
+
+    sbom["vulnerabilities"] = assemble_vulnerabilities(component_payloads)
+    write_sbom(sbom, output_sbom)
+
+    return fixed_version_index
 
 
 def detect_fix_status(fixed_version, version_infos):
@@ -94,153 +226,433 @@ def detect_fix_status(fixed_version, version_infos):
     return "unknown"
 
 
-def generate_metadata():
-    root_dir = Path.cwd()
-    sbom_dir = root_dir / "sbom"
-
-    # 🔥 Enrichissement Trivy (CycloneDX + JSON pour FixedVersion)
-    enriched_sbom_file, vuln_fixed_versions = run_trivy_sbom_enrichment(sbom_dir)
-
-    with open(enriched_sbom_file, "r", encoding="utf-8") as f:
-        merged_sbom = json.load(f)
+def source_info_for(sbom_file: Path, source_file: str = None) -> SourceInfo:
+    """
+    Détermine la source (image Docker ou fichier de dépendances) d'un SBOM par source.
+    `source_file` : chemin réel du fichier de dépendances annoté par trivy_scan.py
+    (à défaut, le nom du SBOM sans .cdx.json)
+    """
+    source_name = sbom_file.stem.replace(".cdx", "")
+    if source_file:
+        return SourceInfo("dependency-file", source_file)
+    if "-image" in sbom_file.name:
+        return SourceInfo("docker-image", f"Dockerfile ({source_name.replace('-image', '')})")
+    return SourceInfo("dependency-file", source_name)
 
-    component_sources = {}
-    runtime_versions = {}  # Cache pour les versions runtime détectées
 
-    # Première passe : détecter les versions runtime depuis tous les SBOMs
-    for sbom_file in sbom_dir.glob("*.cdx.json"):
-        if "merged-sbom" in sbom_file.name:
-            continue
+def _read_source_sbom(sbom_file: Path, stream: bool):
+    """
+    Produit une fois (SourceInfo, composants) pour un SBOM par source ; avec
+    `stream`, les composants sont lus en flux pendant que le fichier reste ouvert
+    (à consommer avant de reprendre le générateur).
+    """
+    if not stream:
         with open(sbom_file, "r", encoding="utf-8") as f:
             sbom = json.load(f)
-        detected = detect_runtime_versions(sbom)
-        if detected:
-            logger.info(f"  Détecté dans {sbom_file.name}: {detected}")
-        runtime_versions.update(detected)
-    
+        yield source_info_for(sbom_file, annotated_source_file(sbom)), sbom.get("components", [])
+        return
+
+    # metadata précède components dans les SBOM produits par Trivy
+    source_file = None
+    for key, value in iter_fields(sbom_file, streamed=("components",)):
+        if key == "metadata" and isinstance(value, dict):
+            source_file = annotated_source_file({"metadata": value})
+        elif key == "components":
+            yield source_info_for(sbom_file, source_file), value
+            return
+    yield source_info_for(sbom_file, source_file), []
+
+
+def load_source_sboms(sbom_dir: Path, ref_to_source: dict = None, attribution: LockfileIndex = None) -> tuple[dict, dict]:
+    """
+    Lit une seule fois chaque SBOM par source (hors SBOM fusionnés) et construit
+    dans la même passe :
+      - les versions runtime détectées (ex: {"go": "v1.24.11"})
+      - le mapping ref -> SourceInfo (première source rencontrée ; une bom-ref
+        déjà vue est aussi enregistrée sous sa ref régénérée, voir merge_sbom.rekeyed_ref)
+      - si `attribution` est fourni, l'index purl -> fichiers de dépendances
+        (SBOM de fichiers de dépendances uniquement)
+    Chaque document est libéré dès qu'il a été traité.
+
+    Si `ref_to_source` est fourni (ex: SpillDict), le mapping y est construit et
+    les composants sont lus en flux plutôt que document par document.
+    """
+    runtime_versions = {}
+    stream = ref_to_source is not None
+    ref_to_source = {} if ref_to_source is None else ref_to_source
+
+    for sbom_file in list_sbom_files(sbom_dir):
+        with span("parse_sbom", file=sbom_file.name, bytes_read=sbom_file.stat().st_size) as s:
+            for source, components in _read_source_sbom(sbom_file, stream):
+                # Une seule instance partagée par tous les composants de ce SBOM
+                attribute = attribution is not None and source.source_type == "dependency-file"
+                count = 0
+
+                def record_sources(components):
+                    nonlocal count
+                    for component in components:
+                        count += 1
+                        ref = component.get("bom-ref") or component.get("purl")
+                        if ref and ref not in ref_to_source:
+                            ref_to_source[ref] = source
+                        elif ref:
+                            # bom-ref déjà vue : si elle désigne un autre composant, la fusion
+                            # lui a donné la ref dérivée de son identité
+                            rekeyed = rekeyed_ref(component_identity(component))
+                            if rekeyed not in ref_to_source:
+                                ref_to_source[rekeyed] = source
+                        if attribute:
+                            attribution.add(component.get("purl"), source.source_file)
+                        yield component
+
+                # Détection des runtimes en un passage sur les composants : les index sont remplis au passage
+                detected = dict(detect_runtime_versions_iter(record_sources(components)))
+                if detected:
+                    logger.info(f"  Détecté dans {sbom_file.name}: {detected}")
+                runtime_versions.update(detected)
+                s.set(components=count)
+                del components
+
+    if attribution is not None:
+        logger.info(f"📌 Index d'attribution : {len(attribution)} purl(s) rattaché(s) à leurs fichiers de dépendances")
     if runtime_versions:
         logger.info(f"🔍 Versions runtime détectées (total) : {runtime_versions}")
     else:
         logger.warning("⚠️ Aucune version runtime détectée !")
 
-    # Créer un mapping ref -> source pour déterminer d'où vient chaque composant
-    ref_to_source = {}
-    for sbom_file in sbom_dir.glob("*.cdx.json"):
-        if "merged-sbom" in sbom_file.name:
-            continue
+    return runtime_versions, ref_to_source
 
-        source_name = sbom_file.stem.replace(".cdx", "")
 
-        if "-image" in sbom_file.name:
-            source_type = "docker-image"
-            source_file = f"Dockerfile ({source_name.replace('-image', '')})"
-        else:
-            source_type = "dependency-file"
-            source_file = source_name
+# Types dont le nom est réduit au nom du binaire (usr/local/go/bin/go -> go)
+CLEANED_NAME_TYPES = ("go-toolchain", "application-binary")
 
-        with open(sbom_file, "r", encoding="utf-8") as f:
-            sbom = json.load(f)
+# Nombre de composants par lot envoyé à un processus de catégorisation
+CATEGORIZE_CHUNK_SIZE = 5000
 
-        for component in sbom.get("components", []):
-            ref = component.get("bom-ref") or component.get("purl")
-            if ref and ref not in ref_to_source:
-                ref_to_source[ref] = {
-                    "source_type": source_type,
-                    "source_file": source_file,
-                }
 
-    # Deuxième passe : modifier les composants dans le SBOM fusionné
-    for component in merged_sbom.get("components", []):
-        ref = component.get("bom-ref") or component.get("purl")
-        name = component.get("name", "")
-        version = component.get("version")
-        purl = component.get("purl", "")
+def _categorized_fields(name: str, version, source_type: str, source_file: str, runtime_version) -> tuple:
+    """Tuple de categorize_fields à partir d'une catégorie (runtime_version : version enrichie ou None)"""
+    # Enrichir la version si disponible
+    enriched = runtime_version is not None
+    if enriched:
+        version = runtime_version
+    
+    # Nettoyer le nom du package pour les outils toolchain/binaires
+    clean_name = name
+    if source_type in CLEANED_NAME_TYPES:
+        clean_name = name.split("/")[-1] if "/" in name else name
+    
+    return clean_name, version, source_file, source_type, enriched
+
+
+def categorize_fields(name: str, version, purl: str, source_type: str, source_file: str, runtime_versions: dict,
+                      attribution: LockfileIndex = None) -> tuple:
+    """
+    Catégorisation pure d'un composant (sans effet de bord, exécutable dans un autre processus).
+    Retourne (nom nettoyé, version, fichier source, type de source, version enrichie ?)
+    """
+    category = categorize_component(purl, name, source_type, source_file, runtime_versions, attribution)
+    return _categorized_fields(name, version, category["source_type"], category["source_file"], category.get("version"))
+
+
+def categorize_batch(runs: list, runtime_versions: dict, attribution: LockfileIndex = None) -> list:
+    """
+    Catégorise un lot de composants découpé en séquences de même source :
+    `runs` liste les ((type de source, fichier source), composants), chaque
+    séquence passant en un appel à categorize_components.
+    Retourne les tuples de categorize_fields, dans l'ordre des composants.
+    """
+    fields = []
+    for source, components in runs:
+        columns = categorize_components(components, source, runtime_versions, attribution)
+        for component, source_type, source_file, runtime_version in zip(
+            components, columns["source_type"], columns["source_file"], columns["version"]
+        ):
+            fields.append(_categorized_fields(
+                component.get("name", ""), component.get("version"), source_type, source_file, runtime_version,
+            ))
+    return fields
+
+
+def apply_categorization(component: dict, ref: str, fields: tuple, counters: Counter = None):
+    """Reporte le résultat de categorize_fields sur le composant et retourne (ref, ComponentSource)"""
+    clean_name, version, source_file, source_type, enriched = fields
+    if enriched:
+        component["version"] = version
+    if source_type in CLEANED_NAME_TYPES:
+        component["name"] = clean_name
+    # Compteurs agrégés plutôt qu'une ligne de log par outil toolchain
+    if counters is not None and "toolchain" in source_type:
+        counters[source_type] += 1
+    return ref, ComponentSource(clean_name, version, component.get("purl", ""), source_file, source_type)
+
+
+def categorize_merged_component(component: dict, ref_to_source: dict, runtime_versions: dict, counters: Counter = None,
+                                attribution: LockfileIndex = None):
+    """
+    Catégorise un composant du SBOM fusionné (nom et version corrigés en place)
+    et retourne (ref, ComponentSource), ou None s'il n'a ni bom-ref ni purl
+    """
+    ref = component.get("bom-ref") or component.get("purl")
+    if not ref:
+        return None
         
+    # Récupérer la source d'origine
+    source_info = ref_to_source.get(ref, UNKNOWN_SOURCE)
+    fields = categorize_fields(
+        component.get("name", ""), component.get("version"), component.get("purl", ""),
+        source_info.source_type, source_info.source_file, runtime_versions, attribution,
+    )
+    return apply_categorization(component, ref, fields, counters)
+
+
+_worker_runtime_versions = {}
+_worker_attribution = None
+
+
+def _init_categorize_worker(runtime_versions: dict, attribution: LockfileIndex = None) -> None:
+    global _worker_runtime_versions, _worker_attribution
+    _worker_runtime_versions = runtime_versions
+    _worker_attribution = attribution
+
+
+def _categorize_chunk(runs: list) -> list:
+    return categorize_batch(runs, _worker_runtime_versions, _worker_attribution)
+
+
+def _categorization_chunks(components: list, ref_to_source: dict, chunk_size: int, minimal: bool = False):
+    """
+    Découpe les composants ayant une référence en lots (cibles, séquences) d'au
+    plus `chunk_size` composants. Une séquence regroupe des composants
+    consécutifs de même source : dans le SBOM fusionné, les composants d'un
+    même SBOM d'origine se suivent.
+    Avec `minimal`, seuls nom, version et purl sont copiés (lots envoyés à un autre processus).
+    """
+    targets, runs = [], []
+    current = run = None
+    for component in components:
+        ref = component.get("bom-ref") or component.get("purl")
         if not ref:
             continue
-            
-        # Récupérer la source d'origine
-        source_info = ref_to_source.get(ref, {"source_type": "unknown", "source_file": "unknown"})
-        
-        # Catégoriser le composant
-        category = categorize_component(purl, name, source_info["source_type"], source_info["source_file"], runtime_versions)
-        
-        # Debug pour les outils toolchain
-        if "toolchain" in category.get("source_type", ""):
-            logger.info(f"  🔧 Toolchain: {name} -> type={category['source_type']}, version={category.get('version', 'NONE')}")
-        
-        # Enrichir la version si disponible
-        if "version" in category:
-            version = category["version"]
-            component["version"] = version
-        
-        # Nettoyer le nom du package pour les outils toolchain/binaires
-        clean_name = name
-        if category["source_type"] in ["go-toolchain", "application-binary"]:
-            clean_name = name.split("/")[-1] if "/" in name else name
-            component["name"] = clean_name
-        
-        # Stocker dans component_sources
-        component_sources[ref] = {
-            "package_name": clean_name,
-            "version": version,
-            "purl": purl,
-            "source_file": category["source_file"],
-            "source_type": category["source_type"],
+        source = ref_to_source.get(ref, UNKNOWN_SOURCE)
+        if source is not current:
+            current, run = source, []
+            runs.append((source.as_tuple(), run))
+        targets.append((component, ref))
+        if minimal:
+            component = {"name": component.get("name", ""), "version": component.get("version"),
+                         "purl": component.get("purl", "")}
+        run.append(component)
+        if len(targets) >= chunk_size:
+            yield targets, runs
+            targets, runs = [], []
+            current = run = None
+    if targets:
+        yield targets, runs
+
+
+def log_categorization_counters(counters: Counter) -> None:
+    if counters:
+        summary = ", ".join(f"{source_type}={count}" for source_type, count in sorted(counters.items()))
+        logger.info(f"  🔧 Toolchains catégorisées : {summary}")
+
+
+def categorize_merged_components(components: list, ref_to_source: dict, runtime_versions: dict,
+                                 jobs: int = 1, chunk_size: int = CATEGORIZE_CHUNK_SIZE,
+                                 attribution: LockfileIndex = None) -> dict:
+    """
+    Catégorise les composants du SBOM fusionné (nom et version corrigés en place)
+    et retourne component_sources : ref -> ComponentSource
+
+    Avec `attribution`, les composants d'images rattachés à un fichier de
+    dépendances supposé (requirements.txt, package-lock.json…) le sont au(x)
+    fichier(s) de dépendances réel(s) déclarant le même purl.
+
+    Avec `jobs` > 1, la catégorisation est répartie par lots de `chunk_size`
+    composants sur un pool de processus ; les résultats sont réappliqués dans
+    l'ordre, d'où un résultat identique au mode séquentiel.
+    """
+    component_sources = {}
+    counters = Counter()
+
+    if jobs > 1 and len(components) > chunk_size:
+        chunks = list(_categorization_chunks(components, ref_to_source, chunk_size, minimal=True))
+        count = sum(len(targets) for targets, _ in chunks)
+        logger.info(f"Catégorisation de {count} composants en {len(chunks)} lots sur {jobs} processus")
+
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_categorize_worker,
+                                 initargs=(runtime_versions, attribution)) as executor:
+            results = executor.map(_categorize_chunk, [runs for _, runs in chunks])
+            for (targets, _), chunk_fields in zip(chunks, results):
+                for (component, ref), fields in zip(targets, chunk_fields):
+                    ref, source = apply_categorization(component, ref, fields, counters)
+                    component_sources[ref] = source
+    else:
+        for targets, runs in _categorization_chunks(components, ref_to_source, chunk_size):
+            for (component, ref), fields in zip(targets, categorize_batch(runs, runtime_versions, attribution)):
+                ref, source = apply_categorization(component, ref, fields, counters)
+                component_sources[ref] = source
+
+    log_categorization_counters(counters)
+    return component_sources
+
+
+class VulnerabilityRollup:
+    """
+    Index inversés précalculés pour metadata.json, alimentés pendant la
+    construction de la liste des vulnérabilités :
+      - component_vulnerabilities : ref du composant -> ids de vulnérabilités
+      - source_file_severity : fichier source (chacun, si plusieurs) -> nombre de paquets affectés par sévérité
+      - source_type_severity : type de source -> nombre de paquets affectés par sévérité
+    """
+
+    def __init__(self, component_vulnerabilities: dict = None):
+        # component_vulnerabilities peut être fourni déjà construit (ex: SpillDict)
+        self.component_vulnerabilities = {} if component_vulnerabilities is None else component_vulnerabilities
+        self.source_file_severity = {}
+        self.source_type_severity = {}
+
+    def add_affected(self, vuln_id: str, severity: str, ref: str, source_info: ComponentSource) -> None:
+        vuln_ids = self.component_vulnerabilities.get(ref) or []
+        if not vuln_ids or vuln_ids[-1] != vuln_id:
+            vuln_ids.append(vuln_id)
+            # Réaffectation explicite : la liste n'est pas partagée si le mapping est sur disque
+            self.component_vulnerabilities[ref] = vuln_ids
+        # Paquet déclaré par plusieurs fichiers de dépendances : compté pour chacun
+        for source_file in source_files(source_info.source_file):
+            counts = self.source_file_severity.setdefault(source_file, {})
+            counts[severity] = counts.get(severity, 0) + 1
+        counts = self.source_type_severity.setdefault(source_info.source_type, {})
+        counts[severity] = counts.get(severity, 0) + 1
+
+    def as_dict(self) -> dict:
+        return {
+            "component_vulnerabilities": self.component_vulnerabilities,
+            "source_file_severity": self.source_file_severity,
+            "source_type_severity": self.source_type_severity,
         }
 
-    vulnerabilities_metadata = []
 
-    for vuln in merged_sbom.get("vulnerabilities", []):
-        vuln_id = vuln.get("id")
-        affected_packages = []
-
-        for affect in vuln.get("affects", []):
-            ref = affect.get("ref")
-            if ref not in component_sources:
-                continue
-
-            source_info = component_sources[ref]
-            fixed_version = None
-
-            # Essayer d'abord depuis le CycloneDX
-            for v in affect.get("versions", []):
-                if v.get("status") in ["fixed", "unaffected"] and v.get("version"):
-                    fixed_version = v["version"]
-                    break
-
-            # Si pas trouvé, utiliser le JSON
-            if not fixed_version and vuln_id in vuln_fixed_versions:
-                # Prendre la première version disponible (ou les joindre si multiples)
-                fixed_versions_list = vuln_fixed_versions[vuln_id]
-                fixed_version = ", ".join(fixed_versions_list) if len(fixed_versions_list) > 1 else fixed_versions_list[0]
-
-            fix_status = detect_fix_status(fixed_version, affect.get("versions", []))
-
-            affected_packages.append({
-                "package_name": source_info["package_name"],
-                "installed_version": source_info["version"],
-                "fixed_version": fixed_version,
-                "fix_status": fix_status,
-                "source_file": source_info["source_file"],
-                "source_type": source_info["source_type"],
-                "purl": source_info["purl"],
-            })
-
-        if affected_packages:
-            vulnerabilities_metadata.append({
-                "vulnerability_id": vuln_id,
-                "affected_packages": affected_packages,
-            })
+def describe_vulnerability(vuln: dict, component_sources: dict, fixed_version_index: dict, rollup: VulnerabilityRollup = None):
+    """
+    Construit l'entrée metadata.json d'une vulnérabilité (None si aucun paquet
+    connu n'est affecté), en alimentant les index inversés au passage.
+    """
+    vuln_id = vuln.get("id")
+    severity = vulnerability_severity(vuln)
+    affected_packages = []
+
+    for affect in vuln.get("affects", []):
+        ref = affect.get("ref")
+        source_info = component_sources.get(ref)
+        if source_info is None:
+            continue
 
-    metadata = {
-        "generated_at": merged_sbom.get("metadata", {}).get("timestamp"),
+        fixed_version = None
+
+        # Essayer d'abord depuis le CycloneDX
+        for v in affect.get("versions", []):
+            if v.get("status") in ["fixed", "unaffected"] and v.get("version"):
+                fixed_version = v["version"]
+                break
+
+        # Si pas trouvé, utiliser le JSON (version corrigée propre à ce paquet)
+        if not fixed_version:
+            fixed_version = lookup_fixed_version(fixed_version_index, vuln_id, ref, source_info.purl)
+
+        fix_status = detect_fix_status(fixed_version, affect.get("versions", []))
+
+        affected_packages.append({
+            "package_name": source_info.package_name,
+            "installed_version": source_info.version,
+            "fixed_version": fixed_version,
+            "fix_status": fix_status,
+            "source_file": source_info.source_file,
+            "source_type": source_info.source_type,
+            "purl": source_info.purl,
+        })
+        if rollup is not None:
+            rollup.add_affected(vuln_id, severity, ref, source_info)
+
+    if not affected_packages:
+        return None
+    return {
+        "vulnerability_id": vuln_id,
+        "severity": severity,
+        "affected_packages": affected_packages,
+    }
+
+
+def run_context(generated_at) -> dict:
+    """Champs d'en-tête de metadata.json (horodatage du SBOM + contexte GitHub Actions)"""
+    return {
+        "generated_at": generated_at,
         "repository": os.environ.get("GITHUB_REPOSITORY", "unknown/unknown"),
         "branch": os.environ.get("GITHUB_REF_NAME", "unknown"),
         "commit": os.environ.get("GITHUB_SHA", "unknown"),
-        "run_id": os.environ.get("GITHUB_RUN_ID", "unknown"),
-        "component_sources": component_sources,
+        "run_id": os.environ.get("GITHUB_RUN_ID", UNKNOWN_RUN_ID),
+    }
+
+
+def write_run_delta(previous: Path, output: Path, delta_path: Path, sqlite_path: Path = None, run: int = None):
+    """
+    Écrit delta.json en dernier : metadata.json, la base SQLite et le SBOM
+    fusionné sont déjà à jour. Si la référence est la base --sqlite, l'exécution
+    courante qui vient d'y être ajoutée est exclue.
+    """
+    same_db = sqlite_path is not None and Path(previous).resolve() == Path(sqlite_path).resolve()
+    with span("delta_report", previous=str(previous)), profile_stage("delta_report"):
+        write_delta_report(previous, output, delta_path, run if same_db else None)
+
+
+def generate_metadata(enrichment_cache: Path = None, sqlite_path: Path = None, max_memory_entries: int = None,
+                      previous: Path = None, jobs: int = 1):
+    root_dir = Path.cwd()
+    sbom_dir = root_dir / "sbom"
+
+    if max_memory_entries is not None:
+        generate_metadata_out_of_core(sbom_dir, max_memory_entries, enrichment_cache, sqlite_path, previous)
+        return
+
+    # Première passe : une seule lecture de chaque SBOM par source
+    attribution = LockfileIndex()
+    with span("load_source_sboms"), profile_stage("load_source_sboms"):
+        runtime_versions, ref_to_source = load_source_sboms(sbom_dir, attribution=attribution)
+
+    # 🔥 Enrichissement Trivy (CycloneDX + JSON pour FixedVersion)
+    with span("enrichment", cached=enrichment_cache is not None), profile_stage("enrichment"):
+        enriched_sbom_file, fixed_version_index = run_trivy_sbom_enrichment(sbom_dir, enrichment_cache)
+
+    with (
+        span("parse_sbom", file=enriched_sbom_file.name, bytes_read=enriched_sbom_file.stat().st_size) as s,
+        profile_stage("parse_sbom"),
+    ):
+        with open(enriched_sbom_file, "r", encoding="utf-8") as f:
+            merged_sbom = json.load(f)
+        s.set(components=len(merged_sbom.get("components", [])))
+
+    # Deuxième passe : modifier les composants dans le SBOM fusionné
+    with span("categorize", components=len(merged_sbom.get("components", [])), jobs=jobs), profile_stage("categorize"):
+        component_sources = categorize_merged_components(
+            merged_sbom.get("components", []), ref_to_source, runtime_versions, jobs, attribution=attribution
+        )
+
+    # Troisième passe : vulnérabilités et index inversés, dans la même boucle
+    rollup = VulnerabilityRollup()
+    vulnerabilities_metadata = []
+    with span("vulnerabilities") as s, profile_stage("vulnerabilities"):
+        for vuln in merged_sbom.get("vulnerabilities", []):
+            record = describe_vulnerability(vuln, component_sources, fixed_version_index, rollup)
+            if record:
+                vulnerabilities_metadata.append(record)
+        s.set(vulnerabilities=len(vulnerabilities_metadata))
+
+    metadata = {
+        **run_context(merged_sbom.get("metadata", {}).get("timestamp")),
+        # Matérialisation des enregistrements compacts au moment de la sérialisation
+        "component_sources": {ref: source.as_dict() for ref, source in component_sources.items()},
         "vulnerabilities": vulnerabilities_metadata,
+        "indexes": rollup.as_dict(),
         "stats": {
             "total_components": len(component_sources),
             "total_vulnerabilities": len(vulnerabilities_metadata),
@@ -248,17 +660,213 @@ def generate_metadata():
     }
 
     output = sbom_dir / "metadata.json"
-    with open(output, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    with span("write_metadata", file=output.name) as s, profile_stage("write_metadata"):
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        s.set(bytes_written=output.stat().st_size)
+
+    run = None
+    if sqlite_path:
+        with span("sqlite_export", file=str(sqlite_path)), profile_stage("sqlite_export"):
+            run = export_metadata_sqlite(metadata, sqlite_path)
     
+    # L'index des plages d'octets et le fichier annexe, s'ils ont été demandés à la fusion, sont régénérés
     merged_sbom_original = sbom_dir / "merged-sbom.cdx.json"
-    with open(merged_sbom_original, "w", encoding="utf-8") as f:
-        json.dump(merged_sbom, f, indent=2, ensure_ascii=False)
+    merged_sbom_index = index_path_for(merged_sbom_original)
+    merged_sbom_index = merged_sbom_index if merged_sbom_index.exists() else None
+    # En mode allégé (fichier annexe écrit avec ce SBOM par merge_sbom.py --slim),
+    # les textes réintroduits par Trivy repartent dans le fichier annexe
+    slim = owns_text_store(merged_sbom_original)
+    with (
+        span("write_sbom", file=merged_sbom_original.name, components=len(component_sources)) as s,
+        profile_stage("write_sbom"),
+    ):
+        if slim:
+            write_slim_sbom(merged_sbom, merged_sbom_original, merged_sbom_index)
+        else:
+            write_sbom(merged_sbom, merged_sbom_original, merged_sbom_index)
+        s.set(bytes_written=merged_sbom_original.stat().st_size)
+
+    if previous:
+        write_run_delta(previous, output, sbom_dir / "delta.json", sqlite_path, run)
 
     logger.info("✨ metadata.json généré avec succès")
     logger.info(f"   • composants : {len(component_sources)}")
     logger.info(f"   • vulnérabilités : {len(vulnerabilities_metadata)}")
     logger.info("✨ SBOMs mis à jour avec les noms propres et versions enrichies")
 
+def generate_metadata_out_of_core(sbom_dir: Path, max_entries: int, enrichment_cache: Path = None, sqlite_path: Path = None,
+                                  previous: Path = None):
+    """
+    Mode mémoire bornée : mêmes fichiers que generate_metadata, octet pour octet.
+    Les index (ref -> source, ref -> ComponentSource, (CVE, paquet) -> FixedVersion,
+    ref -> vulnérabilités, purl -> fichiers de dépendances) basculent sur disque au-delà de `max_entries` entrées ;
+    le SBOM enrichi est lu en flux (deux passes) et metadata.json écrit
+    vulnérabilité par vulnérabilité.
+    """
+    with SpillDict(max_entries, sbom_dir, value_type=SourceInfo) as ref_to_source, \
+            SpillDict(max_entries, sbom_dir) as fixed_version_index, \
+            SpillDict(max_entries, sbom_dir, value_type=ComponentSource) as component_sources, \
+            SpillDict(max_entries, sbom_dir) as component_vulnerabilities, \
+            SpillDict(max_entries, sbom_dir) as lockfile_paths:
+
+        attribution = LockfileIndex(lockfile_paths)
+        with span("load_source_sboms", streamed=True), profile_stage("load_source_sboms"):
+            runtime_versions, _ = load_source_sboms(sbom_dir, ref_to_source, attribution)
+
+        with span("enrichment", cached=enrichment_cache is not None), profile_stage("enrichment"):
+            enriched_sbom_file, _ = run_trivy_sbom_enrichment(sbom_dir, enrichment_cache, fixed_version_index)
+
+        # Première passe sur le SBOM enrichi : catégorisation des composants et
+        # réécriture du SBOM fusionné au fil de l'eau
+        merged_sbom_original = sbom_dir / "merged-sbom.cdx.json"
+        merged_sbom_index = index_path_for(merged_sbom_original)
+        merged_sbom_index = merged_sbom_index if merged_sbom_index.exists() else None
+        store_path = text_store_path_for(merged_sbom_original)
+        text_store = None
+        if owns_text_store(merged_sbom_original):
+            text_store = TextStoreWriter(store_path, sbom_serial_number(enriched_sbom_file))
+
+        generated_at = None
+        counters = Counter()
+        with (
+            span("categorize", streamed=True) as s,
+            profile_stage("categorize"),
+            SbomWriter(merged_sbom_original, merged_sbom_index) as writer,
+        ):
+            for key, value in iter_fields(enriched_sbom_file, streamed=("components", "vulnerabilities")):
+                if key == "components":
+                    writer.begin_array(key)
+                    for component in value:
+                        categorized = categorize_merged_component(component, ref_to_source, runtime_versions, counters,
+                                                                  attribution)
+                        if categorized:
+                            ref, source = categorized
+                            component_sources[ref] = source
+                        writer.write_item(component)
+                    writer.end_array()
+                elif key == "vulnerabilities":
+                    writer.begin_array(key)
+                    for vuln in value:
+                        writer.write_item(slim_vulnerability(vuln, text_store) if text_store is not None else vuln)
+                    writer.end_array()
+                else:
+                    if key == "metadata" and isinstance(value, dict):
+                        generated_at = value.get("timestamp")
+                    writer.write_field(key, value)
+            s.set(components=len(component_sources))
+        log_categorization_counters(counters)
+        if text_store is not None:
+            text_store.close()
+            logger.info(f"Mode allégé : {len(text_store)} textes uniques déplacés dans {store_path}")
+
+        # Deuxième passe : vulnérabilités, écrites une par une dans metadata.json
+        rollup = VulnerabilityRollup(component_vulnerabilities)
+        total_vulnerabilities = 0
+
+        def vulnerability_records():
+            nonlocal total_vulnerabilities
+            for vuln in iter_items(enriched_sbom_file, "vulnerabilities"):
+                record = describe_vulnerability(vuln, component_sources, fixed_version_index, rollup)
+                if record:
+                    total_vulnerabilities += 1
+                    yield record
+
+        def metadata_fields():
+            yield from run_context(generated_at).items()
+            yield "component_sources", JsonObjectStream(component_sources, ComponentSource.as_dict)
+            yield "vulnerabilities", JsonArrayStream(vulnerability_records())
+            # Les index ne sont complets qu'une fois les vulnérabilités écrites
+            yield "indexes", {
+                "component_vulnerabilities": JsonObjectStream(rollup.component_vulnerabilities),
+                "source_file_severity": rollup.source_file_severity,
+                "source_type_severity": rollup.source_type_severity,
+            }
+            yield "stats", {
+                "total_components": len(component_sources),
+                "total_vulnerabilities": total_vulnerabilities,
+            }
+
+        output = sbom_dir / "metadata.json"
+        with span("write_metadata", file=output.name, streamed=True) as s, profile_stage("write_metadata"):
+            with open(output, "w", encoding="utf-8") as f:
+                dump_streamed(JsonObjectStream(metadata_fields()), f)
+            s.set(vulnerabilities=total_vulnerabilities, bytes_written=output.stat().st_size)
+
+        run = None
+        if sqlite_path:
+            with span("sqlite_export", file=str(sqlite_path)), profile_stage("sqlite_export"):
+                run = export_metadata_sqlite({
+                    **run_context(generated_at),
+                    "component_sources": JsonObjectStream(component_sources, ComponentSource.as_dict),
+                    "vulnerabilities": iter_items(output, "vulnerabilities"),
+                }, sqlite_path)
+
+        if previous:
+            write_run_delta(previous, output, sbom_dir / "delta.json", sqlite_path, run)
+
+        logger.info("✨ metadata.json généré avec succès (mémoire bornée)")
+        logger.info(f"   • composants : {len(component_sources)}")
+        logger.info(f"   • vulnérabilités : {total_vulnerabilities}")
+        logger.info("✨ SBOMs mis à jour avec les noms propres et versions enrichies")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Génère sbom/metadata.json depuis le SBOM fusionné enrichi par Trivy")
+    parser.add_argument(
+        "--enrichment-cache", type=Path, default=None,
+        help="Cache SQLite persistant des résultats Trivy par composant (purl + version de la base)",
+    )
+    parser.add_argument(
+        "--sqlite", type=Path, default=None,
+        help="Base SQLite à laquelle ajouter cette exécution (composants, vulnérabilités, paquets affectés)",
+    )
+    parser.add_argument(
+        "--previous", type=Path, default=None,
+        help="metadata.json ou base SQLite (--sqlite) de l'exécution précédente : écrit sbom/delta.json",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1,
+        help="Nombre de processus pour la catégorisation des composants (mode par défaut)",
+    )
+    parser.add_argument(
+        "--max-memory-entries", type=int, default=None,
+        help="Mode mémoire bornée : les index par composant basculent sur disque au-delà de ce nombre d'entrées",
+    )
+    parser.add_argument(
+        "--trace", action="store_true",
+        help="Chronomètre chaque étape et l'ajoute à sbom/trace.json (Chrome trace) et sbom/trace-summary.txt",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Profile chaque étape : sbom/profile/*.pstats (cProfile) et *.memory.txt (tracemalloc, pic RSS)",
+    )
+    parser.add_argument(
+        "--metrics-file", type=Path, default=None,
+        help="Métriques de l'exécution au format texte Prometheus (collecteur textfile de node-exporter)",
+    )
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    generate_metadata()
+    args = parse_args()
+    # Les métriques sont calculées à partir des étapes enregistrées
+    tracer = enable_tracing() if args.trace or args.metrics_file else None
+    if args.profile:
+        enable_profiling()
+    start = time.perf_counter()
+    try:
+        generate_metadata(
+            enrichment_cache=args.enrichment_cache,
+            sqlite_path=args.sqlite,
+            max_memory_entries=args.max_memory_entries,
+            previous=args.previous,
+            jobs=args.jobs,
+        )
+    finally:
+        if args.trace:
+            write_trace(Path.cwd() / "sbom", "metadata")
+        if args.profile:
+            write_profiles(Path.cwd() / "sbom", "metadata")
+        if args.metrics_file:
+            write_metrics(args.metrics_file, tracer.spans, "metadata", time.perf_counter() - start)
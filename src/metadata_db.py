@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module exports metadata.json content to a normalised SQLite database
+so that run history can be queried without reparsing JSON.
+"""
+
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    repository TEXT,
+    branch TEXT,
+    commit_sha TEXT,
+    run_id TEXT,
+    generated_at TEXT,
+    recorded_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS components (
+    run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    ref TEXT NOT NULL,
+    package_name TEXT,
+    version TEXT,
+    purl TEXT,
+    source_file TEXT,
+    source_type TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_components_run ON components(run);
+CREATE INDEX IF NOT EXISTS idx_components_purl ON components(purl);
+CREATE INDEX IF NOT EXISTS idx_components_source_file ON components(source_file);
+CREATE TABLE IF NOT EXISTS vulnerabilities (
+    run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    vulnerability_id TEXT NOT NULL,
+    severity TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_vulnerabilities_run ON vulnerabilities(run);
+CREATE INDEX IF NOT EXISTS idx_vulnerabilities_id ON vulnerabilities(vulnerability_id);
+CREATE TABLE IF NOT EXISTS affected_packages (
+    run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    vulnerability_id TEXT NOT NULL,
+    package_name TEXT,
+    installed_version TEXT,
+    fixed_version TEXT,
+    fix_status TEXT,
+    source_file TEXT,
+    source_type TEXT,
+    purl TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_affected_run ON affected_packages(run);
+CREATE INDEX IF NOT EXISTS idx_affected_vulnerability_id ON affected_packages(vulnerability_id);
+CREATE INDEX IF NOT EXISTS idx_affected_purl ON affected_packages(purl);
+CREATE INDEX IF NOT EXISTS idx_affected_source_file ON affected_packages(source_file);
+"""
+
+# run_id enregistré hors GitHub Actions (GITHUB_RUN_ID absent)
+UNKNOWN_RUN_ID = "unknown"
+
+AFFECTED_COLUMNS = (
+    "package_name", "installed_version", "fixed_version", "fix_status",
+    "source_file", "source_type", "purl",
+)
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    """Ouvre (et crée si besoin) la base de métadonnées"""
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def export_metadata_sqlite(metadata: dict, db_path: Path) -> int:
+    """
+    Ajoute une exécution (run) à la base SQLite : composants, vulnérabilités et
+    paquets affectés sont insérés par executemany dans une seule transaction.
+    `component_sources` peut être tout mapping, `vulnerabilities` tout itérable.
+    Retourne l'identifiant de l'exécution créée.
+    """
+    conn = connect(db_path)
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO runs (repository, branch, commit_sha, run_id, generated_at, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    metadata.get("repository"),
+                    metadata.get("branch"),
+                    metadata.get("commit"),
+                    metadata.get("run_id"),
+                    metadata.get("generated_at"),
+                    datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+                ),
+            )
+            run = cursor.lastrowid
+
+            conn.executemany(
+                "INSERT INTO components (run, ref, package_name, version, purl, source_file, source_type) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (run, ref, source.get("package_name"), source.get("version"), source.get("purl"),
+                     source.get("source_file"), source.get("source_type"))
+                    for ref, source in metadata.get("component_sources", {}).items()
+                ),
+            )
+
+            affected_rows = []
+
+            def vulnerability_rows():
+                for vuln in metadata.get("vulnerabilities", []):
+                    vuln_id = vuln.get("vulnerability_id")
+                    for package in vuln.get("affected_packages", []):
+                        affected_rows.append(
+                            (run, vuln_id, *(package.get(column) for column in AFFECTED_COLUMNS))
+                        )
+                    yield (run, vuln_id, vuln.get("severity"))
+
+            conn.executemany(
+                "INSERT INTO vulnerabilities (run, vulnerability_id, severity) VALUES (?, ?, ?)",
+                vulnerability_rows(),
+            )
+            conn.executemany(
+                f"INSERT INTO affected_packages (run, vulnerability_id, {', '.join(AFFECTED_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(AFFECTED_COLUMNS) + 2))})",
+                affected_rows,
+            )
+    finally:
+        conn.close()
+
+    logger.info(f"Exécution {run} ajoutée à la base de métadonnées : {db_path}")
+    return run
+
+
+def latest_run(db_path: Path, current: dict = None, exclude_run: int = None):
+    """
+    Contexte de la dernière exécution enregistrée (champs d'en-tête de
+    metadata.json), ou None. Avec `current` (contexte de l'exécution courante),
+    seules les exécutions du même dépôt et de la même branche sont retenues, et
+    l'exécution courante elle-même (même run_id GitHub Actions, ex: job relancé)
+    est exclue ; hors GitHub Actions (run_id "unknown"), seul `exclude_run`
+    (identifiant renvoyé par export_metadata_sqlite) l'exclut.
+    """
+    query = "SELECT id, generated_at, repository, branch, commit_sha, run_id FROM runs WHERE 1"
+    params = ()
+    if current is not None:
+        query += " AND repository IS ? AND branch IS ?"
+        params = (current.get("repository"), current.get("branch"))
+        if current.get("run_id") not in (None, UNKNOWN_RUN_ID):
+            query += " AND run_id IS NOT ?"
+            params += (current["run_id"],)
+    if exclude_run is not None:
+        query += " AND id != ?"
+        params += (exclude_run,)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        row = conn.execute(query + " ORDER BY id DESC LIMIT 1", params).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return {
+        "run": row[0],
+        "generated_at": row[1],
+        "repository": row[2],
+        "branch": row[3],
+        "commit": row[4],
+        "run_id": row[5],
+    }
+
+
+def iter_run_affected_packages(db_path: Path, run: int):
+    """
+    Paquets affectés d'une exécution, avec l'id et la sévérité de leur
+    vulnérabilité, dans l'ordre d'insertion. Chaque ligne est distincte, même
+    si la vulnérabilité a été enregistrée plusieurs fois pour l'exécution.
+    """
+    columns = ", ".join("a." + column for column in AFFECTED_COLUMNS)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            f"SELECT a.vulnerability_id, v.severity, {columns} "
+            "FROM affected_packages a "
+            "LEFT JOIN (SELECT vulnerability_id, MIN(severity) AS severity FROM vulnerabilities "
+            "WHERE run = ? GROUP BY vulnerability_id) v ON v.vulnerability_id = a.vulnerability_id "
+            f"WHERE a.run = ? GROUP BY a.vulnerability_id, {columns} ORDER BY MIN(a.rowid)",
+            (run, run),
+        )
+        for row in rows:
+            yield dict(zip(("vulnerability_id", "severity") + AFFECTED_COLUMNS, row))
+    finally:
+        conn.close()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module turns the recorded stage spans into Prometheus text-format
+metrics (counters, histograms, gauges) for a node-exporter textfile collector.
+"""
+
+import logging
+import os
+import re
+import time
+from pathlib import Path
+
+from profiling import peak_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "fulltrivyscan"
+
+# Bornes des histogrammes de durée, en secondes
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# Familles : nom -> (type, aide). Les noms sont stables : ne pas les renommer.
+FAMILIES = {
+    "fulltrivyscan_stage_duration_seconds": ("histogram", "Durée des étapes du pipeline"),
+    "fulltrivyscan_scan_duration_seconds": ("histogram", "Durée des analyses par type (fichier de dépendances, image…)"),
+    "fulltrivyscan_container_starts_total": ("counter", "Conteneurs démarrés (docker run) par usage"),
+    "fulltrivyscan_enrichment_cache_hits_total": ("counter", "Composants trouvés dans le cache d'enrichissement"),
+    "fulltrivyscan_enrichment_cache_misses_total": ("counter", "Composants absents du cache d'enrichissement"),
+    "fulltrivyscan_components_processed_total": ("counter", "Composants traités par étape"),
+    "fulltrivyscan_vulnerabilities_processed_total": ("counter", "Vulnérabilités traitées par étape"),
+    "fulltrivyscan_written_bytes_total": ("counter", "Octets écrits (SBOM, metadata.json) par étape"),
+    "fulltrivyscan_stage_errors_total": ("counter", "Étapes interrompues par une exception"),
+    "fulltrivyscan_peak_memory_bytes": ("gauge", "Pic de mémoire résidente (RSS) du processus"),
+    "fulltrivyscan_run_duration_seconds": ("gauge", "Durée totale de l'exécution du script"),
+    "fulltrivyscan_last_run_timestamp_seconds": ("gauge", "Fin de la dernière exécution (horodatage Unix)"),
+}
+
+# Étape -> type d'analyse (étiquette `kind` de fulltrivyscan_scan_duration_seconds)
+SCAN_KINDS = {
+    "scan_dependency_file": "dependency_file",
+    "docker_build": "image_build",
+    "scan_image": "image",
+    "runtime_probe": "runtime_probe",
+    "trivy_sbom": "sbom_enrichment",
+}
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r'\\(.)', lambda m: "\n" if m.group(1) == "n" else m.group(1), value)
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricSet:
+    """Échantillons (famille, nom, étiquettes, valeur) d'un ou plusieurs processus"""
+
+    def __init__(self):
+        self.families = dict(FAMILIES)
+        self.samples = {}  # (famille, nom, étiquettes triées) -> valeur
+
+    def add(self, family: str, value, suffix: str = "", **labels) -> None:
+        key = (family, family + suffix, tuple(sorted(labels.items())))
+        self.samples[key] = self.samples.get(key, 0) + value
+
+    def inc(self, family: str, value=1, **labels) -> None:
+        self.add(family, value, **labels)
+
+    def set(self, family: str, value, **labels) -> None:
+        self.samples[(family, family, tuple(sorted(labels.items())))] = value
+
+    def observe(self, family: str, value: float, **labels) -> None:
+        """Ajoute une observation à un histogramme (buckets cumulés, _sum, _count)"""
+        for bound in (*DURATION_BUCKETS, float("inf")):
+            self.add(family, 1 if value <= bound else 0, "_bucket", **labels, le=_format_value(bound))
+        self.add(family, value, "_sum", **labels)
+        self.add(family, 1, "_count", **labels)
+
+    def drop_process(self, process_name: str) -> None:
+        self.samples = {
+            key: value for key, value in self.samples.items() if ("process", process_name) not in key[2]
+        }
+
+    def render(self) -> str:
+        by_family = {}
+        for key, value in self.samples.items():
+            by_family.setdefault(key[0], []).append((key, value))
+        lines = []
+        for family in sorted(by_family):
+            kind, help_text = self.families.get(family, ("untyped", ""))
+            lines.append(f"# HELP {family} {_escape(help_text)}")
+            lines.append(f"# TYPE {family} {kind}")
+            for (_, name, labels), value in sorted(by_family[family], key=lambda item: _sort_key(item[0])):
+                label_text = ",".join(f'{label}="{_escape(str(text))}"' for label, text in labels)
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def parse(cls, text: str) -> "MetricSet":
+        """Relit un fichier écrit par render() (pour y fusionner les métriques d'un autre script)"""
+        metrics = cls()
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                family, _, help_text = line[7:].partition(" ")
+                kind = metrics.families.get(family, ("untyped", ""))[0]
+                metrics.families.setdefault(family, (kind, _unescape(help_text)))
+            elif line.startswith("# TYPE "):
+                family, _, kind = line[7:].partition(" ")
+                metrics.families[family] = (kind, metrics.families.get(family, ("", ""))[1])
+            elif line and not line.startswith("#"):
+                match = _SAMPLE.match(line)
+                if match is None or family is None:
+                    continue
+                name, label_text, value = match.groups()
+                labels = tuple(sorted((label, _unescape(text)) for label, text in _LABEL.findall(label_text or "")))
+                metrics.samples[(family, name, labels)] = float(value)
+        return metrics
+
+
+def _sort_key(key: tuple):
+    _, name, labels = key
+    # Buckets par borne croissante (+Inf en dernier), puis _sum et _count
+    other = tuple((label, text) for label, text in labels if label != "le")
+    bound = next((float(text) for label, text in labels if label == "le"), 0.0)
+    return other, name, bound
+
+
+def collect(spans: list, process_name: str, run_seconds: float) -> MetricSet:
+    """Métriques d'un processus à partir de ses étapes enregistrées (tracing.Span)"""
+    metrics = MetricSet()
+    process = {"process": process_name}
+    for span in spans:
+        seconds = span.duration_us / 1e6
+        attributes = span.attributes
+        stage = {**process, "stage": span.name}
+        if span.name == "probe_container":
+            metrics.inc("fulltrivyscan_container_starts_total", **process, kind="runtime_probe")
+            continue
+        metrics.observe("fulltrivyscan_stage_duration_seconds", seconds, **stage)
+        if span.name in SCAN_KINDS:
+            kind = SCAN_KINDS[span.name]
+            if span.name == "scan_dependency_file" and attributes.get("native"):
+                kind = "native_lockfile"
+            metrics.observe("fulltrivyscan_scan_duration_seconds", seconds, **process, kind=kind)
+        if span.name == "scan_dependency_file" and not attributes.get("native"):
+            metrics.inc("fulltrivyscan_container_starts_total", **process, kind="trivy_fs")
+        elif span.name == "scan_image":
+            metrics.inc("fulltrivyscan_container_starts_total", **process, kind="trivy_image")
+        elif span.name == "enrichment_cache_lookup":
+            metrics.inc("fulltrivyscan_enrichment_cache_hits_total", attributes.get("hits", 0), **process)
+            metrics.inc("fulltrivyscan_enrichment_cache_misses_total", attributes.get("misses", 0), **process)
+        if "components" in attributes:
+            metrics.inc("fulltrivyscan_components_processed_total", attributes["components"], **stage)
+        if "vulnerabilities" in attributes:
+            metrics.inc("fulltrivyscan_vulnerabilities_processed_total", attributes["vulnerabilities"], **stage)
+        if "bytes_written" in attributes:
+            metrics.inc("fulltrivyscan_written_bytes_total", attributes["bytes_written"], **stage)
+        if "error" in attributes:
+            metrics.inc("fulltrivyscan_stage_errors_total", **stage)
+
+    rss = peak_rss_bytes()
+    if rss is not None:
+        metrics.set("fulltrivyscan_peak_memory_bytes", rss, **process)
+    metrics.set("fulltrivyscan_run_duration_seconds", run_seconds, **process)
+    metrics.set("fulltrivyscan_last_run_timestamp_seconds", time.time(), **process)
+    return metrics
+
+
+def write_metrics(metrics_file: Path, spans: list, process_name: str, run_seconds: float) -> Path:
+    """
+    Écrit les métriques de ce processus dans `metrics_file` (format texte
+    Prometheus, étiquette `process`). Les métriques déjà présentes pour les
+    autres scripts sont conservées, celles d'une exécution précédente du même
+    script sont remplacées. Écriture atomique (fichier temporaire puis renommage)
+    pour le collecteur textfile de node-exporter.
+    """
+    metrics_file = Path(metrics_file)
+    metrics = MetricSet()
+    if metrics_file.exists():
+        metrics = MetricSet.parse(metrics_file.read_text(encoding="utf-8"))
+        metrics.drop_process(process_name)
+    metrics.samples.update(collect(spans, process_name, run_seconds).samples)
+
+    metrics_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = metrics_file.with_name(metrics_file.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(metrics.render())
+    os.replace(tmp_path, metrics_file)
+    logger.info(f"📈 Métriques écrites dans {metrics_file}")
+    return metrics_file
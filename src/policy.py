@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module evaluates a vulnerability policy (severity threshold, fixable-only
+filter, allow-list) against per-source SBOMs so that scanning can stop early.
+"""
+
+import json
+import logging
+from pathlib import Path
+
+from severity import SEVERITY_ORDER, vulnerability_severity
+
+logger = logging.getLogger(__name__)
+
+# Sévérités acceptées par --fail-on
+POLICY_SEVERITIES = ("critical", "high", "medium", "low")
+
+
+def is_fixable(vuln: dict) -> bool:
+    """
+    Une version corrigée est connue. Trivy (CycloneDX) ne marque les versions
+    qu'en statut `affected` et place le correctif dans `recommendation`
+    ("Upgrade <paquet> to version <version>") ; sa sortie JSON le donne dans
+    `FixedVersion`. Les SBOM CycloneDX d'autres outils peuvent aussi porter un
+    statut fixed/unaffected dans affects[].versions.
+    """
+    if vuln.get("recommendation") or vuln.get("FixedVersion"):
+        return True
+    for affect in vuln.get("affects", []):
+        for v in affect.get("versions", []):
+            if v.get("status") in ["fixed", "unaffected"] and v.get("version"):
+                return True
+    return False
+
+
+def load_allow_list(allow: list = None, allow_file: Path = None) -> set:
+    """Ids autorisés : liste + fichier (un id par ligne, # pour les commentaires)"""
+    allowed = set(allow or [])
+    if allow_file:
+        with open(allow_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    allowed.add(line)
+    return allowed
+
+
+class Policy:
+    """Politique bloquante : sévérité minimale, uniquement les vulnérabilités corrigeables, ids autorisés"""
+
+    def __init__(self, fail_on: str, fixable_only: bool = False, allow: set = None):
+        if fail_on not in POLICY_SEVERITIES:
+            raise ValueError(f"Sévérité inconnue : {fail_on}")
+        self.fail_on = fail_on
+        self.fixable_only = fixable_only
+        self.allow = set(allow or ())
+        self._blocking = set(SEVERITY_ORDER[:SEVERITY_ORDER.index(fail_on) + 1])
+
+    def violations(self, sbom: dict) -> list:
+        """Vulnérabilités du SBOM qui enfreignent la politique"""
+        found = []
+        for vuln in sbom.get("vulnerabilities", []):
+            vuln_id = vuln.get("id")
+            if vuln_id in self.allow:
+                continue
+            severity = vulnerability_severity(vuln)
+            if severity not in self._blocking:
+                continue
+            fixable = is_fixable(vuln)
+            if self.fixable_only and not fixable:
+                continue
+            found.append({
+                "vulnerability_id": vuln_id,
+                "severity": severity,
+                "fixable": fixable,
+                "affects": [affect.get("ref") for affect in vuln.get("affects", [])],
+            })
+        return found
+
+    def as_dict(self) -> dict:
+        return {"fail_on": self.fail_on, "fixable_only": self.fixable_only, "allow": sorted(self.allow)}
+
+
+class PolicyGate:
+    """
+    Vérifie chaque SBOM par source dès qu'il est produit et tient à jour ce qui a
+    été analysé ou non, pour le rapport partiel écrit en cas d'arrêt anticipé.
+    """
+
+    def __init__(self, policy: Policy, pending: list):
+        self.policy = policy
+        # (type, chemin) des sources restant à analyser
+        self.pending = list(pending)
+        self.scanned = []
+        self.violations = []
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.violations)
+
+    def check(self, kind: str, source: str, sbom_path: Path) -> bool:
+        """Évalue le SBOM d'une source ; retourne True si la politique est enfreinte"""
+        with open(sbom_path, "r", encoding="utf-8") as f:
+            sbom = json.load(f)
+        found = self.policy.violations(sbom)
+        self.pending = [entry for entry in self.pending if entry != (kind, source)]
+        self.scanned.append({"kind": kind, "source": source, "sbom": str(sbom_path), "violations": len(found)})
+        for violation in found:
+            self.violations.append({**violation, "source": source})
+        if found:
+            logger.error(f"⛔ Politique enfreinte par {source} : {', '.join(v['vulnerability_id'] for v in found)}")
+        return bool(found)
+
+    def report(self) -> dict:
+        return {
+            "policy": self.policy.as_dict(),
+            "status": "failed" if self.failed else "passed",
+            "scanned": self.scanned,
+            "not_scanned": [{"kind": kind, "source": source} for kind, source in self.pending],
+            "violations": self.violations,
+        }
+
+    def write_report(self, path: Path) -> dict:
+        report = self.report()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(
+            f"Rapport de politique ({report['status']}) : {len(self.scanned)} sources analysées, "
+            f"{len(self.pending)} non analysées -> {path}"
+        )
+        return report
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module profiles the pipeline stages: one cProfile pstats file per stage
+and a tracemalloc report (top allocation sites, peak RSS) per script.
+"""
+
+import contextlib
+import cProfile
+import logging
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = "profile"
+TOP_ALLOCATIONS = 25
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def peak_rss_bytes():
+    """Pic de mémoire résidente du processus (None si indisponible sur la plateforme)"""
+    if resource is None:
+        return None
+    # ru_maxrss est en Kio sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageStats:
+    """Mesures d'une étape : durée, pic tracemalloc, mémoire retenue et principaux sites d'allocation"""
+
+    __slots__ = ("name", "calls", "seconds", "peak_traced", "current_traced", "peak_rss", "top")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak_traced = 0
+        self.current_traced = 0
+        self.peak_rss = None
+        self.top = []
+
+
+class Profiler:
+    """
+    Profile les étapes d'un processus. Un profil cProfile par étape (cumulé si
+    l'étape est répétée) ; tracemalloc est actif du début à la fin. Les étapes
+    imbriquées dans une étape déjà profilée sont comptées dans l'étape parente.
+    """
+
+    def __init__(self, top: int = TOP_ALLOCATIONS):
+        self.top = top
+        self.profiles = {}
+        self.stages = {}
+        self._active = None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        if self._active is not None:
+            yield
+            return
+        profile = self.profiles.get(name)
+        if profile is None:
+            profile = self.profiles[name] = cProfile.Profile()
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name)
+
+        self._active = name
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            current, peak = tracemalloc.get_traced_memory()
+            stats.peak_traced = max(stats.peak_traced, peak)
+            stats.current_traced = current
+            stats.peak_rss = peak_rss_bytes()
+            stats.top = tracemalloc.take_snapshot().statistics("lineno")[:self.top]
+            self._active = None
+
+    def memory_report(self, process_name: str) -> str:
+        lines = [f"# {process_name} : mémoire par étape (tracemalloc, pic RSS du processus)", ""]
+        for stats in self.stages.values():
+            rss = "n/a" if stats.peak_rss is None else f"{stats.peak_rss / 2**20:.1f} Mio"
+            lines.append(
+                f"## {stats.name} : {stats.calls} appel(s), {stats.seconds:.3f} s, "
+                f"pic tracemalloc {stats.peak_traced / 2**20:.1f} Mio, "
+                f"retenu en fin d'étape {stats.current_traced / 2**20:.1f} Mio, pic RSS {rss}"
+            )
+            lines.append(f"Top {len(stats.top)} des allocations encore vivantes en fin d'étape :")
+            for stat in stats.top:
+                frame = stat.traceback[0]
+                lines.append(f"  {stat.size / 2**10:10.1f} Kio  {stat.count:8d} blocs  {frame.filename}:{frame.lineno}")
+            lines.append("")
+        rss = peak_rss_bytes()
+        lines.append(f"Pic RSS du processus : {'n/a' if rss is None else f'{rss / 2**20:.1f} Mio'}")
+        return "\n".join(lines) + "\n"
+
+
+_profiler = None
+
+
+def enable_profiling(top: int = TOP_ALLOCATIONS) -> Profiler:
+    """Active le profilage pour ce processus (idempotent) et démarre tracemalloc"""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(top)
+    return _profiler
+
+
+def disable_profiling() -> None:
+    global _profiler
+    if _profiler is not None and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _profiler = None
+
+
+def profile_stage(name: str):
+    """
+    Contexte profilant une étape : `with profile_stage("merge"): ...`.
+    Sans profilage actif, retourne un contexte nul partagé (aucun coût).
+    """
+    if _profiler is None:
+        return _NULL_STAGE
+    return _profiler.stage(name)
+
+
+def write_profiles(sbom_dir: Path, process_name: str) -> Path:
+    """
+    Écrit sbom/profile/<script>.<étape>.pstats (lisibles avec `python -m pstats`
+    ou snakeviz) et sbom/profile/<script>.memory.txt. Retourne le dossier.
+    """
+    if _profiler is None:
+        raise RuntimeError("Profilage non activé (enable_profiling)")
+    profile_dir = sbom_dir / PROFILE_DIR
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    for name, profile in _profiler.profiles.items():
+        profile.dump_stats(str(profile_dir / f"{process_name}.{name}.pstats"))
+    report_path = profile_dir / f"{process_name}.memory.txt"
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write(_profiler.memory_report(process_name))
+    logger.info(f"🔬 Profils écrits dans {profile_dir} ({len(_profiler.profiles)} étapes)")
+    return profile_dir
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module compiles the declarative categorisation ruleset (language_rules.json)
+into lookup structures: purl-type dispatch, prefix/suffix tries and one regex
+per condition.
+"""
+
+import json
+import os
+import re
+import string
+from functools import lru_cache
+from pathlib import Path
+
+BUNDLED_RULES = Path(__file__).resolve().parent / "language_rules.json"
+RULES_ENV_VAR = "FULLTRIVYSCAN_RULES"
+
+DEPENDENCY_RULE_KEYS = {"source_type", "suffixes", "contains"}
+RUNTIME_RULE_KEYS = {"runtime", "name_equals", "name_contains_ci", "purl_prefixes", "keep"}
+TEMPLATE_FIELDS = {"distro", "name"}
+DOCKER_RULE_KEYS = {
+    "purl_types", "name_contains", "name_contains_ci", "name_in_ci", "no_purl", "name_prefixes",
+    "source_type", "source_file", "version_from_runtime", "default_distro",
+}
+
+DEPENDENCY_CACHE_SIZE = 4096
+
+_END = None  # clé terminale des tries (jamais un caractère)
+# En dessous de ce nombre de préfixes, str.startswith(tuple) (en C) bat le parcours du trie
+TRIE_MIN_PREFIXES = 16
+
+
+class PrefixTrie:
+    """
+    Trie de préfixes : associe une valeur à chaque préfixe enregistré.
+    Pour un même préfixe, la première valeur enregistrée est conservée.
+    """
+
+    __slots__ = ("_root",)
+
+    def __init__(self, prefixes=()):
+        self._root = {}
+        for prefix, value in prefixes:
+            self.add(prefix, value)
+
+    def add(self, prefix: str, value) -> None:
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault(_END, value)
+
+    def matches(self, text: str):
+        """Valeurs de tous les préfixes enregistrés de `text`, du plus court au plus long"""
+        node = self._root
+        if _END in node:
+            yield node[_END]
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                return
+            if _END in node:
+                yield node[_END]
+
+    def first(self, text: str):
+        """Plus petite valeur parmi les préfixes de `text` (None si aucun)"""
+        return min(self.matches(text), default=None)
+
+    def has_prefix_of(self, text: str) -> bool:
+        """Vrai si un préfixe enregistré commence `text` (arrêt au premier trouvé)"""
+        node = self._root
+        for char in text:
+            if _END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return _END in node
+
+
+class SuffixTrie(PrefixTrie):
+    """Trie de suffixes : un trie de préfixes sur les chaînes retournées"""
+
+    __slots__ = ()
+
+    def add(self, suffix: str, value) -> None:
+        super().add(suffix[::-1], value)
+
+    def matches(self, text: str):
+        return super().matches(text[::-1])
+
+
+def _check_keys(rule: dict, allowed: set, section: str) -> None:
+    unknown = set(rule) - allowed
+    if unknown:
+        raise ValueError(f"Clé(s) inconnue(s) dans {section} : {', '.join(sorted(unknown))}")
+
+
+def _needle_regex(needles):
+    """Une regex alternative pour une liste de sous-chaînes (None si la liste est vide)"""
+    if not needles:
+        return None
+    # Les plus longues d'abord : l'alternative s'arrête au premier motif qui correspond
+    return re.compile("|".join(re.escape(n) for n in sorted(needles, key=len, reverse=True)))
+
+
+def _compile_template(source_type: str):
+    """
+    source_type peut contenir un champ {distro} (namespace du purl, sinon
+    default_distro) ou {name} (nom du composant en minuscules).
+    Renvoie (début, champ, fin), ou None sans champ.
+    """
+    parsed = [(literal, field) for literal, field, _, _ in string.Formatter().parse(source_type)]
+    fields = [field for _, field in parsed if field is not None]
+    if not fields:
+        return None
+    if len(fields) > 1 or fields[0] not in TEMPLATE_FIELDS:
+        raise ValueError(f"Modèle de source_type invalide : {source_type}")
+    head = parsed[0][0]
+    tail = "".join(literal for literal, _ in parsed[1:])
+    return head, fields[0], tail
+
+
+def _prefix_matcher(prefixes):
+    """Prédicat « name commence par l'un des préfixes » (None si la liste est vide)"""
+    if not prefixes:
+        return None
+    if len(prefixes) < TRIE_MIN_PREFIXES:
+        return lambda text, _prefixes=tuple(prefixes): text.startswith(_prefixes)
+    return PrefixTrie((p, True) for p in prefixes).has_prefix_of
+
+
+class _DockerRule:
+    """Règle compilée pour les composants d'images Docker"""
+
+    __slots__ = (
+        "index", "unconditional", "contains", "contains_ci", "name_in_ci", "no_purl", "prefixes",
+        "source_type", "template", "source_file", "version_from_runtime", "default_distro",
+    )
+
+    def __init__(self, index: int, rule: dict):
+        _check_keys(rule, DOCKER_RULE_KEYS, "docker_image")
+        if "source_type" not in rule:
+            raise ValueError(f"Règle docker_image n°{index} sans source_type")
+        self.index = index
+        self.contains = _needle_regex(rule.get("name_contains"))
+        self.contains_ci = _needle_regex([n.lower() for n in rule.get("name_contains_ci", ())])
+        self.name_in_ci = frozenset(n.lower() for n in rule["name_in_ci"]) if "name_in_ci" in rule else None
+        self.no_purl = bool(rule.get("no_purl"))
+        self.prefixes = _prefix_matcher(rule.get("name_prefixes"))
+        self.source_type = rule["source_type"]
+        self.template = _compile_template(self.source_type)
+        self.source_file = rule.get("source_file")
+        self.version_from_runtime = rule.get("version_from_runtime")
+        self.default_distro = rule.get("default_distro")
+        if self.template is not None and self.template[1] == "distro" and self.default_distro is None:
+            raise ValueError(f"Règle docker_image n°{index} : {{distro}} nécessite default_distro")
+        self.unconditional = not (self.contains or self.contains_ci or self.name_in_ci is not None
+                                  or self.no_purl or self.prefixes)
+
+    def matches(self, purl: str, name: str, lower: str) -> bool:
+        if self.contains is not None and self.contains.search(name) is None:
+            return False
+        if self.contains_ci is not None and self.contains_ci.search(lower) is None:
+            return False
+        if self.name_in_ci is not None and lower not in self.name_in_ci:
+            return False
+        if self.no_purl and purl:
+            return False
+        if self.prefixes is not None and not self.prefixes(name):
+            return False
+        return True
+
+    def category(self, purl: str, lower: str) -> str:
+        if self.template is None:
+            return self.source_type
+        head, field, tail = self.template
+        if field == "name":
+            value = lower
+        else:
+            value = self.default_distro
+            # pkg:deb/debian/curl@7.88.1 -> ["pkg:deb", "debian", "curl@7.88.1"]
+            parts = purl.split("/", 2)
+            if len(parts) == 3 and parts[1]:
+                value = parts[1].lower()
+        return head + value + tail
+
+    def source_file_for(self, purl: str, original_source_file: str, attribution) -> str:
+        """
+        source_file de la règle (fichier supposé), remplacé par le(s) fichier(s)
+        de dépendances réel(s) quand l'index d'attribution connaît le purl
+        """
+        if self.source_file is None:
+            return original_source_file
+        if attribution is not None:
+            return attribution.lookup(purl) or self.source_file
+        return self.source_file
+
+    def apply(self, purl: str, lower: str, result: dict, runtime_versions: dict, attribution=None) -> dict:
+        result["source_type"] = self.category(purl, lower)
+        if self.source_file is not None:
+            result["source_file"] = self.source_file_for(purl, result["source_file"], attribution)
+        if self.version_from_runtime is not None and self.version_from_runtime in runtime_versions:
+            result["version"] = runtime_versions[self.version_from_runtime]
+        return result
+
+
+class _RuntimeRule:
+    """Règle compilée de détection de version runtime"""
+
+    __slots__ = ("runtime", "name_equals", "contains_ci", "purl_prefixes", "keep_first")
+
+    def __init__(self, rule: dict):
+        _check_keys(rule, RUNTIME_RULE_KEYS, "runtime_versions")
+        if "runtime" not in rule:
+            raise ValueError("Règle runtime_versions sans runtime")
+        if rule.get("keep", "last") not in ("first", "last"):
+            raise ValueError(f"keep doit valoir first ou last : {rule['keep']}")
+        self.runtime = rule["runtime"]
+        self.name_equals = frozenset(rule["name_equals"]) if "name_equals" in rule else None
+        self.contains_ci = _needle_regex([n.lower() for n in rule.get("name_contains_ci", ())])
+        self.purl_prefixes = tuple(rule["purl_prefixes"]) if rule.get("purl_prefixes") else None
+        self.keep_first = rule.get("keep", "last") == "first"
+
+    def matches(self, purl: str, name: str, lower: str) -> bool:
+        if self.name_equals is not None and name not in self.name_equals:
+            return False
+        if self.contains_ci is not None and self.contains_ci.search(lower) is None:
+            return False
+        if self.purl_prefixes is not None and not purl.startswith(self.purl_prefixes):
+            return False
+        return True
+
+
+class RuleEngine:
+    """
+    Jeu de règles de catégorisation compilé.
+
+    Trois sections (cf. language_rules.json) :
+    - dependency_files : type de source d'un fichier de dépendances scanné
+      directement (suffixes et sous-chaînes du chemin) ;
+    - runtime_versions : versions des runtimes détectées dans un SBOM d'image ;
+    - docker_image : catégorie des composants d'images Docker.
+
+    Dans une règle, les conditions se combinent en ET et les valeurs d'une
+    même condition en OU. La première règle (dans l'ordre du fichier) qui
+    correspond l'emporte.
+    """
+
+    def __init__(self, ruleset: dict):
+        self._compile_dependency_files(ruleset.get("dependency_files", {}))
+        self._runtime_rules = [_RuntimeRule(rule) for rule in ruleset.get("runtime_versions", [])]
+        self._compile_docker_image(ruleset.get("docker_image", {}))
+
+    @classmethod
+    def from_file(cls, path) -> "RuleEngine":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def load(cls, path=None) -> "RuleEngine":
+        """Charge `path`, sinon le fichier désigné par FULLTRIVYSCAN_RULES, sinon le jeu embarqué"""
+        return cls.from_file(path or os.environ.get(RULES_ENV_VAR) or BUNDLED_RULES)
+
+    def _compile_dependency_files(self, section: dict) -> None:
+        # Les mêmes fichiers reviennent pour chaque composant : résultat mémorisé par fichier
+        self._dependency_source_type = lru_cache(maxsize=DEPENDENCY_CACHE_SIZE)(self._dependency_source_type)
+        self._dependency_default = section.get("default", "dependency-file")
+        self._dependency_types = []
+        self._dependency_suffixes = SuffixTrie()
+        contains = {}
+        for index, rule in enumerate(section.get("rules", [])):
+            _check_keys(rule, DEPENDENCY_RULE_KEYS, "dependency_files")
+            if "source_type" not in rule:
+                raise ValueError(f"Règle dependency_files n°{index} sans source_type")
+            self._dependency_types.append(rule["source_type"])
+            for suffix in rule.get("suffixes", ()):
+                self._dependency_suffixes.add(suffix, index)
+            for needle in rule.get("contains", ()):
+                contains.setdefault(needle, index)
+        # Une seule regex pour toutes les sous-chaînes, évaluée à chaque position
+        # (lookahead) : le motif trouvé à une position est le plus long ; les
+        # motifs plus courts qui en sont préfixes correspondent aussi, d'où le
+        # rang minimal précalculé sur ces préfixes.
+        self._dependency_contains_rank = {
+            needle: min(rank for other, rank in contains.items() if needle.startswith(other))
+            for needle in contains
+        }
+        regex = _needle_regex(list(contains))
+        self._dependency_contains = re.compile(f"(?=({regex.pattern}))") if regex else None
+
+    def _compile_docker_image(self, section: dict) -> None:
+        self._docker_default = section.get("default", "docker-image")
+        rules = [_DockerRule(index, rule) for index, rule in enumerate(section.get("rules", []))]
+        purl_types = {}
+        generic = []
+        for rule, raw in zip(rules, section.get("rules", [])):
+            if raw.get("purl_types"):
+                for type_ in raw["purl_types"]:
+                    purl_types.setdefault(type_, []).append(rule)
+            else:
+                generic.append(rule)
+        # Candidats précalculés par type de purl : règles du type + règles génériques,
+        # dans l'ordre du fichier. Un composant ne parcourt que sa propre liste.
+        self._docker_generic = tuple(generic)
+        self._docker_by_type = {
+            type_: tuple(sorted(typed + generic, key=lambda r: r.index))
+            for type_, typed in purl_types.items()
+        }
+
+    def _dependency_source_type(self, source_file: str) -> str:
+        best = self._dependency_suffixes.first(source_file)
+        if self._dependency_contains is not None:
+            for match in self._dependency_contains.finditer(source_file):
+                rank = self._dependency_contains_rank[match.group(1)]
+                if best is None or rank < best:
+                    best = rank
+        return self._dependency_types[best] if best is not None else self._dependency_default
+
+    def categorize_dependency_file(self, source_file: str) -> dict:
+        return {"source_type": self._dependency_source_type(source_file), "source_file": source_file}
+
+    def _docker_rule(self, purl: str, name: str, lower: str):
+        """Première règle docker_image qui correspond (None : catégorie par défaut)"""
+        # Type du purl (pkg:deb/debian/curl@7.88.1 -> deb), sans décomposition complète
+        slash = purl.find("/", 4) if purl and purl.startswith("pkg:") else -1
+        candidates = self._docker_by_type.get(purl[4:slash], self._docker_generic) if slash >= 0 else self._docker_generic
+        for rule in candidates:
+            if rule.unconditional or rule.matches(purl, name, lower):
+                return rule
+        return None
+
+    def categorize_docker_component(self, purl: str, name: str, original_source_file: str,
+                                    runtime_versions: dict, attribution=None) -> dict:
+        result = {"source_type": "", "source_file": original_source_file}
+        lower = name.lower()
+        rule = self._docker_rule(purl, name, lower)
+        if rule is not None:
+            return rule.apply(purl, lower, result, runtime_versions, attribution)
+        result["source_type"] = self._docker_default
+        return result
+
+    def categorize_docker_components(self, components, original_source_file: str, runtime_versions: dict,
+                                     attribution=None) -> dict:
+        """
+        Catégorise des composants d'une même image Docker en une passe.
+        Retourne des colonnes parallèles : source_type, source_file et version
+        (version du runtime pour les outils toolchain, sinon None).
+        `attribution` (ex: attribution.LockfileIndex) fournit lookup(purl) -> fichier(s) de dépendances réel(s).
+        """
+        source_types = []
+        source_files = []
+        versions = []
+        default = self._docker_default
+        by_type = self._docker_by_type
+        generic = self._docker_generic
+        for component in components:
+            purl = component.get("purl", "")
+            name = component.get("name", "")
+            lower = name.lower()
+            # Équivalent en ligne de _docker_rule (boucle chaude)
+            slash = purl.find("/", 4) if purl and purl.startswith("pkg:") else -1
+            rule = None
+            for candidate in (by_type.get(purl[4:slash], generic) if slash >= 0 else generic):
+                if candidate.unconditional or candidate.matches(purl, name, lower):
+                    rule = candidate
+                    break
+            if rule is None:
+                source_types.append(default)
+                source_files.append(original_source_file)
+                versions.append(None)
+                continue
+            source_types.append(rule.category(purl, lower))
+            source_files.append(rule.source_file_for(purl, original_source_file, attribution))
+            versions.append(runtime_versions.get(rule.version_from_runtime) if rule.version_from_runtime else None)
+        return {"source_type": source_types, "source_file": source_files, "version": versions}
+
+    def iter_runtime_versions(self, components):
+        """
+        Produit (runtime, version) à chaque version retenue, en un passage sur
+        `components` (itérable quelconque) : dict() du résultat donne
+        detect_runtime_versions.
+        """
+        rules = self._runtime_rules
+        seen = set()
+        for component in components:
+            version = component.get("version")
+            if not version:
+                continue
+            name = component.get("name", "")
+            purl = component.get("purl", "")
+            lower = name.lower()
+            for rule in rules:
+                if rule.keep_first and rule.runtime in seen:
+                    continue
+                if rule.matches(purl, name, lower):
+                    seen.add(rule.runtime)
+                    yield rule.runtime, version
+
+    def detect_runtime_versions(self, sbom_data: dict) -> dict:
+        return dict(self.iter_runtime_versions(sbom_data.get("components", [])))
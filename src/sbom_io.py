@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module writes SBOM files with an optional byte-offset sidecar index,
+provides lazy random access to indexed SBOM entries, and streams other
+large JSON documents (metadata.json) out member by member.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+from pathlib import Path
+
+# Sections du SBOM dont chaque élément est indexé
+INDEXED_ARRAYS = ("components", "vulnerabilities")
+
+
+# Octets hachés en tête et en fin de SBOM pour détecter un index obsolète
+FINGERPRINT_BYTES = 64 * 1024
+
+
+def file_fingerprint(f) -> dict:
+    """
+    Empreinte d'un fichier ouvert en binaire : taille et sha256 des premiers et
+    derniers FINGERPRINT_BYTES octets (sans lire tout le fichier). Le mtime n'en
+    fait pas partie : un SBOM copié, téléchargé comme artifact ou extrait d'un
+    dépôt garde son index.
+    """
+    stat = os.fstat(f.fileno())
+    f.seek(0)
+    digest = hashlib.sha256(f.read(FINGERPRINT_BYTES))
+    if stat.st_size > FINGERPRINT_BYTES:
+        f.seek(max(FINGERPRINT_BYTES, stat.st_size - FINGERPRINT_BYTES))
+        digest.update(f.read())
+    f.seek(0)
+    return {"size": str(stat.st_size), "head_tail_sha256": digest.hexdigest()}
+
+
+def index_path_for(sbom_path: Path) -> Path:
+    """Chemin de l'index d'un SBOM : merged-sbom.cdx.json -> merged-sbom.cdx.idx.sqlite"""
+    sbom_path = Path(sbom_path)
+    name = sbom_path.name
+    if name.endswith(".json"):
+        name = name[:-len(".json")]
+    return sbom_path.with_name(f"{name}.idx.sqlite")
+
+
+def _dumps(value, depth: int) -> str:
+    """Sérialise une valeur comme json.dump(indent=2) le ferait à la profondeur donnée"""
+    text = json.dumps(value, indent=2, ensure_ascii=False)
+    if depth and "\n" in text:
+        text = text.replace("\n", "\n" + "  " * depth)
+    return text
+
+
+def _index_keys(section: str, item: dict) -> list:
+    """Clés (kind, key) sous lesquelles un élément est indexé"""
+    if not isinstance(item, dict):
+        return []
+    if section == "components":
+        keys = []
+        if item.get("bom-ref"):
+            keys.append(("bom-ref", item["bom-ref"]))
+        if item.get("purl"):
+            keys.append(("purl", item["purl"]))
+        return keys
+    if section == "vulnerabilities" and item.get("id"):
+        return [("vulnerability", item["id"])]
+    return []
+
+
+class SbomWriter:
+    """
+    Écriture en flux d'un SBOM, octet pour octet identique à
+    json.dump(sbom, f, indent=2, ensure_ascii=False).
+
+    Si `index_path` est fourni, la plage d'octets de chaque composant (par bom-ref
+    et purl) et de chaque vulnérabilité (par id) est enregistrée dans un index SQLite.
+    """
+
+    def __init__(self, path: Path, index_path: Path = None):
+        self.path = Path(path)
+        self.index_path = Path(index_path) if index_path else None
+        self._file = open(self.path, "wb")
+        self._offset = 0
+        self._fields = 0
+        self._array = None
+        self._items = 0
+        self._entries = []
+        self._write("{")
+
+    def _write(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self._file.write(data)
+        self._offset += len(data)
+
+    def _begin_field(self, key: str) -> None:
+        self._write("," if self._fields else "")
+        self._write(f"\n  {json.dumps(key, ensure_ascii=False)}: ")
+        self._fields += 1
+
+    def write_field(self, key: str, value) -> None:
+        """Écrit un champ de premier niveau"""
+        self._begin_field(key)
+        self._write(_dumps(value, 1))
+
+    def begin_array(self, key: str) -> None:
+        """Ouvre un tableau de premier niveau dont les éléments seront écrits un par un"""
+        self._begin_field(key)
+        self._write("[")
+        self._array = key
+        self._items = 0
+
+    def write_item(self, item) -> None:
+        """Écrit un élément du tableau ouvert et enregistre sa plage d'octets"""
+        self._write(",\n    " if self._items else "\n    ")
+        start = self._offset
+        self._write(_dumps(item, 2))
+        if self.index_path:
+            for kind, key in _index_keys(self._array, item):
+                self._entries.append((kind, key, start, self._offset))
+        self._items += 1
+
+    def end_array(self) -> None:
+        self._write("\n  ]" if self._items else "]")
+        self._array = None
+
+    def close(self) -> None:
+        self._write("\n}" if self._fields else "}")
+        self._file.close()
+        if self.index_path:
+            self._write_index()
+
+    def _write_index(self) -> None:
+        if self.index_path.exists():
+            self.index_path.unlink()
+        conn = sqlite3.connect(str(self.index_path))
+        try:
+            with conn:
+                conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+                conn.execute(
+                    "CREATE TABLE entries (kind TEXT NOT NULL, key TEXT NOT NULL, "
+                    "start INTEGER NOT NULL, end INTEGER NOT NULL)"
+                )
+                conn.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", self._entries)
+                conn.execute("CREATE INDEX idx_entries_key ON entries(kind, key)")
+                with open(self.path, "rb") as f:
+                    fingerprint = file_fingerprint(f)
+                conn.executemany("INSERT INTO meta VALUES (?, ?)", [("sbom", self.path.name), *fingerprint.items()])
+        finally:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+def write_sbom(sbom: dict, path: Path, index_path: Path = None) -> None:
+    """Écrit un SBOM complet (et son index si demandé)"""
+    with SbomWriter(path, index_path) as writer:
+        for key, value in sbom.items():
+            if key in INDEXED_ARRAYS and isinstance(value, list):
+                writer.begin_array(key)
+                for item in value:
+                    writer.write_item(item)
+                writer.end_array()
+            else:
+                writer.write_field(key, value)
+
+
+class JsonObjectStream:
+    """
+    Objet JSON écrit membre par membre par dump_streamed, depuis un mapping
+    (dict, SpillDict…) ou un itérable de paires (clé, valeur) ; `transform`
+    est appliqué à chaque valeur au moment de l'écriture.
+    """
+
+    def __init__(self, source, transform=None):
+        self._source = source
+        self._transform = transform
+
+    def items(self):
+        pairs = self._source.items() if hasattr(self._source, "items") else self._source
+        if self._transform is None:
+            yield from pairs
+            return
+        for key, value in pairs:
+            yield key, self._transform(value)
+
+
+class JsonArrayStream:
+    """Tableau JSON écrit élément par élément par dump_streamed, depuis un itérable"""
+
+    def __init__(self, items):
+        self._items = items
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+def _is_streamed(value) -> bool:
+    if isinstance(value, (JsonObjectStream, JsonArrayStream)):
+        return True
+    return isinstance(value, dict) and any(_is_streamed(item) for item in value.values())
+
+
+def _write_container(write, opening: str, closing: str, entries, depth: int) -> None:
+    write(opening)
+    indent = "\n" + "  " * (depth + 1)
+    empty = True
+    for prefix, value in entries:
+        write(indent + prefix if empty else "," + indent + prefix)
+        _write_streamed(write, value, depth + 1)
+        empty = False
+    write(closing if empty else "\n" + "  " * depth + closing)
+
+
+def _write_streamed(write, value, depth: int) -> None:
+    if isinstance(value, JsonArrayStream):
+        _write_container(write, "[", "]", (("", item) for item in value), depth)
+    elif isinstance(value, JsonObjectStream) or (isinstance(value, dict) and _is_streamed(value)):
+        _write_container(write, "{", "}", (
+            (f"{json.dumps(key, ensure_ascii=False)}: ", item) for key, item in value.items()
+        ), depth)
+    else:
+        write(_dumps(value, depth))
+
+
+def dump_streamed(value, f) -> None:
+    """
+    Équivalent de json.dump(value, f, indent=2, ensure_ascii=False) (octet pour
+    octet) où les JsonObjectStream / JsonArrayStream, y compris imbriqués dans
+    des dict, sont écrits au fil de l'eau sans être matérialisés.
+    """
+    _write_streamed(f.write, value, 0)
+
+
+class StaleIndexError(Exception):
+    """L'index ne correspond plus au fichier SBOM"""
+
+
+class SbomReader:
+    """
+    Accès aléatoire paresseux à un SBOM indexé : le fichier est mappé en mémoire
+    et seuls les éléments demandés sont décodés.
+    """
+
+    def __init__(self, sbom_path: Path, index_path: Path = None):
+        self.sbom_path = Path(sbom_path)
+        self.index_path = Path(index_path) if index_path else index_path_for(self.sbom_path)
+        if not self.index_path.exists():
+            raise FileNotFoundError(f"Index introuvable : {self.index_path}")
+
+        self._conn = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True)
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        self._file = open(self.sbom_path, "rb")
+        # Même nom, même taille et mêmes octets de tête et de fin qu'à l'écriture
+        fingerprint = file_fingerprint(self._file)
+        if meta.get("sbom") != self.sbom_path.name or any(meta.get(key) != value for key, value in fingerprint.items()):
+            self.close()
+            raise StaleIndexError(f"{self.index_path} ne correspond pas à {self.sbom_path}")
+        size = int(fingerprint["size"])
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def _lookup(self, kind: str, key: str) -> list:
+        rows = self._conn.execute(
+            "SELECT start, end FROM entries WHERE kind = ? AND key = ? ORDER BY start",
+            (kind, key),
+        )
+        return [json.loads(self._mmap[start:end]) for start, end in rows]
+
+    def component(self, bom_ref: str):
+        """Retourne le composant de bom-ref donné, ou None"""
+        found = self._lookup("bom-ref", bom_ref)
+        return found[0] if found else None
+
+    def components_by_purl(self, purl: str) -> list:
+        """Retourne les composants portant ce purl"""
+        return self._lookup("purl", purl)
+
+    def vulnerability(self, vuln_id: str):
+        """Retourne la vulnérabilité d'id donné, ou None"""
+        found = self._lookup("vulnerability", vuln_id)
+        return found[0] if found else None
+
+    def close(self) -> None:
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        if getattr(self, "_file", None) is not None:
+            self._file.close()
+            self._file = None
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module ranks CycloneDX vulnerability severities. It has no dependencies
+so that both metadata.py and the scan-time policy can share it.
+"""
+
+# Sévérités CycloneDX, de la plus grave à la moins grave
+SEVERITY_ORDER = ("critical", "high", "medium", "low", "info", "none", "unknown")
+_SEVERITY_RANK = {severity: rank for rank, severity in enumerate(SEVERITY_ORDER)}
+
+
+def vulnerability_severity(vuln: dict) -> str:
+    """Sévérité la plus grave parmi les ratings CycloneDX d'une vulnérabilité"""
+    severities = [
+        rating.get("severity", "unknown").lower()
+        for rating in vuln.get("ratings", [])
+    ]
+    return min(severities, key=lambda severity: _SEVERITY_RANK.get(severity, len(SEVERITY_ORDER)), default="unknown")
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module moves heavy vulnerability text out of an SBOM into a
+content-addressed sidecar file, and restores it.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from json_stream import iter_fields
+from sbom_io import write_sbom
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Champs volumineux déplacés dans le fichier annexe
+HEAVY_VULNERABILITY_FIELDS = ("description", "advisories", "references")
+
+TEXT_REF_PREFIX = "fulltrivyscan:text-ref:"
+
+
+def text_store_path_for(sbom_path: Path) -> Path:
+    """Chemin du fichier annexe : merged-sbom.cdx.json -> merged-sbom.vuln-text.json"""
+    sbom_path = Path(sbom_path)
+    name = sbom_path.name
+    if name.endswith(".cdx.json"):
+        name = name[:-len(".cdx.json")]
+    return sbom_path.with_name(f"{name}.vuln-text.json")
+
+
+def sbom_serial_number(sbom_path: Path):
+    """serialNumber d'un SBOM (ou None), lu sans décoder les composants"""
+    for key, value in iter_fields(sbom_path, streamed=("components", "dependencies", "vulnerabilities")):
+        if key == "serialNumber":
+            return value
+    return None
+
+
+def owns_text_store(sbom_path: Path) -> bool:
+    """
+    Le fichier annexe existe et a été écrit avec ce SBOM (même serialNumber) :
+    un fichier annexe laissé par une exécution précédente n'est pas repris.
+    """
+    store_path = text_store_path_for(sbom_path)
+    if not store_path.exists():
+        return False
+    serial_number = sbom_serial_number(sbom_path)
+    for key, value in iter_fields(store_path):
+        # serialNumber est écrit en tête, avant les textes
+        return serial_number is not None and key == "serialNumber" and value == serial_number
+    return False
+
+
+def _content_key(value) -> str:
+    canonical = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def slim_vulnerability(vuln: dict, texts) -> dict:
+    """
+    Version allégée d'une vulnérabilité ; ses textes sont ajoutés à `texts`
+    (dict ou TextStoreWriter) sous leur hash s'ils n'y sont pas déjà.
+    """
+    heavy = [field for field in HEAVY_VULNERABILITY_FIELDS if field in vuln]
+    if not heavy:
+        return vuln
+
+    slim_vuln = {key: value for key, value in vuln.items() if key not in heavy}
+    properties = list(slim_vuln.get("properties", []))
+    for field in heavy:
+        key = _content_key(vuln[field])
+        texts.setdefault(key, vuln[field])
+        properties.append({"name": f"{TEXT_REF_PREFIX}{field}", "value": key})
+    slim_vuln["properties"] = properties
+    return slim_vuln
+
+
+class TextStoreWriter:
+    """
+    Écriture en flux du fichier annexe, identique à
+    json.dump({"serialNumber": serial_number, "texts": texts}, f, ensure_ascii=False)
+    (sans serialNumber s'il n'est pas fourni) : seuls les hash déjà écrits sont
+    gardés en mémoire, pas les textes.
+    """
+
+    def __init__(self, path: Path, serial_number: str = None):
+        self.path = Path(path)
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._keys = set()
+        if serial_number is not None:
+            self._file.write(f'{{"serialNumber": {json.dumps(serial_number)}, "texts": {{')
+        else:
+            self._file.write('{"texts": {')
+
+    def setdefault(self, key: str, value) -> None:
+        if key in self._keys:
+            return
+        self._file.write(", " if self._keys else "")
+        self._file.write(f"{json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}")
+        self._keys.add(key)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def close(self) -> None:
+        self._file.write("}}")
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def slim_sbom(sbom: dict) -> tuple[dict, dict]:
+    """
+    Retire les champs volumineux des vulnérabilités.
+    Chaque texte unique est stocké une seule fois dans le store, sous son hash ;
+    la vulnérabilité garde une propriété fulltrivyscan:text-ref:<champ> pointant dessus.
+    Retourne (SBOM allégé, store).
+    """
+    texts = {}
+    slim_vulnerabilities = [slim_vulnerability(vuln, texts) for vuln in sbom.get("vulnerabilities", [])]
+
+    slim = dict(sbom)
+    if "vulnerabilities" in sbom:
+        slim["vulnerabilities"] = slim_vulnerabilities
+    return slim, {"texts": texts}
+
+
+def restore_sbom(slim: dict, store: dict) -> dict:
+    """Réinjecte les champs volumineux depuis le store : restore_sbom(*slim_sbom(x)) == x"""
+    texts = store.get("texts", {})
+    vulnerabilities = []
+    for vuln in slim.get("vulnerabilities", []):
+        properties = vuln.get("properties", [])
+        refs = [prop for prop in properties if prop.get("name", "").startswith(TEXT_REF_PREFIX)]
+        if not refs:
+            vulnerabilities.append(vuln)
+            continue
+
+        full_vuln = {key: value for key, value in vuln.items() if key != "properties"}
+        for prop in refs:
+            field = prop["name"][len(TEXT_REF_PREFIX):]
+            if prop["value"] not in texts:
+                raise KeyError(f"Texte {prop['value']} absent du fichier annexe ({vuln.get('id')})")
+            full_vuln[field] = texts[prop["value"]]
+        remaining = [prop for prop in properties if prop not in refs]
+        if remaining:
+            full_vuln["properties"] = remaining
+        vulnerabilities.append(full_vuln)
+
+    full = dict(slim)
+    if "vulnerabilities" in slim:
+        full["vulnerabilities"] = vulnerabilities
+    return full
+
+
+def write_slim_sbom(sbom: dict, sbom_path: Path, index_path: Path = None) -> dict:
+    """
+    Écrit le SBOM allégé et son fichier annexe, marqué du serialNumber du SBOM ;
+    retourne le SBOM allégé
+    """
+    slim, store = slim_sbom(sbom)
+    if "serialNumber" in sbom:
+        store = {"serialNumber": sbom["serialNumber"], **store}
+    write_sbom(slim, sbom_path, index_path)
+    store_path = text_store_path_for(sbom_path)
+    with open(store_path, "w", encoding="utf-8") as f:
+        json.dump(store, f, ensure_ascii=False)
+    logger.info(f"Mode allégé : {len(store['texts'])} textes uniques déplacés dans {store_path}")
+    return slim
+
+
+def load_full_sbom(sbom_path: Path) -> dict:
+    """Charge un SBOM, en réinjectant les textes si un fichier annexe existe"""
+    with open(sbom_path, "r", encoding="utf-8") as f:
+        sbom = json.load(f)
+    store_path = text_store_path_for(sbom_path)
+    if not store_path.exists():
+        return sbom
+    with open(store_path, "r", encoding="utf-8") as f:
+        return restore_sbom(sbom, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruit un SBOM complet depuis un SBOM allégé et son fichier annexe")
+    parser.add_argument("sbom", type=Path, help="SBOM allégé (ex: sbom/merged-sbom.cdx.json)")
+    parser.add_argument("--output", "-o", type=Path, required=True, help="SBOM complet à écrire")
+    args = parser.parse_args()
+
+    write_sbom(load_full_sbom(args.sbom), args.output)
+    logger.info(f"SBOM complet reconstruit dans : {args.output}")
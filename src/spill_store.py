@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module provides a dictionary that spills to an on-disk SQLite store
+once it grows past a threshold, for bounded-memory metadata generation.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class SpillDict:
+    """
+    Dictionnaire gardé en mémoire jusqu'à `max_entries` entrées, puis basculé
+    dans une base SQLite temporaire (créée dans `directory`, supprimée à la fermeture).
+
+    Les clés sont sérialisées en JSON (un tuple est relu comme une liste).
+    Les valeurs aussi, sauf si `value_type` est fourni : elles sont alors
+    stockées via value.as_tuple() et reconstruites par value_type(*tuple).
+    L'ordre d'insertion est conservé, comme pour un dict.
+    """
+
+    def __init__(self, max_entries: int, directory: Path = None, value_type=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.value_type = value_type
+        self._data = {}
+        self._conn = None
+        self._path = None
+        self._len = 0
+
+    @property
+    def spilled(self) -> bool:
+        return self._conn is not None
+
+    def _encode(self, value) -> str:
+        return json.dumps(value.as_tuple() if self.value_type else value, ensure_ascii=False)
+
+    def _decode(self, text: str):
+        value = json.loads(text)
+        return self.value_type(*value) if self.value_type else value
+
+    def _spill(self) -> None:
+        fd, path = tempfile.mkstemp(prefix=".spill-", suffix=".sqlite", dir=self.directory)
+        os.close(fd)
+        self._path = Path(path)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode = OFF")
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.execute("CREATE TABLE kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.executemany(
+            "INSERT INTO kv VALUES (?, ?)",
+            ((json.dumps(key, ensure_ascii=False), self._encode(value)) for key, value in self._data.items()),
+        )
+        self._len = len(self._data)
+        self._data = {}
+        logger.info(f"Index de plus de {self.max_entries} entrées : bascule sur disque ({self._path})")
+
+    def __setitem__(self, key, value) -> None:
+        if self._conn is None:
+            self._data[key] = value
+            if len(self._data) > self.max_entries:
+                self._spill()
+            return
+        key_text = json.dumps(key, ensure_ascii=False)
+        value_text = self._encode(value)
+        # INSERT puis UPDATE (et non INSERT OR REPLACE) pour garder le rowid, donc l'ordre d'insertion
+        if self._conn.execute("INSERT OR IGNORE INTO kv VALUES (?, ?)", (key_text, value_text)).rowcount:
+            self._len += 1
+        else:
+            self._conn.execute("UPDATE kv SET value = ? WHERE key = ?", (value_text, key_text))
+
+    def get(self, key, default=None):
+        if self._conn is None:
+            return self._data.get(key, default)
+        row = self._conn.execute(
+            "SELECT value FROM kv WHERE key = ?", (json.dumps(key, ensure_ascii=False),)
+        ).fetchone()
+        return self._decode(row[0]) if row else default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def setdefault(self, key, default=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            self[key] = value = default
+        return value
+
+    def __len__(self) -> int:
+        return len(self._data) if self._conn is None else self._len
+
+    def items(self):
+        if self._conn is None:
+            yield from self._data.items()
+            return
+        # Curseur dédié : les lectures n'interfèrent pas avec d'éventuelles écritures
+        for key_text, value_text in self._conn.cursor().execute("SELECT key, value FROM kv ORDER BY rowid"):
+            yield json.loads(key_text), self._decode(value_text)
+
+    def __iter__(self):
+        return (key for key, _ in self.items())
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._path.unlink(missing_ok=True)
+        self._data = {}
+        self._len = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_MISSING = object()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full Trivy Scan with CycloneDX SBOM
+Copyright (c) 2025 RomainValmo
+Licensed under the MIT License - see LICENSE file for details
+
+This module records timing spans for the pipeline stages and exports them as
+a Chrome trace-event JSON file plus a flat summary table.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = "trace.json"
+SUMMARY_FILE = "trace-summary.txt"
+TRACE_CATEGORY = "fulltrivyscan"
+
+
+class Span:
+    """Étape chronométrée : nom, attributs (fichier, image, composants, octets…), début et durée en µs"""
+
+    __slots__ = ("name", "attributes", "start_us", "duration_us", "tid")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.start_us = 0
+        self.duration_us = 0
+        self.tid = threading.get_ident()
+
+    def set(self, **attributes) -> None:
+        """Ajoute des attributs connus en cours d'étape (ex: nombre de composants lus)"""
+        self.attributes.update(attributes)
+
+
+class _SpanContext:
+    __slots__ = ("_tracer", "_span", "_start_ns")
+
+    def __init__(self, tracer, span: Span):
+        self._tracer = tracer
+        self._span = span
+
+    def __enter__(self) -> Span:
+        self._start_ns = time.perf_counter_ns()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        span = self._span
+        span.start_us = self._tracer.epoch_us + self._start_ns // 1000
+        span.duration_us = (end_ns - self._start_ns) // 1000
+        if exc_type is not None:
+            span.attributes["error"] = exc_type.__name__
+        self._tracer.spans.append(span)
+        return False
+
+
+class _NullSpan:
+    """Étape non enregistrée (traçage désactivé) : attributs ignorés"""
+
+    __slots__ = ()
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Enregistre les étapes d'une exécution, horodatées sur l'horloge murale (alignables entre scripts)"""
+
+    def __init__(self):
+        self.spans = []
+        # perf_counter pour les durées, décalé sur l'époque Unix pour aligner les processus
+        self.epoch_us = time.time_ns() // 1000 - time.perf_counter_ns() // 1000
+
+    def span(self, name: str, **attributes) -> _SpanContext:
+        return _SpanContext(self, Span(name, attributes))
+
+    def trace_events(self, process_name: str) -> list:
+        """Événements Chrome trace : une étape complète ("X") par span, plus le nom du processus"""
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process_name}}]
+        events.extend(
+            {
+                "name": span.name,
+                "cat": TRACE_CATEGORY,
+                "ph": "X",
+                "ts": span.start_us,
+                "dur": span.duration_us,
+                "pid": pid,
+                "tid": span.tid,
+                "args": span.attributes,
+            }
+            for span in sorted(self.spans, key=lambda span: span.start_us)
+        )
+        return events
+
+
+_tracer = None
+
+
+def enable_tracing() -> Tracer:
+    """Active le traçage pour ce processus (idempotent)"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+def disable_tracing() -> None:
+    global _tracer
+    _tracer = None
+
+
+def span(name: str, **attributes):
+    """
+    Contexte chronométrant une étape : `with span("merge", sboms=12) as s: ... s.set(components=n)`.
+    Sans traçage actif, retourne une étape nulle partagée (aucun enregistrement).
+    """
+    if _tracer is None:
+        return NULL_SPAN
+    return _tracer.span(name, **attributes)
+
+
+def summarize(events: list) -> list:
+    """Lignes (processus, étape, nombre, total µs, max µs) agrégées, par durée totale décroissante"""
+    process_names = {event["pid"]: event["args"]["name"] for event in events if event.get("ph") == "M"}
+    totals = {}
+    for event in events:
+        if event.get("ph") != "X":
+            continue
+        key = (process_names.get(event["pid"], str(event["pid"])), event["name"])
+        count, total, longest = totals.get(key, (0, 0, 0))
+        totals[key] = (count + 1, total + event["dur"], max(longest, event["dur"]))
+    return sorted(
+        ((process, name, count, total, longest) for (process, name), (count, total, longest) in totals.items()),
+        key=lambda row: row[3], reverse=True,
+    )
+
+
+def format_summary(rows: list) -> str:
+    header = ("processus", "étape", "appels", "total (s)", "moyenne (ms)", "max (ms)")
+    lines = [
+        (process, name, str(count), f"{total / 1e6:.3f}", f"{total / count / 1e3:.1f}", f"{longest / 1e3:.1f}")
+        for process, name, count, total, longest in rows
+    ]
+    widths = [max(len(row[i]) for row in [header, *lines]) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) if i < 2 else cell.rjust(width) for i, (cell, width) in enumerate(zip(row, widths)))
+        for row in [header, *lines]
+    ) + "\n"
+
+
+def write_trace(sbom_dir: Path, process_name: str, reset: bool = False) -> Path:
+    """
+    Ajoute les étapes de ce processus à sbom/trace.json (Chrome trace, ouvrable
+    dans chrome://tracing ou Perfetto) et régénère sbom/trace-summary.txt.
+    Les trois scripts partagent le même fichier ; `reset` repart d'une trace vide
+    (début du pipeline).
+    """
+    if _tracer is None:
+        raise RuntimeError("Traçage non activé (enable_tracing)")
+    trace_path = sbom_dir / TRACE_FILE
+    events = []
+    if not reset and trace_path.exists():
+        with open(trace_path, "r", encoding="utf-8") as f:
+            events = json.load(f).get("traceEvents", [])
+    events.extend(_tracer.trace_events(process_name))
+
+    sbom_dir.mkdir(parents=True, exist_ok=True)
+    with open(trace_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    summary = format_summary(summarize(events))
+    with open(sbom_dir / SUMMARY_FILE, "w", encoding="utf-8") as f:
+        f.write(summary)
+    logger.info(f"⏱️ Trace écrite dans {trace_path} ({len(_tracer.spans)} étapes)")
+    return trace_path
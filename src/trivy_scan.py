@@ -8,8 +8,11 @@ Licensed under the MIT License - see LICENSE file for details
 This module handles Trivy scanning for Dockerfiles and dependency files.
 """
 
+import argparse
 import os
 import subprocess
+import sys
+import time
 from pathlib import Path
 import logging
 import re
@@ -17,6 +20,13 @@ import json
 import uuid
 from datetime import datetime, timezone
 
+from attribution import SOURCE_FILE_PROPERTY
+from lockfile_parsers import has_native_parser, write_lockfile_sbom
+from policy import POLICY_SEVERITIES, Policy, PolicyGate, load_allow_list
+from metrics import write_metrics
+from profiling import enable_profiling, profile_stage, write_profiles
+from tracing import enable_tracing, span, write_trace
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s %(levelname)s %(message)s"
@@ -64,6 +74,14 @@ def extract_build_args(dockerfile: Path) -> dict:
     
     return build_args
 
+def run_probe(image_tag: str, *command: str) -> subprocess.CompletedProcess:
+    """Exécute une commande de sonde dans un conteneur éphémère de l'image (sortie capturée, 10 s maximum)"""
+    with span("probe_container", image=image_tag, command=command[0]):
+        return subprocess.run(
+            ["docker", "run", "--rm", "--entrypoint=", image_tag, *command],
+            capture_output=True, text=True, timeout=10
+        )
+
 def detect_runtime_components(image_tag: str) -> list:
     """
     Détecte les runtimes (PHP, Python, Node, Ruby, etc.) installés dans l'image
@@ -73,15 +91,9 @@ def detect_runtime_components(image_tag: str) -> list:
     
     # Détection PHP
     try:
-        php_check = subprocess.run(
-            ["docker", "run", "--rm", "--entrypoint=", image_tag, "which", "php"],
-            capture_output=True, text=True, timeout=10
-        )
+        php_check = run_probe(image_tag, "which", "php")
         if php_check.returncode == 0:
-            php_version_output = subprocess.run(
-                ["docker", "run", "--rm", "--entrypoint=", image_tag, "php", "-v"],
-                capture_output=True, text=True, timeout=10
-            )
+            php_version_output = run_probe(image_tag, "php", "-v")
             if php_version_output.returncode == 0:
                 # Extraire version PHP (ex: PHP 8.2.15)
                 match = re.search(r'PHP (\d+\.\d+\.\d+)', php_version_output.stdout)
@@ -100,10 +112,7 @@ def detect_runtime_components(image_tag: str) -> list:
                     logger.info(f"✅ Détecté PHP {php_version}")
                     
                     # Détecter les extensions PHP
-                    php_modules = subprocess.run(
-                        ["docker", "run", "--rm", "--entrypoint=", image_tag, "php", "-m"],
-                        capture_output=True, text=True, timeout=10
-                    )
+                    php_modules = run_probe(image_tag, "php", "-m")
                     if php_modules.returncode == 0:
                         for line in php_modules.stdout.split('\n'):
                             ext = line.strip()
@@ -123,16 +132,10 @@ def detect_runtime_components(image_tag: str) -> list:
     
     # Détection Python
     try:
-        python_check = subprocess.run(
-            ["docker", "run", "--rm", "--entrypoint=", image_tag, "sh", "-c", "which python3 || which python"],
-            capture_output=True, text=True, timeout=10
-        )
+        python_check = run_probe(image_tag, "sh", "-c", "which python3 || which python")
         if python_check.returncode == 0:
             python_cmd = "python3" if "python3" in python_check.stdout else "python"
-            python_version_output = subprocess.run(
-                ["docker", "run", "--rm", "--entrypoint=", image_tag, python_cmd, "--version"],
-                capture_output=True, text=True, timeout=10
-            )
+            python_version_output = run_probe(image_tag, python_cmd, "--version")
             if python_version_output.returncode == 0:
                 match = re.search(r'Python (\d+\.\d+\.\d+)', python_version_output.stdout)
                 if match:
@@ -153,15 +156,9 @@ def detect_runtime_components(image_tag: str) -> list:
     
     # Détection Node.js
     try:
-        node_check = subprocess.run(
-            ["docker", "run", "--rm", "--entrypoint=", image_tag, "which", "node"],
-            capture_output=True, text=True, timeout=10
-        )
+        node_check = run_probe(image_tag, "which", "node")
         if node_check.returncode == 0:
-            node_version_output = subprocess.run(
-                ["docker", "run", "--rm", "--entrypoint=", image_tag, "node", "--version"],
-                capture_output=True, text=True, timeout=10
-            )
+            node_version_output = run_probe(image_tag, "node", "--version")
             if node_version_output.returncode == 0:
                 node_version = node_version_output.stdout.strip().lstrip('v')
                 components.append({
@@ -180,15 +177,9 @@ def detect_runtime_components(image_tag: str) -> list:
     
     # Détection Ruby
     try:
-        ruby_check = subprocess.run(
-            ["docker", "run", "--rm", "--entrypoint=", image_tag, "which", "ruby"],
-            capture_output=True, text=True, timeout=10
-        )
+        ruby_check = run_probe(image_tag, "which", "ruby")
         if ruby_check.returncode == 0:
-            ruby_version_output = subprocess.run(
-                ["docker", "run", "--rm", "--entrypoint=", image_tag, "ruby", "--version"],
-                capture_output=True, text=True, timeout=10
-            )
+            ruby_version_output = run_probe(image_tag, "ruby", "--version")
             if ruby_version_output.returncode == 0:
                 match = re.search(r'ruby (\d+\.\d+\.\d+)', ruby_version_output.stdout)
                 if match:
@@ -260,78 +251,228 @@ def find_dependency_files(root_dir: Path, max_depth: int = 4):
                 files.append(Path(dirpath) / fname)
     return files
 
-if __name__ == "__main__":
-    root_dir = Path.cwd()
-    sbom_dir = root_dir / "sbom"
-    sbom_dir.mkdir(exist_ok=True)
-    logger.info(f"Recherche des fichiers de dépendances dans : {root_dir}")
-    dep_files = find_dependency_files(root_dir)
-    logger.info(f"Fichiers trouvés : {dep_files}")
+def dependency_sbom_name(dep_file_posix: str) -> str:
+    """
+    Nom du SBOM d'un fichier de dépendances, unique par chemin :
+    requirements.txt -> requirements.txt.cdx.json, api/requirements.txt -> api__requirements.txt.cdx.json.
+    Les "_" du chemin sont échappés en "_-" : a__b/x.lock et a/b__x.lock donnent des noms distincts.
+    """
+    return dep_file_posix.replace("_", "_-").replace("/", "__") + ".cdx.json"
 
-    for dep_file in dep_files:
-        out_file = sbom_dir / (dep_file.name + ".cdx.json")
+def annotate_source_file(sbom_path: Path, source_file: str) -> int:
+    """
+    Ajoute le chemin du fichier de dépendances scanné aux metadata.properties du SBOM
+    (lu par metadata.py pour l'attribution des composants à leur fichier réel).
+    Retourne le nombre de composants du SBOM.
+    """
+    with open(sbom_path, 'r', encoding='utf-8') as f:
+        sbom = json.load(f)
+    
+    properties = sbom.setdefault("metadata", {}).setdefault("properties", [])
+    properties[:] = [prop for prop in properties if prop.get("name") != SOURCE_FILE_PROPERTY]
+    properties.append({"name": SOURCE_FILE_PROPERTY, "value": source_file})
+    
+    with open(sbom_path, 'w', encoding='utf-8') as f:
+        json.dump(sbom, f, indent=2)
+    return len(sbom.get("components", []))
 
-        logger.info(f"Scan Trivy CycloneDX : {dep_file} -> {out_file}")
+def scan_dependency_file(root_dir: Path, sbom_dir: Path, dep_file: Path, native: bool = False) -> Path:
+    """
+    Scan Trivy CycloneDX d'un fichier de dépendances ; retourne le SBOM produit (annoté avec le chemin scanné).
+    Avec `native`, les formats couverts par lockfile_parsers sont lus sans Trivy
+    (vulnérabilités ajoutées plus tard par `trivy sbom` dans metadata.py).
+    """
+    dep_file_posix = str(dep_file.relative_to(root_dir)).replace('\\', '/')
+    sbom_name = dependency_sbom_name(dep_file_posix)
+    out_file = sbom_dir / sbom_name
+
+    if native and has_native_parser(dep_file):
+        with span("scan_dependency_file", file=dep_file_posix, native=True) as s, profile_stage("scan_dependency_file"):
+            count = write_lockfile_sbom(dep_file, dep_file_posix, out_file)
+            s.set(components=count, bytes_written=out_file.stat().st_size)
+        logger.info(f"⚡ SBOM natif : {dep_file} -> {out_file} ({count} composants)")
+        return out_file
+
+    logger.info(f"Scan Trivy CycloneDX : {dep_file} -> {out_file}")
 
-        out_file_posix = str(out_file.relative_to(root_dir)).replace('\\', '/')
-        dep_file_posix = str(dep_file.relative_to(root_dir)).replace('\\', '/')
-        cmd = [
-            "docker", "run", "--rm",
-            "-v", f"{root_dir}:/project",
-            "aquasec/trivy:latest", "fs",
-            "--format", "cyclonedx",
-            "--scanners", "vuln",
-            "--output", f"/project/sbom/{dep_file.name}.cdx.json",
-            f"/project/{dep_file_posix}"
-        ]
+    cmd = [
+        "docker", "run", "--rm",
+        "-v", f"{root_dir}:/project",
+        "aquasec/trivy:latest", "fs",
+        "--format", "cyclonedx",
+        "--scanners", "vuln",
+        "--output", f"/project/sbom/{sbom_name}",
+        f"/project/{dep_file_posix}"
+    ]
+    with span("scan_dependency_file", file=dep_file_posix, native=False) as s, profile_stage("scan_dependency_file"):
         subprocess.run(cmd, check=True)
-    
-    logger.info(f"Scan terminé. Tous les SBOM sont dans : {sbom_dir}")
+        count = annotate_source_file(out_file, dep_file_posix)
+        s.set(components=count, bytes_written=out_file.stat().st_size)
+    return out_file
 
-    dockerfiles = find_dockerfiles(root_dir)
-    logger.info(f"Dockerfiles trouvés : {dockerfiles}")
+def scan_image(root_dir: Path, sbom_dir: Path, dockerfile: Path) -> tuple[Path, str]:
+    """Build de l'image d'un Dockerfile puis scan Trivy CycloneDX ; retourne (SBOM produit, tag de l'image)"""
+    build_args = extract_build_args(dockerfile)
+    logger.info(f"📝 Build args détectés pour {dockerfile.name}: {build_args}")
     
-    for dockerfile in dockerfiles:
-        build_args = extract_build_args(dockerfile)
-        logger.info(f"📝 Build args détectés pour {dockerfile.name}: {build_args}")
-        
-        image_tag = f"sbom-scan-{dockerfile.parent.name.lower()}"
-        logger.info(f"Build de l'image Docker : {dockerfile} -> {image_tag}")
-        
-        build_cmd = [
-            "docker", "build",
-            "-f", str(dockerfile),
-            "-t", image_tag,
-        ]
-        
-        for arg_name, arg_value in build_args.items():
-            build_cmd.extend(["--build-arg", f"{arg_name}={arg_value}"])
-        
-        build_cmd.append(str(dockerfile.parent))
-        
-        logger.info(f"🔨 Commande: {' '.join(build_cmd)}")
+    image_tag = f"sbom-scan-{dockerfile.parent.name.lower()}"
+    logger.info(f"Build de l'image Docker : {dockerfile} -> {image_tag}")
+    
+    build_cmd = [
+        "docker", "build",
+        "-f", str(dockerfile),
+        "-t", image_tag,
+    ]
+    
+    for arg_name, arg_value in build_args.items():
+        build_cmd.extend(["--build-arg", f"{arg_name}={arg_value}"])
+    
+    build_cmd.append(str(dockerfile.parent))
+    
+    logger.info(f"🔨 Commande: {' '.join(build_cmd)}")
+    with span("docker_build", dockerfile=str(dockerfile.relative_to(root_dir)), image=image_tag):
         subprocess.run(build_cmd, check=True)
-        
-        out_file = sbom_dir / (dockerfile.parent.name + "-image.cdx.json")
-        logger.info(f"Scan Trivy CycloneDX de l'image : {image_tag} -> {out_file}")
-        scan_cmd = [
-            "docker", "run", "--rm",
-            "-v", f"{root_dir}:/project",
-            "-v", "/var/run/docker.sock:/var/run/docker.sock",
-            "aquasec/trivy:latest", "image",
-            "--format", "cyclonedx",
-            "--scanners", "vuln",
-            "--output", f"/project/sbom/{dockerfile.parent.name}-image.cdx.json",
-            image_tag
-        ]
+    
+    out_file = sbom_dir / (dockerfile.parent.name + "-image.cdx.json")
+    logger.info(f"Scan Trivy CycloneDX de l'image : {image_tag} -> {out_file}")
+    scan_cmd = [
+        "docker", "run", "--rm",
+        "-v", f"{root_dir}:/project",
+        "-v", "/var/run/docker.sock:/var/run/docker.sock",
+        "aquasec/trivy:latest", "image",
+        "--format", "cyclonedx",
+        "--scanners", "vuln",
+        "--output", f"/project/sbom/{dockerfile.parent.name}-image.cdx.json",
+        image_tag
+    ]
+    with span("scan_image", image=image_tag) as s:
         subprocess.run(scan_cmd, check=True)
-        
-        # Détection des runtimes
-        logger.info(f"🔍 Détection des runtimes dans {image_tag}...")
+        s.set(bytes_written=out_file.stat().st_size)
+    return out_file, image_tag
+
+def add_runtime_components(out_file: Path, image_tag: str) -> None:
+    """Détecte les runtimes de l'image et les ajoute à son SBOM"""
+    logger.info(f"🔍 Détection des runtimes dans {image_tag}...")
+    with span("runtime_probe", image=image_tag) as s, profile_stage("runtime_probe"):
         runtime_components = detect_runtime_components(image_tag)
-        
-        if runtime_components:
-            merge_cyclonedx_sboms(out_file, runtime_components)
-        
-        # Cleanup de l'image
+        s.set(components=len(runtime_components))
+    
+    if runtime_components:
+        merge_cyclonedx_sboms(out_file, runtime_components)
+
+def remove_image(image_tag: str) -> None:
+    with span("remove_image", image=image_tag):
         subprocess.run(["docker", "rmi", image_tag], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def run_scan(root_dir: Path, policy: Policy = None, native_lockfiles: bool = False) -> int:
+    """
+    Scanne les fichiers de dépendances puis les images des Dockerfiles.
+    Avec `native_lockfiles`, les lockfiles des formats courants sont lus sans Trivy
+    (sauf avec une politique : ces SBOM n'ont pas de vulnérabilités).
+    Avec une politique, chaque SBOM par source est vérifié dès sa production : à la
+    première violation, le travail restant est abandonné et sbom/policy-report.json
+    indique ce qui a été analysé ou non. Retourne le code de sortie (1 si politique enfreinte).
+    """
+    sbom_dir = root_dir / "sbom"
+    sbom_dir.mkdir(exist_ok=True)
+    logger.info(f"Recherche des fichiers de dépendances dans : {root_dir}")
+    with span("discovery") as s, profile_stage("discovery"):
+        dep_files = find_dependency_files(root_dir)
+        dockerfiles = find_dockerfiles(root_dir)
+        s.set(dependency_files=len(dep_files), dockerfiles=len(dockerfiles))
+    logger.info(f"Fichiers trouvés : {dep_files}")
+    logger.info(f"Dockerfiles trouvés : {dockerfiles}")
+
+    gate = None
+    if policy and native_lockfiles:
+        # Un SBOM natif ne porte aucune vulnérabilité : la politique le laisserait passer
+        logger.warning("⚠️ --native-lockfiles ignoré : la politique --fail-on a besoin des vulnérabilités de trivy fs")
+        native_lockfiles = False
+    if policy:
+        gate = PolicyGate(policy, [
+            *(("dependency-file", str(dep_file.relative_to(root_dir))) for dep_file in dep_files),
+            *(("dockerfile", str(dockerfile.relative_to(root_dir))) for dockerfile in dockerfiles),
+        ])
+
+    for dep_file in dep_files:
+        out_file = scan_dependency_file(root_dir, sbom_dir, dep_file, native_lockfiles)
+        if gate and gate.check("dependency-file", str(dep_file.relative_to(root_dir)), out_file):
+            break
+    else:
+        logger.info(f"Scan terminé. Tous les SBOM sont dans : {sbom_dir}")
+        
+        for dockerfile in dockerfiles:
+            out_file, image_tag = scan_image(root_dir, sbom_dir, dockerfile)
+            # Vérification avant les sondes runtime : elles n'ajoutent pas de vulnérabilités
+            violated = gate is not None and gate.check("dockerfile", str(dockerfile.relative_to(root_dir)), out_file)
+            if not violated:
+                add_runtime_components(out_file, image_tag)
+            
+            # Cleanup de l'image
+            remove_image(image_tag)
+            if violated:
+                break
+
+    if gate is None:
+        return 0
+    gate.write_report(sbom_dir / "policy-report.json")
+    return 1 if gate.failed else 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Génère un SBOM CycloneDX par fichier de dépendances et par Dockerfile")
+    parser.add_argument(
+        "--fail-on", choices=POLICY_SEVERITIES, default=None,
+        help="Politique bloquante : arrêt dès qu'une vulnérabilité de cette sévérité (ou plus grave) est trouvée",
+    )
+    parser.add_argument(
+        "--fixable-only", action="store_true",
+        help="Avec --fail-on, ne bloquer que sur les vulnérabilités ayant une version corrigée",
+    )
+    parser.add_argument(
+        "--allow", action="append", default=[], metavar="ID",
+        help="Id de vulnérabilité ignoré par la politique (option répétable)",
+    )
+    parser.add_argument(
+        "--native-lockfiles", action="store_true",
+        help="Lire les lockfiles courants (requirements.txt, package-lock.json, yarn.lock, go.sum, Cargo.lock, "
+             "poetry.lock, composer.lock, Gemfile.lock) sans Trivy ; les autres restent scannés par Trivy. "
+             "Sans effet avec --fail-on (les lockfiles sont alors scannés par Trivy)",
+    )
+    parser.add_argument(
+        "--allow-file", type=Path, default=None,
+        help="Fichier d'ids de vulnérabilités ignorés par la politique (un par ligne)",
+    )
+    parser.add_argument(
+        "--trace", action="store_true",
+        help="Chronomètre chaque étape : sbom/trace.json (Chrome trace, nouvelle trace) et sbom/trace-summary.txt",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Profile chaque étape : sbom/profile/*.pstats (cProfile) et *.memory.txt (tracemalloc, pic RSS)",
+    )
+    parser.add_argument(
+        "--metrics-file", type=Path, default=None,
+        help="Métriques de l'exécution au format texte Prometheus (collecteur textfile de node-exporter)",
+    )
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    policy = None
+    if args.fail_on:
+        policy = Policy(args.fail_on, args.fixable_only, load_allow_list(args.allow, args.allow_file))
+    # Les métriques sont calculées à partir des étapes enregistrées
+    tracer = enable_tracing() if args.trace or args.metrics_file else None
+    if args.profile:
+        enable_profiling()
+    start = time.perf_counter()
+    try:
+        exit_code = run_scan(Path.cwd(), policy, args.native_lockfiles)
+    finally:
+        if args.trace:
+            write_trace(Path.cwd() / "sbom", "trivy_scan", reset=True)
+        if args.profile:
+            write_profiles(Path.cwd() / "sbom", "trivy_scan")
+        if args.metrics_file:
+            write_metrics(args.metrics_file, tracer.spans, "trivy_scan", time.perf_counter() - start)
+    sys.exit(exit_code)
@@ -0,0 +1,291 @@
+"""
+Faux exécutables `docker` et `trivy` pour exécuter le pipeline hors ligne.
+
+FakeTools(bin_dir, ...).install() écrit dans `bin_dir` deux scripts `docker`
+et `trivy` et retourne l'environnement à passer aux sous-processus (PATH
+préfixé). Les scripts lisent leur configuration dans le fichier JSON désigné
+par FULLTRIVYSCAN_FAKE_TOOLS :
+
+  - latency : secondes d'attente par commande ("docker build", "trivy sbom"…,
+    puis "docker" / "trivy", puis "default")
+  - failures : [{"match": sous-chaîne de la ligne de commande, "exit_code": n,
+    "stderr": texte}], la première correspondance fait échouer l'appel
+  - components : taille des SBOM produits par `trivy fs` / `trivy image`
+  - runtimes : versions renvoyées aux sondes runtime (`which python3`, `node --version`…)
+
+Chaque appel est journalisé (outil, arguments, début, fin) en JSON lines dans
+le fichier `log`. Les SBOM produits viennent de synthetic_sbom.py, avec une
+graine dérivée de la cible (même cible -> même SBOM).
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import zlib
+from pathlib import Path
+
+CONFIG_ENV_VAR = "FULLTRIVYSCAN_FAKE_TOOLS"
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PIPELINE_SCRIPTS = ("trivy_scan.py", "merge_sbom.py", "metadata.py")
+
+# Nom du fichier de dépendances -> type purl des composants produits par `trivy fs`
+LOCKFILE_TYPES = {
+    "requirements.txt": "pypi", "requirements-dev.txt": "pypi", "Pipfile.lock": "pypi", "poetry.lock": "pypi",
+    "package-lock.json": "npm", "yarn.lock": "npm", "pnpm-lock.yaml": "npm",
+    "composer.lock": "composer", "Gemfile.lock": "gem", "go.sum": "golang", "Cargo.lock": "cargo",
+    "packages.lock.json": "nuget", "pom.xml": "maven", "build.gradle": "maven",
+}
+
+DEFAULT_RUNTIMES = {"python": "3.12.1", "node": "20.11.0"}
+
+TRIVY_VERSION = {"Version": "0.58.0", "VulnerabilityDB": {"Version": 2, "UpdatedAt": "2026-01-01T00:00:00Z"}}
+
+_SCRIPT = """#!{python} -S
+import sys
+sys.path.insert(0, {root!r})
+from test.fake_tools import main
+sys.exit(main({tool!r}, sys.argv[1:]))
+"""
+
+
+class FakeTools:
+    """Installe et configure les faux `docker` et `trivy` dans `bin_dir`"""
+
+    def __init__(self, bin_dir: Path, latency=0.0, failures: list = None, components: int = 50,
+                 runtimes: dict = None):
+        self.bin_dir = bin_dir
+        self.config_path = bin_dir / "fake-tools.json"
+        self.log_path = bin_dir / "fake-tools.log"
+        self.config = {
+            "latency": latency if isinstance(latency, dict) else {"default": latency},
+            "failures": failures or [],
+            "components": components,
+            "runtimes": DEFAULT_RUNTIMES if runtimes is None else runtimes,
+            "log": str(self.log_path),
+        }
+
+    def install(self) -> dict:
+        """Écrit les scripts et la configuration ; retourne l'environnement des sous-processus"""
+        self.bin_dir.mkdir(parents=True, exist_ok=True)
+        for tool in ("docker", "trivy"):
+            script = self.bin_dir / tool
+            script.write_text(_SCRIPT.format(python=sys.executable, root=str(REPO_ROOT), tool=tool), encoding="utf-8")
+            script.chmod(0o755)
+        self.config_path.write_text(json.dumps(self.config), encoding="utf-8")
+        self.log_path.write_text("", encoding="utf-8")
+        env = dict(os.environ)
+        env["PATH"] = f"{self.bin_dir}{os.pathsep}{env.get('PATH', '')}"
+        env[CONFIG_ENV_VAR] = str(self.config_path)
+        return env
+
+    def calls(self) -> list:
+        """Appels journalisés : [{"tool", "args", "start", "end", "exit_code"}]"""
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+def busy_seconds(calls: list) -> float:
+    """Durée cumulée des appels (somme des fin - début) ; divisée par la durée réelle : degré de parallélisme"""
+    return sum(call["end"] - call["start"] for call in calls)
+
+
+def _command(tool: str, args: list) -> str:
+    return f"{tool} {args[0]}" if args else tool
+
+
+def _latency(config: dict, tool: str, args: list) -> float:
+    latency = config["latency"]
+    for key in (_command(tool, args), tool, "default"):
+        if key in latency:
+            return latency[key]
+    return 0.0
+
+
+def _option(args: list, name: str):
+    return args[args.index(name) + 1] if name in args else None
+
+
+def _seed(target: str) -> int:
+    return zlib.crc32(target.encode())
+
+
+def _write_json(path: str, document) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f)
+
+
+def _trivy(config: dict, args: list) -> int:
+    from test.synthetic_sbom import SyntheticProject, fake_trivy_sbom
+
+    command = args[0] if args else ""
+    if command == "version":
+        print(json.dumps(TRIVY_VERSION))
+        return 0
+    if "--download-db-only" in args:
+        return 0
+
+    output = _option(args, "--output")
+    target = args[-1]
+    count = config["components"]
+    if command == "sbom":
+        fake_trivy_sbom(Path(args[1]), Path(output), _option(args, "--format"))
+    elif command == "fs":
+        name = Path(target).name
+        project = SyntheticProject(count * 4, seed=_seed(os.path.relpath(target)))
+        _write_json(output, project.lockfile_sbom(LOCKFILE_TYPES.get(name, "pypi"), name, count))
+    elif command == "image":
+        seed = _seed(target)
+        _write_json(output, SyntheticProject(count * 2, seed=seed).image_sbom(seed, count))
+    else:
+        print(f"fake trivy : commande non simulée {command!r}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def _probe(config: dict, command: list) -> tuple:
+    """Sonde runtime `docker run <image> <commande>` : (code de sortie, sortie standard)"""
+    runtimes = config["runtimes"]
+    if command[:2] == ["sh", "-c"]:
+        # "which python3 || which python"
+        return (0, "/usr/local/bin/python3\n") if "python" in runtimes else (1, "")
+    if command[0] == "which":
+        runtime = command[1]
+        return (0, f"/usr/local/bin/{runtime}\n") if runtime in runtimes else (1, "")
+    runtime = "python" if command[0].startswith("python") else command[0]
+    version = runtimes.get(runtime)
+    if version is None:
+        return 127, ""
+    if runtime == "php" and command[1:] == ["-m"]:
+        return 0, "[PHP Modules]\nCore\ncurl\njson\nmbstring\n"
+    return 0, {
+        "python": f"Python {version}\n",
+        "node": f"v{version}\n",
+        "php": f"PHP {version} (cli)\n",
+        "ruby": f"ruby {version} (2024-01-01) [x86_64-linux]\n",
+    }.get(runtime, f"{version}\n")
+
+
+def _docker(config: dict, args: list) -> int:
+    command = args[0] if args else ""
+    if command in ("build", "rmi"):
+        return 0
+    if command != "run":
+        print(f"fake docker : commande non simulée {command!r}", file=sys.stderr)
+        return 2
+
+    # docker run [options] <image> <arguments> : volumes traduits vers les chemins de l'hôte
+    volumes = []
+    position = 1
+    while position < len(args) and args[position].startswith("-"):
+        if args[position] == "-v":
+            host, _, container = args[position + 1].partition(":")
+            volumes.append((container, host))
+            position += 2
+        else:
+            position += 1
+    image, rest = args[position], args[position + 1:]
+    if image.startswith("aquasec/trivy"):
+        translated = []
+        for arg in rest:
+            for container, host in volumes:
+                if arg == container or arg.startswith(container + "/"):
+                    arg = host + arg[len(container):]
+                    break
+            translated.append(arg)
+        return _trivy(config, translated)
+
+    exit_code, stdout = _probe(config, rest)
+    sys.stdout.write(stdout)
+    return exit_code
+
+
+def _lockfile_content(name: str, packages: int, offset: int) -> str:
+    """Contenu minimal valide d'un fichier de dépendances (lisible aussi par lockfile_parsers)"""
+    entries = [(f"lib{offset + i}", f"1.{i % 10}.{offset % 7}") for i in range(packages)]
+    if name in ("requirements.txt", "requirements-dev.txt"):
+        return "".join(f"{package}=={version}\n" for package, version in entries)
+    if name == "package-lock.json":
+        return json.dumps({"lockfileVersion": 3, "packages": {
+            "": {"name": "app"}, **{f"node_modules/{package}": {"version": version} for package, version in entries}
+        }})
+    if name == "yarn.lock":
+        return "".join(f'{package}@^{version}:\n  version "{version}"\n\n' for package, version in entries)
+    if name == "go.sum":
+        return "".join(f"github.com/org/{package} v{version} h1:x=\n" for package, version in entries)
+    if name in ("Cargo.lock", "poetry.lock"):
+        source = 'source = "registry+https://github.com/rust-lang/crates.io-index"\n' if name == "Cargo.lock" else ""
+        return "".join(
+            f'[[package]]\nname = "{package}"\nversion = "{version}"\n{source}\n' for package, version in entries
+        )
+    if name == "composer.lock":
+        return json.dumps({"packages": [
+            {"name": f"vendor/{package}", "version": version} for package, version in entries
+        ]})
+    if name == "Gemfile.lock":
+        return "GEM\n  remote: https://rubygems.org/\n  specs:\n" + "".join(
+            f"    {package} ({version})\n" for package, version in entries
+        )
+    raise ValueError(f"Format de fichier de dépendances non généré : {name}")
+
+
+REPOSITORY_LOCKFILES = [
+    "requirements.txt", "package-lock.json", "yarn.lock", "go.sum",
+    "Cargo.lock", "poetry.lock", "composer.lock", "Gemfile.lock",
+]
+
+
+def write_repository(root: Path, lockfiles: int, dockerfiles: int, packages: int = 20) -> None:
+    """
+    Dépôt synthétique : `lockfiles` fichiers de dépendances (formats de
+    REPOSITORY_LOCKFILES, un par dossier services/svcN/) et `dockerfiles`
+    Dockerfiles (images/imgN/Dockerfile, un par dossier : un SBOM d'image chacun).
+    """
+    for i in range(lockfiles):
+        name = REPOSITORY_LOCKFILES[i % len(REPOSITORY_LOCKFILES)]
+        service = root / "services" / f"svc{i // len(REPOSITORY_LOCKFILES)}"
+        service.mkdir(parents=True, exist_ok=True)
+        (service / name).write_text(_lockfile_content(name, packages, i), encoding="utf-8")
+    for i in range(dockerfiles):
+        image = root / "images" / f"img{i}"
+        image.mkdir(parents=True, exist_ok=True)
+        (image / "Dockerfile").write_text(
+            "ARG PYTHON_VERSION=3.12\nFROM python:${PYTHON_VERSION}-slim\nCOPY . /app\n", encoding="utf-8"
+        )
+
+
+def run_pipeline(repo: Path, env: dict, *flags: str) -> list:
+    """
+    Exécute trivy_scan.py, merge_sbom.py puis metadata.py dans `repo` avec les
+    options `flags` et l'environnement de FakeTools.install(). Échoue
+    (AssertionError avec la sortie d'erreur) au premier script en erreur ;
+    retourne les CompletedProcess.
+    """
+    results = []
+    for script in PIPELINE_SCRIPTS:
+        result = subprocess.run([sys.executable, str(REPO_ROOT / "src" / script), *flags],
+                                cwd=repo, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise AssertionError(f"{script} : code {result.returncode}\n{result.stderr}")
+        results.append(result)
+    return results
+
+
+def main(tool: str, args: list) -> int:
+    with open(os.environ[CONFIG_ENV_VAR], "r", encoding="utf-8") as f:
+        config = json.load(f)
+    start = time.time()
+    time.sleep(_latency(config, tool, args))
+
+    line = " ".join([tool, *args])
+    failure = next((failure for failure in config["failures"] if failure["match"] in line), None)
+    if failure is not None:
+        sys.stderr.write(failure.get("stderr", f"fake {tool} : échec simulé\n"))
+        exit_code = failure.get("exit_code", 1)
+    else:
+        exit_code = _docker(config, args) if tool == "docker" else _trivy(config, args)
+
+    record = {"tool": tool, "args": args, "start": start, "end": time.time(), "exit_code": exit_code}
+    with open(config["log"], "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    return exit_code
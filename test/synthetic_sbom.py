@@ -0,0 +1,318 @@
+"""
+Générateur déterministe de SBOM CycloneDX synthétiques pour les benchmarks.
+
+Un projet synthétique ressemble à la sortie de trivy_scan.py : un SBOM par
+image (paquets OS de la distribution de base, paquets de langages, runtimes,
+binaires) et un SBOM annoté par fichier de dépendances. Les paquets de
+langages et les paquets OS sont tirés de réservoirs partagés, si bien qu'un
+même composant apparaît dans plusieurs images ; les CVE sont attachées aux
+paquets du réservoir et regroupées par id dans chaque SBOM (`affects` multiples).
+
+Même graine et même taille -> mêmes documents, octet pour octet.
+"""
+import json
+import random
+import uuid
+import zlib
+from pathlib import Path
+
+PKG_TYPE_PROPERTY = "aquasecurity:trivy:PkgType"
+SOURCE_FILE_PROPERTY = "fulltrivyscan:SourceFile"
+
+# type purl : (PkgType Trivy, fichier de dépendances, poids)
+LANGUAGE_ECOSYSTEMS = {
+    "pypi": ("python-pkg", "requirements.txt", 5),
+    "npm": ("node-pkg", "package-lock.json", 6),
+    "maven": ("jar", "pom.xml", 3),
+    "golang": ("gobinary", "go.sum", 3),
+    "gem": ("gemspec", "Gemfile.lock", 1),
+    "cargo": ("rust-binary", "Cargo.lock", 1),
+    "nuget": ("dotnet-core", "packages.lock.json", 1),
+    "composer": ("composer", "composer.lock", 1),
+}
+
+# distribution : (type purl, version, qualifier distro)
+DISTROS = {
+    "debian": ("deb", "12.5", "debian-12.5"),
+    "ubuntu": ("deb", "22.04", "ubuntu-22.04"),
+    "alpine": ("apk", "3.19.1", "3.19.1"),
+    "redhat": ("rpm", "9.3", "redhat-9.3"),
+}
+
+SEVERITIES = ["critical", "high", "medium", "low", "unknown"]
+SEVERITY_WEIGHTS = [1, 3, 5, 4, 1]
+
+# Part des composants dans les SBOM de fichiers de dépendances, part des paquets OS dans une image
+LOCKFILE_SHARE = 0.15
+OS_SHARE = 0.4
+# Probabilité qu'un paquet du réservoir soit vulnérable
+VULNERABLE_SHARE = 0.1
+
+
+class _Package:
+    __slots__ = ("name", "version", "purl", "pkg_type", "cves")
+
+    def __init__(self, name, version, purl, pkg_type, cves):
+        self.name = name
+        self.version = version
+        self.purl = purl
+        self.pkg_type = pkg_type
+        self.cves = cves
+
+
+class SyntheticProject:
+    """
+    Projet synthétique de `components` composants au total (avant fusion),
+    répartis entre images et fichiers de dépendances.
+    """
+
+    def __init__(self, components: int, seed: int = 0):
+        self.components = components
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self.images = min(40, max(2, components // 2500))
+        lockfile_total = int(components * LOCKFILE_SHARE)
+        image_total = components - lockfile_total
+        self._per_image = [image_total // self.images + (i < image_total % self.images) for i in range(self.images)]
+        self._lockfile_total = lockfile_total
+
+        language_total = int(image_total * (1 - OS_SHARE))
+        language_per_image = int(max(self._per_image) * (1 - OS_SHARE))
+        self._cve_pool = [f"CVE-{2019 + i % 7}-{10000 + i}" for i in range(max(16, components // 20))]
+        self._language_pool = {
+            purl_type: [
+                self._language_package(purl_type, i)
+                for i in range(self._pool_size(language_total, language_per_image, weight))
+            ]
+            for purl_type, (_, _, weight) in LANGUAGE_ECOSYSTEMS.items()
+        }
+        os_per_image = int(max(self._per_image) * OS_SHARE)
+        self._os_pool = {
+            distro: [self._os_package(distro, i) for i in range(int(os_per_image * 1.5) + 1)]
+            for distro in DISTROS
+        }
+
+    @staticmethod
+    def _pool_size(language_total: int, language_per_image: int, weight: int) -> int:
+        share = weight / sum(w for _, _, w in LANGUAGE_ECOSYSTEMS.values())
+        # Réservoir plus petit que la demande totale (les paquets se répètent d'une image à l'autre)
+        # mais assez grand pour qu'une image y tire sans remise
+        return int(max(language_total * 0.6, language_per_image * 2) * share) + 1
+
+    def _version(self) -> str:
+        rng = self._rng
+        return f"{rng.randint(0, 9)}.{rng.randint(0, 30)}.{rng.randint(0, 20)}"
+
+    def _cves(self) -> list:
+        if self._rng.random() >= VULNERABLE_SHARE:
+            return []
+        return self._rng.sample(self._cve_pool, self._rng.randint(1, 3))
+
+    def _language_package(self, purl_type: str, i: int) -> _Package:
+        version = self._version()
+        if purl_type == "npm" and i % 3 == 0:
+            name = f"@scope{i % 20}/module{i}"
+            purl = f"pkg:npm/%40scope{i % 20}/module{i}@{version}"
+        elif purl_type == "maven":
+            name = f"org.example{i % 50}:artifact{i}"
+            purl = f"pkg:maven/org.example{i % 50}/artifact{i}@{version}"
+        elif purl_type == "golang":
+            version = f"v{version}"
+            name = f"github.com/org{i % 40}/mod{i}"
+            purl = f"pkg:golang/{name}@{version}"
+        elif purl_type == "composer":
+            name = f"vendor{i % 30}/package{i}"
+            purl = f"pkg:composer/{name}@{version}"
+        else:
+            name = f"{purl_type}-lib{i}"
+            purl = f"pkg:{purl_type}/{name}@{version}"
+        return _Package(name, version, purl, LANGUAGE_ECOSYSTEMS[purl_type][0], self._cves())
+
+    def _os_package(self, distro: str, i: int) -> _Package:
+        purl_type, _, distro_qualifier = DISTROS[distro]
+        release = f"r{i % 5}" if purl_type == "apk" else f"{i % 9 + 1}"
+        version = f"{self._version()}-{release}"
+        name = f"lib{distro}{i}"
+        purl = f"pkg:{purl_type}/{distro}/{name}@{version}?arch=amd64&distro={distro_qualifier}"
+        return _Package(name, version, purl, distro, self._cves())
+
+    def _bom_ref(self) -> str:
+        return str(uuid.UUID(int=self._rng.getrandbits(128), version=4))
+
+    @staticmethod
+    def _component(package: _Package, bom_ref: str) -> dict:
+        return {
+            "bom-ref": bom_ref,
+            "type": "library",
+            "name": package.name,
+            "version": package.version,
+            "purl": package.purl,
+            "properties": [{"name": PKG_TYPE_PROPERTY, "value": package.pkg_type}],
+        }
+
+    def _vulnerabilities(self, affected: list) -> list:
+        """Vulnérabilités d'un SBOM : une entrée par CVE, un `affects` par composant touché"""
+        by_cve = {}
+        for bom_ref, package in affected:
+            for cve in package.cves:
+                by_cve.setdefault(cve, []).append({
+                    "ref": bom_ref,
+                    "versions": [{"version": package.version, "status": "affected"}],
+                })
+        return [
+            {
+                "id": cve,
+                "source": {"name": "nvd", "url": f"https://nvd.nist.gov/vuln/detail/{cve}"},
+                "ratings": [{"severity": _severity(cve), "method": "CVSSv31", "score": _score(cve)}],
+                "description": f"Synthetic vulnerability {cve}",
+                "advisories": [{"url": f"https://avd.aquasec.com/nvd/{cve.lower()}"}],
+                "affects": affects,
+            }
+            for cve, affects in by_cve.items()
+        ]
+
+    def _document(self, name: str, components: list, vulnerabilities: list, properties: list = None) -> dict:
+        metadata = {
+            "timestamp": "2026-01-01T00:00:00+00:00",
+            "tools": {"components": [{"type": "application", "name": "trivy", "version": "0.58.0"}]},
+            "component": {"bom-ref": self._bom_ref(), "type": "application", "name": name},
+        }
+        if properties:
+            metadata["properties"] = properties
+        return {
+            "$schema": "http://cyclonedx.org/schema/bom-1.6.schema.json",
+            "bomFormat": "CycloneDX",
+            "specVersion": "1.6",
+            "serialNumber": f"urn:uuid:{self._bom_ref()}",
+            "version": 1,
+            "metadata": metadata,
+            "components": components,
+            "dependencies": [],
+            "vulnerabilities": vulnerabilities,
+        }
+
+    def image_sbom(self, index: int, count: int) -> dict:
+        """SBOM d'image d'environ `count` composants ; la distribution de base dépend de `index`"""
+        rng = self._rng
+        distro = list(DISTROS)[index % len(DISTROS)]
+        go_version = f"v1.{21 + index % 3}.{rng.randint(0, 12)}"
+        # Composants de l'image de base et des runtimes
+        components = [
+            {"bom-ref": self._bom_ref(), "type": "operating-system", "name": distro, "version": DISTROS[distro][1]},
+            {"bom-ref": self._bom_ref(), "type": "library", "name": "stdlib", "version": go_version,
+             "purl": f"pkg:golang/stdlib@{go_version}"},
+            {"bom-ref": self._bom_ref(), "type": "application", "name": "usr/local/go/bin/go",
+             "purl": "pkg:golang/usr/local/go/bin/go"},
+        ]
+        binaries = max(1, count // 50)
+        components += [
+            {"bom-ref": self._bom_ref(), "type": "application", "name": f"usr/local/bin/tool{index}-{i}"}
+            for i in range(binaries)
+        ]
+
+        remaining = max(0, count - len(components))
+        os_count = min(int(remaining * OS_SHARE), len(self._os_pool[distro]))
+        packages = rng.sample(self._os_pool[distro], os_count)
+        ecosystems = list(LANGUAGE_ECOSYSTEMS)
+        weights = [weight for _, _, weight in LANGUAGE_ECOSYSTEMS.values()]
+        drawn = {purl_type: 0 for purl_type in ecosystems}
+        for purl_type in rng.choices(ecosystems, weights, k=remaining - os_count):
+            drawn[purl_type] += 1
+        for purl_type, wanted in drawn.items():
+            pool = self._language_pool[purl_type]
+            packages += rng.sample(pool, min(wanted, len(pool)))
+
+        affected = []
+        for package in packages:
+            bom_ref = self._bom_ref()
+            components.append(self._component(package, bom_ref))
+            if package.cves:
+                affected.append((bom_ref, package))
+        return self._document(f"service{index}-image", components, self._vulnerabilities(affected))
+
+    def _lockfile_sboms(self) -> dict:
+        """SBOM des fichiers de dépendances, bom-ref = purl comme avec `trivy fs`"""
+        documents = {}
+        lockfiles = [(index, purl_type) for index in range(2) for purl_type in LANGUAGE_ECOSYSTEMS]
+        per_lockfile, extra = divmod(self._lockfile_total, len(lockfiles))
+        for position, (index, purl_type) in enumerate(lockfiles):
+            lockfile = LANGUAGE_ECOSYSTEMS[purl_type][1]
+            source_file = f"service{index}/{lockfile}"
+            documents[f"service{index}__{lockfile}.cdx.json"] = self.lockfile_sbom(
+                purl_type, source_file, per_lockfile + (position < extra)
+            )
+        return documents
+
+    def lockfile_sbom(self, purl_type: str, source_file: str, count: int) -> dict:
+        """SBOM annoté d'un fichier de dépendances de l'écosystème `purl_type`, `count` composants au plus"""
+        pool = self._language_pool[purl_type]
+        packages = self._rng.sample(pool, min(count, len(pool)))
+        components = [self._component(package, package.purl) for package in packages]
+        vulnerabilities = self._vulnerabilities([(package.purl, package) for package in packages if package.cves])
+        properties = [{"name": SOURCE_FILE_PROPERTY, "value": source_file}]
+        return self._document(source_file, components, vulnerabilities, properties)
+
+    def sboms(self) -> dict:
+        """Nom de fichier -> SBOM CycloneDX, dans l'ordre de génération"""
+        self._rng = random.Random(self.seed + 1)
+        documents = {
+            f"service{index}-image.cdx.json": self.image_sbom(index, count)
+            for index, count in enumerate(self._per_image)
+        }
+        documents.update(self._lockfile_sboms())
+        return documents
+
+    def write(self, sbom_dir: Path) -> list:
+        """Écrit les SBOM par source dans `sbom_dir` ; retourne les chemins écrits"""
+        sbom_dir.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for name, sbom in self.sboms().items():
+            path = sbom_dir / name
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(sbom, f)
+            paths.append(path)
+        return paths
+
+
+def _severity(cve: str) -> str:
+    return random.Random(zlib.crc32(cve.encode())).choices(SEVERITIES, SEVERITY_WEIGHTS)[0]
+
+
+def _score(cve: str) -> float:
+    return round(random.Random(zlib.crc32(cve.encode()) + 1).uniform(1.0, 10.0), 1)
+
+
+def fixed_version(cve: str, purl: str, version: str):
+    """Version corrigée déterministe d'un couple (CVE, paquet), ou None (deux fois sur trois corrigée)"""
+    if zlib.crc32(f"{cve}|{purl}".encode()) % 3 == 0:
+        return None
+    return f"{version}.1"
+
+
+def fake_trivy_sbom(input_sbom: Path, output: Path, output_format: str) -> None:
+    """
+    Remplace metadata.run_trivy_sbom hors ligne : sortie CycloneDX = SBOM
+    d'entrée (vulnérabilités comprises), sortie JSON = Results[].Vulnerabilities[]
+    avec des FixedVersion déterministes.
+    """
+    with open(input_sbom, "r", encoding="utf-8") as f:
+        sbom = json.load(f)
+    if output_format == "cyclonedx":
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(sbom, f)
+        return
+
+    components = {component.get("bom-ref"): component for component in sbom.get("components", [])}
+    vulnerabilities = []
+    for vuln in sbom.get("vulnerabilities", []):
+        for affect in vuln.get("affects", []):
+            component = components.get(affect.get("ref"))
+            if component is None:
+                continue
+            vulnerabilities.append({
+                "VulnerabilityID": vuln["id"],
+                "FixedVersion": fixed_version(vuln["id"], component.get("purl", ""), component.get("version", "")),
+                "PkgIdentifier": {"BOMRef": component["bom-ref"], "PURL": component.get("purl")},
+            })
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"Results": [{"Vulnerabilities": vulnerabilities}]}, f)
@@ -0,0 +1,58 @@
+"""Tests unitaires pour attribution.py"""
+import pytest
+
+from attribution import LockfileIndex, annotated_source_file, attribution_key, source_files
+from spill_store import SpillDict
+
+
+class TestLockfileIndex:
+    """Tests pour la classe LockfileIndex"""
+    
+    def test_attribution_key(self):
+        """Test clé normalisée sans qualifiers ni subpath"""
+        assert attribution_key("pkg:PyPI/Django_Rest@3.0?a=1#sub") == "pkg:pypi/django-rest@3.0"
+        assert attribution_key("pkg:maven/org.example/lib@1.0?type=jar") == "pkg:maven/org.example/lib@1.0"
+    
+    def test_paths_sorted_and_deduplicated(self):
+        """Test chemins triés, sans doublon, purl ou chemin vide ignorés"""
+        index = LockfileIndex()
+        index.add("pkg:npm/left-pad@1.3.0", "web/package-lock.json")
+        index.add("pkg:npm/left-pad@1.3.0", "api/package-lock.json")
+        index.add("pkg:npm/left-pad@1.3.0", "web/package-lock.json")
+        index.add("", "api/package-lock.json")
+        index.add("pkg:npm/react@18.0.0", "")
+        
+        assert len(index) == 1
+        assert index.paths("pkg:npm/left-pad@1.3.0") == ["api/package-lock.json", "web/package-lock.json"]
+        assert index.lookup("pkg:npm/left-pad@1.3.0") == "api/package-lock.json, web/package-lock.json"
+        assert index.paths("pkg:npm/left-pad@1.4.0") == []
+        assert index.lookup("pkg:npm/left-pad@1.4.0") is None
+        assert index.lookup(None) is None
+    
+    def test_spilled_storage(self, tmp_path):
+        """Test index adossé à un SpillDict (mode mémoire bornée)"""
+        with SpillDict(1, tmp_path) as paths:
+            index = LockfileIndex(paths)
+            index.add("pkg:cargo/serde@1.0.0", "Cargo.lock")
+            index.add("pkg:cargo/tokio@1.0.0", "svc/Cargo.lock")
+            index.add("pkg:cargo/serde@1.0.0", "svc/Cargo.lock")
+            
+            assert paths.spilled
+            assert index.lookup("pkg:cargo/serde@1.0.0") == "Cargo.lock, svc/Cargo.lock"
+    
+    def test_source_files(self):
+        """Test source_file affiché -> fichiers sources"""
+        assert source_files("api/package-lock.json, web/package-lock.json") == [
+            "api/package-lock.json", "web/package-lock.json",
+        ]
+        assert source_files("Dockerfile (api)") == ["Dockerfile (api)"]
+        assert source_files(None) == [None]
+    
+    @pytest.mark.parametrize("sbom,expected", [
+        ({"metadata": {"properties": [{"name": "fulltrivyscan:SourceFile", "value": "api/go.sum"}]}}, "api/go.sum"),
+        ({"metadata": {"properties": [{"name": "other", "value": "x"}]}}, None),
+        ({}, None),
+    ])
+    def test_annotated_source_file(self, sbom, expected):
+        """Test lecture de la propriété fulltrivyscan:SourceFile"""
+        assert annotated_source_file(sbom) == expected
@@ -0,0 +1,291 @@
+"""
+Benchmarks de merge_sboms(), generate_metadata() et categorize_component()
+sur des projets synthétiques (voir synthetic_sbom.py), hors ligne.
+
+Chaque étape est mesurée deux fois : durée sans tracemalloc, puis pic mémoire
+avec tracemalloc. Les tailles viennent de FULLTRIVYSCAN_BENCH_SCALES
+(ex: "10000,100000,1000000", défaut : 2000) ; FULLTRIVYSCAN_BENCH_REPORT
+désigne un fichier JSON où enregistrer les mesures.
+
+Le pipeline complet (trivy_scan.py, merge_sbom.py, metadata.py) est aussi
+exécuté de bout en bout sur des dépôts synthétiques, avec les faux `docker`
+et `trivy` de fake_tools.py : FULLTRIVYSCAN_BENCH_REPOSITORIES donne les
+tailles "<fichiers de dépendances>x<Dockerfiles>" (défaut : 8x2) et
+FULLTRIVYSCAN_FAKE_LATENCY la latence simulée de chaque appel, en secondes.
+"""
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+import metadata
+from language_mappings import categorize_component
+from merge_sbom import load_sbom_files, merge_sboms
+from sbom_io import write_sbom
+from test.fake_tools import FakeTools, busy_seconds, write_repository
+from test.synthetic_sbom import SyntheticProject, fake_trivy_sbom
+
+SCALES_ENV_VAR = "FULLTRIVYSCAN_BENCH_SCALES"
+REPORT_ENV_VAR = "FULLTRIVYSCAN_BENCH_REPORT"
+TOLERANCE_ENV_VAR = "FULLTRIVYSCAN_BENCH_TOLERANCE"
+REPOSITORIES_ENV_VAR = "FULLTRIVYSCAN_BENCH_REPOSITORIES"
+LATENCY_ENV_VAR = "FULLTRIVYSCAN_FAKE_LATENCY"
+DEFAULT_SCALES = "2000"
+DEFAULT_REPOSITORIES = "8x2"
+
+# Seuils de régression par étape : (µs par composant, octets par composant au pic),
+# plus un coût fixe commun (démarrage, petits fichiers) ; environ 3x les mesures de référence
+THRESHOLDS = {
+    "merge": (25, 400),
+    "categorize": (15, 64),
+    "metadata": (200, 4096),
+}
+FIXED_SECONDS = 0.05
+FIXED_BYTES = 1 << 20
+
+# Pipeline : coût fixe par script (démarrage de l'interpréteur) et coût par appel d'outil simulé,
+# en plus de la latence injectée ; appels docker/trivy au plus par Dockerfile
+# (build, image, rmi et neuf sondes runtime)
+PIPELINE_FIXED_SECONDS = 2.0
+PIPELINE_CALL_SECONDS = 0.25
+MAX_CALLS_PER_DOCKERFILE = 12
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+def bench_scales() -> list:
+    return [int(scale) for scale in os.environ.get(SCALES_ENV_VAR, DEFAULT_SCALES).split(",") if scale.strip()]
+
+
+def bench_repositories() -> list:
+    """Tailles de dépôts (fichiers de dépendances, Dockerfiles)"""
+    return [
+        tuple(int(count) for count in size.split("x"))
+        for size in os.environ.get(REPOSITORIES_ENV_VAR, DEFAULT_REPOSITORIES).split(",") if size.strip()
+    ]
+
+
+def measure(setup, run) -> tuple:
+    """(durée en s, pic mémoire en octets) de run(*setup()), setup exclu de la mesure"""
+    args = setup()
+    start = time.perf_counter()
+    run(*args)
+    seconds = time.perf_counter() - start
+    del args
+
+    args = setup()
+    tracemalloc.start()
+    try:
+        run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+@pytest.fixture(scope="module")
+def bench_report():
+    """Mesures de la session, écrites dans FULLTRIVYSCAN_BENCH_REPORT si défini"""
+    results = []
+    yield results
+    report_path = os.environ.get(REPORT_ENV_VAR)
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+@pytest.fixture(scope="module", params=bench_scales(), ids=lambda scale: f"{scale}c")
+def project(request, tmp_path_factory):
+    """Projet synthétique écrit une fois par taille : SBOM par source + SBOM fusionné"""
+    components = request.param
+    source_dir = tmp_path_factory.mktemp(f"bench{components}") / "sbom"
+    SyntheticProject(components, seed=components).write(source_dir)
+    write_sbom(merge_sboms(load_sbom_files(source_dir)), source_dir / "merged-sbom.cdx.json")
+    return components, source_dir
+
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def check_thresholds(stage: str, components: int, seconds: float, peak: int, bench_report: list) -> None:
+    bench_report.append({"stage": stage, "components": components, "seconds": round(seconds, 4), "peak_bytes": peak})
+    tolerance = float(os.environ.get(TOLERANCE_ENV_VAR, "1"))
+    per_component_us, per_component_bytes = THRESHOLDS[stage]
+    max_seconds = tolerance * (FIXED_SECONDS + per_component_us * components / 1e6)
+    max_bytes = tolerance * (FIXED_BYTES + per_component_bytes * components)
+    assert seconds <= max_seconds, f"{stage} : {seconds:.3f} s > {max_seconds:.3f} s pour {components} composants"
+    assert peak <= max_bytes, f"{stage} : pic {peak} o > {max_bytes:.0f} o pour {components} composants"
+
+
+class TestSyntheticSbom:
+    """Tests pour le générateur de SBOM synthétiques"""
+
+    def test_deterministic(self):
+        """Test même graine -> mêmes documents, autre graine -> autres documents"""
+        first = json.dumps(SyntheticProject(500, seed=3).sboms())
+
+        assert json.dumps(SyntheticProject(500, seed=3).sboms()) == first
+        assert json.dumps(SyntheticProject(500, seed=4).sboms()) != first
+
+    def test_realistic_shape(self):
+        """Test taille, écosystèmes mélangés, composants partagés et CVE à plusieurs affects"""
+        sboms = SyntheticProject(10000, seed=1).sboms()
+        components = [component for sbom in sboms.values() for component in sbom["components"]]
+        merged = merge_sboms(list(sboms.values()))
+
+        assert len(components) == 10000
+        purl_types = {component["purl"].split("/")[0] for component in components if component.get("purl")}
+        assert {"pkg:pypi", "pkg:npm", "pkg:maven", "pkg:golang", "pkg:deb", "pkg:apk", "pkg:rpm"} <= purl_types
+        assert len(merged["components"]) < len(components)
+        assert any(len(vuln["affects"]) > 1 for vuln in merged["vulnerabilities"])
+        lockfile = sboms["service0__requirements.txt.cdx.json"]
+        assert lockfile["metadata"]["properties"] == [
+            {"name": "fulltrivyscan:SourceFile", "value": "service0/requirements.txt"}
+        ]
+
+
+@pytest.mark.benchmark
+class TestBenchmarks:
+    """Durée et pic mémoire par étape, comparés aux seuils de régression"""
+
+    def test_merge(self, project, bench_report):
+        """Test merge_sboms() sur les SBOM par source déjà chargés"""
+        components, sbom_dir = project
+        seconds, peak = measure(lambda: (load_sbom_files(sbom_dir),), merge_sboms)
+        check_thresholds("merge", components, seconds, peak, bench_report)
+
+    def test_categorize(self, project, bench_report):
+        """Test categorize_component() sur tous les composants, catégorisés comme composants d'image"""
+        components, sbom_dir = project
+        image_components = [
+            (component.get("purl", ""), component["name"])
+            for sbom in load_sbom_files(sbom_dir)
+            for component in sbom["components"]
+        ]
+
+        def categorize(items):
+            for purl, name in items:
+                categorize_component(purl, name, "docker-image", "Dockerfile (service0)", {"go": "v1.22.0"})
+
+        seconds, peak = measure(lambda: (image_components,), categorize)
+        check_thresholds("categorize", components, seconds, peak, bench_report)
+
+    def test_generate_metadata(self, project, tmp_path, monkeypatch, bench_report):
+        """Test generate_metadata() de bout en bout, Trivy simulé (copie du SBOM fusionné)"""
+        components, source_dir = project
+        monkeypatch.setattr(metadata, "run_trivy_sbom", fake_trivy_sbom)
+        monkeypatch.chdir(tmp_path)
+
+        def fresh_project():
+            # generate_metadata réécrit le SBOM fusionné : repartir d'une copie à chaque mesure
+            shutil.rmtree(tmp_path / "sbom", ignore_errors=True)
+            shutil.copytree(source_dir, tmp_path / "sbom")
+            return ()
+
+        seconds, peak = measure(fresh_project, metadata.generate_metadata)
+        check_thresholds("metadata", components, seconds, peak, bench_report)
+
+        stats = json.loads((tmp_path / "sbom" / "metadata.json").read_text(encoding="utf-8"))["stats"]
+        assert stats["total_components"] > 0
+        assert stats["total_vulnerabilities"] > 0
+
+
+class TestFakeTools:
+    """Tests pour les faux docker/trivy (fake_tools.py)"""
+
+    def run_scan(self, tmp_path, **options):
+        write_repository(tmp_path / "repo", lockfiles=2, dockerfiles=1)
+        tools = FakeTools(tmp_path / "bin", **options)
+        result = subprocess.run(
+            [sys.executable, str(SRC_DIR / "trivy_scan.py")],
+            cwd=tmp_path / "repo", env=tools.install(), capture_output=True, text=True,
+        )
+        return result, tools
+
+    def test_scan_offline(self, tmp_path):
+        """Test trivy_scan.py complet : SBOM par source produits, runtimes détectés, appels journalisés"""
+        result, tools = self.run_scan(tmp_path, runtimes={"python": "3.12.1"})
+
+        assert result.returncode == 0, result.stderr
+        sbom_dir = tmp_path / "repo" / "sbom"
+        assert sorted(path.name for path in sbom_dir.glob("*.cdx.json")) == [
+            "img0-image.cdx.json",
+            "services__svc0__package-lock.json.cdx.json",
+            "services__svc0__requirements.txt.cdx.json",
+        ]
+        image_sbom = json.loads((sbom_dir / "img0-image.cdx.json").read_text(encoding="utf-8"))
+        assert {"name": "python", "version": "3.12.1"}.items() <= image_sbom["components"][-1].items()
+        commands = [call["args"][0] for call in tools.calls() if call["tool"] == "docker"]
+        assert commands.count("build") == 1 and commands.count("rmi") == 1
+
+    def test_failure_injection(self, tmp_path):
+        """Test un échec injecté sur `docker build` interrompt le scan"""
+        result, tools = self.run_scan(tmp_path, failures=[
+            {"match": "docker build", "exit_code": 1, "stderr": "no space left on device\n"}
+        ])
+
+        assert result.returncode != 0
+        assert [call["exit_code"] for call in tools.calls() if call["args"][0] == "build"] == [1]
+
+    def test_latency(self, tmp_path):
+        """Test latence injectée par commande"""
+        result, tools = self.run_scan(tmp_path, latency={"docker build": 0.2})
+
+        build = next(call for call in tools.calls() if call["args"][0] == "build")
+        assert build["end"] - build["start"] >= 0.2
+
+
+@pytest.mark.benchmark
+class TestPipelineBenchmark:
+    """Pipeline complet sur des dépôts synthétiques, docker/trivy simulés"""
+
+    @pytest.mark.parametrize("native", [False, True], ids=["trivy-fs", "native-lockfiles"])
+    @pytest.mark.parametrize("lockfiles,dockerfiles", bench_repositories())
+    def test_pipeline(self, tmp_path, lockfiles, dockerfiles, native, bench_report):
+        """Test trivy_scan.py, merge_sbom.py puis metadata.py : durée et appels d'outils par étape"""
+        repo = tmp_path / "repo"
+        write_repository(repo, lockfiles, dockerfiles)
+        latency = float(os.environ.get(LATENCY_ENV_VAR, "0"))
+        tools = FakeTools(tmp_path / "bin", latency=latency)
+        env = tools.install()
+        tolerance = float(os.environ.get(TOLERANCE_ENV_VAR, "1"))
+
+        stages = [
+            ("trivy_scan", ["trivy_scan.py", *(["--native-lockfiles"] if native else [])]),
+            ("merge", ["merge_sbom.py"]),
+            ("metadata", ["metadata.py"]),
+        ]
+        for stage, command in stages:
+            before = len(tools.calls())
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, str(SRC_DIR / command[0]), *command[1:]],
+                cwd=repo, env=env, capture_output=True, text=True,
+            )
+            seconds = time.perf_counter() - start
+            assert result.returncode == 0, result.stderr[-2000:]
+
+            calls = tools.calls()[before:]
+            bench_report.append({
+                "stage": f"pipeline:{stage}", "lockfiles": lockfiles, "dockerfiles": dockerfiles,
+                "native_lockfiles": native, "latency": latency, "seconds": round(seconds, 4),
+                "tool_calls": len(calls), "tool_seconds": round(busy_seconds(calls), 4),
+            })
+            max_seconds = tolerance * (PIPELINE_FIXED_SECONDS + len(calls) * (PIPELINE_CALL_SECONDS + latency))
+            assert seconds <= max_seconds, f"{stage} : {seconds:.2f} s > {max_seconds:.2f} s ({len(calls)} appels)"
+            if stage == "trivy_scan":
+                max_calls = (0 if native else lockfiles) + MAX_CALLS_PER_DOCKERFILE * dockerfiles
+                assert len(calls) <= max_calls
+
+        stats = json.loads((repo / "sbom" / "metadata.json").read_text(encoding="utf-8"))["stats"]
+        assert stats["total_components"] > 0
@@ -0,0 +1,58 @@
+"""Tests unitaires pour component_model.py"""
+import pytest
+
+from component_model import intern_component, SourceInfo, ComponentSource, UNKNOWN_SOURCE
+
+
+class TestInternComponent:
+    """Tests pour la fonction intern_component"""
+    
+    def test_intern_property_names(self):
+        """Test les noms de propriétés identiques partagent la même chaîne"""
+        name1 = "".join(["aquasecurity:trivy:", "PkgType"])
+        name2 = "".join(["aquasecurity:trivy:", "PkgType"])
+        comp1 = intern_component({"properties": [{"name": name1, "value": "pip"}]})
+        comp2 = intern_component({"properties": [{"name": name2, "value": "pip"}]})
+        
+        assert comp1["properties"][0]["name"] is comp2["properties"][0]["name"]
+    
+    def test_intern_component_without_properties(self):
+        """Test composant sans propriétés"""
+        component = {"name": "flask", "type": "library"}
+        
+        assert intern_component(component) == {"name": "flask", "type": "library"}
+
+
+class TestCompactRecords:
+    """Tests pour SourceInfo et ComponentSource"""
+    
+    def test_source_info_as_dict(self):
+        """Test matérialisation de SourceInfo"""
+        source = SourceInfo("docker-image", "Dockerfile (api)")
+        
+        assert source.as_dict() == {"source_type": "docker-image", "source_file": "Dockerfile (api)"}
+    
+    def test_source_info_has_no_dict(self):
+        """Test les enregistrements utilisent __slots__"""
+        assert not hasattr(UNKNOWN_SOURCE, "__dict__")
+        assert not hasattr(ComponentSource("a", "1", "", "f", "t"), "__dict__")
+    
+    def test_component_source_as_dict(self):
+        """Test matérialisation de ComponentSource"""
+        source = ComponentSource("flask", "2.3.0", "pkg:pypi/flask@2.3.0", "requirements.txt", "python-dependency")
+        
+        assert source.as_dict() == {
+            "package_name": "flask",
+            "version": "2.3.0",
+            "purl": "pkg:pypi/flask@2.3.0",
+            "source_file": "requirements.txt",
+            "source_type": "python-dependency",
+        }
+    
+    def test_equal_records_hash_equal(self):
+        """Test enregistrements égaux : même hash (utilisables dans un set ou comme clés)"""
+        first = ComponentSource("flask", "2.3.0", "pkg:pypi/flask@2.3.0", "requirements.txt", "python-dependency")
+        second = ComponentSource("flask", "2.3.0", "pkg:pypi/flask@2.3.0", "requirements.txt", "python-dependency")
+        
+        assert first == second and hash(first) == hash(second)
+        assert len({first, second, SourceInfo("a", "b"), SourceInfo("a", "b")}) == 2
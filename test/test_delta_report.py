@@ -0,0 +1,148 @@
+"""Tests unitaires pour delta_report.py"""
+import pytest
+from pathlib import Path
+import json
+
+from delta_report import diff_runs, load_run, write_delta_report
+from metadata_db import connect, export_metadata_sqlite
+
+
+def affected(name, fix_status="unknown", fixed_version=None, source_file="requirements.txt"):
+    return {"package_name": name, "installed_version": "1.0", "fixed_version": fixed_version,
+            "fix_status": fix_status, "source_file": source_file,
+            "source_type": "python-dependency", "purl": f"pkg:pypi/{name}@1.0"}
+
+
+def run_metadata(commit, vulnerabilities):
+    return {
+        "generated_at": "2026-01-01T00:00:00Z", "repository": "owner/repo", "branch": "main",
+        "commit": commit, "run_id": commit, "component_sources": {},
+        "vulnerabilities": [
+            {"vulnerability_id": vuln_id, "severity": severity, "affected_packages": packages}
+            for vuln_id, severity, packages in vulnerabilities
+        ],
+    }
+
+
+@pytest.fixture
+def runs():
+    previous = run_metadata("aaa", [
+        ("CVE-1", "high", [affected("flask"), affected("jinja2")]),
+        ("CVE-2", "low", [affected("requests")]),
+    ])
+    current = run_metadata("bbb", [
+        ("CVE-1", "high", [affected("flask", "fixed", "2.3.3"), affected("jinja2")]),
+        ("CVE-3", "critical", [affected("django")]),
+    ])
+    return previous, current
+
+
+class TestDiffRuns:
+    """Tests pour la fonction diff_runs"""
+    
+    def test_new_resolved_changed(self, tmp_path, runs):
+        """Test classement nouvelles / résolues / modifiées"""
+        previous, current = runs
+        paths = []
+        for name, metadata in (("previous.json", previous), ("current.json", current)):
+            path = tmp_path / name
+            path.write_text(json.dumps(metadata, indent=2))
+            paths.append(path)
+        
+        delta = diff_runs(load_run(paths[0])[1], load_run(paths[1])[1])
+        
+        assert [(row["vulnerability_id"], row["package_name"]) for row in delta["new"]] == [("CVE-3", "django")]
+        assert [(row["vulnerability_id"], row["package_name"]) for row in delta["resolved"]] == [("CVE-2", "requests")]
+        assert len(delta["changed"]) == 1
+        assert delta["changed"][0]["fix_status"] == "fixed"
+        assert delta["changed"][0]["previous"] == {"fix_status": "unknown", "fixed_version": None}
+    
+    def test_key_includes_source_file(self):
+        """Test un même paquet dans un autre fichier source est une nouvelle entrée"""
+        previous = [{"vulnerability_id": "CVE-1", **affected("flask")}]
+        current = [{"vulnerability_id": "CVE-1", **affected("flask", source_file="api/requirements.txt")}]
+        
+        delta = diff_runs(previous, current)
+        
+        assert len(delta["new"]) == 1
+        assert len(delta["resolved"]) == 1
+    
+    def test_added_lockfile_keeps_shared_packages(self):
+        """Test un fichier de dépendances ajouté : seuls ses paquets sont nouveaux, les paquets partagés restent"""
+        previous = [{"vulnerability_id": "CVE-1", **affected("flask", source_file="api/requirements.txt")}]
+        current = [{"vulnerability_id": "CVE-1",
+                    **affected("flask", source_file="api/requirements.txt, worker/requirements.txt")}]
+        
+        delta = diff_runs(previous, current)
+        
+        assert [row["source_file"] for row in delta["new"]] == ["worker/requirements.txt"]
+        assert delta["resolved"] == [] and delta["changed"] == []
+
+
+class TestWriteDeltaReport:
+    """Tests pour la fonction write_delta_report"""
+    
+    def test_from_sqlite_snapshot(self, tmp_path, runs):
+        """Test référence précédente lue depuis la base SQLite (dernière exécution)"""
+        previous, current = runs
+        db_path = tmp_path / "metadata.sqlite"
+        export_metadata_sqlite(run_metadata("old", []), db_path)
+        export_metadata_sqlite(previous, db_path)
+        current_path = tmp_path / "metadata.json"
+        current_path.write_text(json.dumps(current, indent=2))
+        
+        report = write_delta_report(db_path, current_path, tmp_path / "delta.json")
+        
+        assert report["previous"]["commit"] == "aaa"
+        assert report["current"]["commit"] == "bbb"
+        assert report["stats"] == {"new": 1, "resolved": 1, "changed": 1}
+        assert json.loads((tmp_path / "delta.json").read_text()) == report
+    
+    def test_sqlite_snapshot_other_repository(self, tmp_path, runs):
+        """Test base partagée : la référence est la dernière exécution du même dépôt et de la même branche"""
+        previous, current = runs
+        db_path = tmp_path / "metadata.sqlite"
+        export_metadata_sqlite(previous, db_path)
+        export_metadata_sqlite(dict(run_metadata("zzz", []), repository="owner/other"), db_path)
+        export_metadata_sqlite(dict(run_metadata("yyy", []), branch="feature"), db_path)
+        current_path = tmp_path / "metadata.json"
+        current_path.write_text(json.dumps(current, indent=2))
+        
+        report = write_delta_report(db_path, current_path, tmp_path / "delta.json")
+        
+        assert report["previous"]["commit"] == "aaa"
+        assert report["stats"] == {"new": 1, "resolved": 1, "changed": 1}
+    
+    @pytest.mark.parametrize("baseline", ["missing", "empty_file", "empty_db", "other_branch"])
+    def test_first_run(self, tmp_path, runs, baseline):
+        """Test première exécution : pas de référence, toutes les entrées sont nouvelles"""
+        _, current = runs
+        db_path = tmp_path / "metadata.sqlite"
+        if baseline == "empty_file":
+            db_path.touch()
+        elif baseline == "empty_db":
+            connect(db_path).close()
+        elif baseline == "other_branch":
+            export_metadata_sqlite(dict(run_metadata("aaa", []), branch="feature"), db_path)
+        current_path = tmp_path / "metadata.json"
+        current_path.write_text(json.dumps(current, indent=2))
+        
+        report = write_delta_report(db_path, current_path, tmp_path / "delta.json")
+        
+        assert report["previous"] is None
+        assert report["stats"] == {"new": 3, "resolved": 0, "changed": 0}
+    
+    def test_current_run_excluded(self, tmp_path, runs):
+        """Test hors GitHub Actions (run_id "unknown") : l'exécution courante déjà exportée est exclue"""
+        previous, current = runs
+        previous, current = dict(previous, run_id="unknown"), dict(current, run_id="unknown")
+        db_path = tmp_path / "metadata.sqlite"
+        export_metadata_sqlite(previous, db_path)
+        run = export_metadata_sqlite(current, db_path)
+        current_path = tmp_path / "metadata.json"
+        current_path.write_text(json.dumps(current, indent=2))
+        
+        report = write_delta_report(db_path, current_path, tmp_path / "delta.json", exclude_run=run)
+        
+        assert report["previous"]["commit"] == "aaa"
+        assert report["stats"] == {"new": 1, "resolved": 1, "changed": 1}
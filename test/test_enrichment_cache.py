@@ -0,0 +1,79 @@
+"""Tests unitaires pour enrichment_cache.py"""
+import pytest
+from pathlib import Path
+
+from enrichment_cache import EnrichmentCache, component_cache_key, split_findings, assemble_vulnerabilities
+
+
+class TestEnrichmentCache:
+    """Tests pour la classe EnrichmentCache"""
+    
+    def test_put_and_get(self, tmp_path):
+        """Test enregistrement et lecture d'un payload"""
+        payload = {"vulnerabilities": [], "fixed_versions": {"CVE-1": "2.0"}}
+        with EnrichmentCache(tmp_path / "cache.sqlite", "2:2026-01-01") as cache:
+            cache.put_many({"pkg:pypi/flask@2.3.0": payload})
+            result = cache.get_many(["pkg:pypi/flask@2.3.0", "pkg:pypi/requests@2.31.0", None])
+            
+            assert result == {"pkg:pypi/flask@2.3.0": payload}
+            assert cache.hits == 1
+            assert cache.misses == 1
+    
+    def test_db_version_isolation(self, tmp_path):
+        """Test une nouvelle version de base invalide le cache"""
+        with EnrichmentCache(tmp_path / "cache.sqlite", "2:2026-01-01") as cache:
+            cache.put_many({"pkg:pypi/flask@2.3.0": {"vulnerabilities": [], "fixed_versions": {}}})
+        with EnrichmentCache(tmp_path / "cache.sqlite", "2:2026-01-02") as cache:
+            assert cache.get_many(["pkg:pypi/flask@2.3.0"]) == {}
+    
+    def test_many_keys(self, tmp_path):
+        """Test lecture de plus de clés qu'un lot SQLite"""
+        payloads = {f"pkg:npm/p{i}@1.0.0": {"vulnerabilities": [], "fixed_versions": {}} for i in range(1200)}
+        with EnrichmentCache(tmp_path / "cache.sqlite", "v") as cache:
+            cache.put_many(payloads)
+            
+            assert len(cache.get_many(payloads)) == 1200
+    
+    def test_component_cache_key(self):
+        """Test clé de cache depuis le purl normalisé"""
+        assert component_cache_key({"purl": "pkg:PyPI/Flask@2.3.0"}) == "pkg:pypi/flask@2.3.0"
+        assert component_cache_key({"name": "no-purl"}) is None
+
+
+class TestSplitAndAssemble:
+    """Tests pour split_findings et assemble_vulnerabilities"""
+    
+    @pytest.fixture
+    def components(self):
+        return [
+            {"bom-ref": "uuid-1", "purl": "pkg:pypi/flask@2.3.0"},
+            {"bom-ref": "uuid-2", "purl": "pkg:pypi/requests@2.31.0"},
+        ]
+    
+    def test_split_findings(self, components):
+        """Test découpage des résultats Trivy par composant"""
+        enriched = {"vulnerabilities": [
+            {"id": "CVE-1", "ratings": [{"severity": "high"}], "affects": [
+                {"ref": "uuid-1", "versions": [{"version": "2.3.0", "status": "affected"}]}
+            ]}
+        ]}
+        trivy_vulnerabilities = [
+            {"VulnerabilityID": "CVE-1", "FixedVersion": "2.3.3", "PkgIdentifier": {"PURL": "pkg:pypi/flask@2.3.0"}}
+        ]
+        
+        result = split_findings(components, enriched, trivy_vulnerabilities)
+        
+        assert result["uuid-1"]["fixed_versions"] == {"CVE-1": "2.3.3"}
+        assert result["uuid-1"]["vulnerabilities"][0]["vulnerability"] == {"id": "CVE-1", "ratings": [{"severity": "high"}]}
+        assert result["uuid-2"] == {"vulnerabilities": [], "fixed_versions": {}}
+    
+    def test_assemble_round_trip(self, components):
+        """Test reconstruction de la section vulnerabilities"""
+        enriched = {"vulnerabilities": [
+            {"id": "CVE-1", "affects": [{"ref": "uuid-1"}, {"ref": "uuid-2"}]}
+        ]}
+        payloads = split_findings(components, enriched, [])
+        
+        result = assemble_vulnerabilities([(ref, payloads[ref]) for ref in ("uuid-1", "uuid-2")])
+        
+        assert result == enriched["vulnerabilities"]
@@ -0,0 +1,175 @@
+"""Tests unitaires pour json_stream.py"""
+import pytest
+from pathlib import Path
+import json
+
+import json_stream
+from json_stream import iter_fields, iter_items, iter_trivy_vulnerabilities
+
+
+@pytest.fixture
+def trivy_report(tmp_path):
+    report = {
+        "SchemaVersion": 2,
+        "Results": [
+            {
+                "Target": "image-a",
+                "Packages": [{"Name": "curl", "Layers": [{"Digest": "sha256:0"}]}] * 20,
+                "Vulnerabilities": [
+                    {
+                        "VulnerabilityID": f"CVE-2023-{i:04d}",
+                        "FixedVersion": f"1.{i}.0",
+                        "PkgIdentifier": {"PURL": f"pkg:deb/debian/lib{i}@1.0"},
+                        "Description": "é" * 500,
+                        "CVSS": {"nvd": {"V3Score": 7.5}}
+                    }
+                    for i in range(50)
+                ]
+            },
+            {"Target": "requirements.txt"},
+            {"Target": "go.sum", "Vulnerabilities": []},
+            {"Target": "last", "Vulnerabilities": [{"VulnerabilityID": "CVE-2024-9999", "Score": 123456789}]}
+        ],
+        "Trailing": 42
+    }
+    path = tmp_path / "report.json"
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path, report
+
+
+class TestIterItems:
+    """Tests pour la fonction iter_items"""
+    
+    def test_nested_items(self, trivy_report):
+        """Test parcours de Results[].Vulnerabilities[]"""
+        path, report = trivy_report
+        expected = [v for r in report["Results"] for v in r.get("Vulnerabilities", [])]
+        
+        result = list(iter_items(path, "Results", "Vulnerabilities", backend="builtin"))
+        
+        assert result == expected
+    
+    @pytest.mark.parametrize("chunk_size", [1, 7, 100])
+    def test_small_chunks(self, trivy_report, chunk_size, monkeypatch):
+        """Test valeurs coupées entre deux lectures"""
+        path, report = trivy_report
+        expected = [v for r in report["Results"] for v in r.get("Vulnerabilities", [])]
+        original_init = json_stream._Scanner.__init__
+        monkeypatch.setattr(
+            json_stream._Scanner, "__init__",
+            lambda self, f, chunk_size_=chunk_size: original_init(self, f, chunk_size_)
+        )
+        
+        result = list(iter_items(path, "Results", "Vulnerabilities", backend="builtin"))
+        
+        assert result == expected
+    
+    @pytest.mark.parametrize("chunk_size", range(1, 9))
+    def test_numbers_split_between_chunks(self, tmp_path, chunk_size, monkeypatch):
+        """Test nombres coupés après "." ou "e" (sautés ou lus)"""
+        path = tmp_path / "report.json"
+        path.write_text('{"a":[12.5, -0.25e-3], "b":1E+10, "Results":[{"Vulnerabilities":'
+                        '[{"Score":7.5,"Epss":1.5e-05,"Count":120}, 3.0e2, -42]}], "c":0.5}')
+        original_init = json_stream._Scanner.__init__
+        monkeypatch.setattr(
+            json_stream._Scanner, "__init__",
+            lambda self, f, chunk_size_=chunk_size: original_init(self, f, chunk_size_)
+        )
+        
+        result = list(iter_items(path, "Results", "Vulnerabilities", backend="builtin"))
+        fields = list(iter_fields(path))
+        
+        assert result == [{"Score": 7.5, "Epss": 1.5e-05, "Count": 120}, 300.0, -42]
+        assert fields == list(json.loads(path.read_text()).items())
+    
+    def test_top_level_array(self, tmp_path):
+        """Test parcours d'un tableau de premier niveau"""
+        path = tmp_path / "sbom.cdx.json"
+        path.write_text(json.dumps({"metadata": {}, "components": [{"name": "a"}, {"name": "b"}]}))
+        
+        assert list(iter_items(path, "components", backend="builtin")) == [{"name": "a"}, {"name": "b"}]
+    
+    def test_missing_key(self, tmp_path):
+        """Test clé absente ou de type inattendu"""
+        path = tmp_path / "sbom.cdx.json"
+        path.write_text(json.dumps({"components": {"not": "an array"}}))
+        
+        assert list(iter_items(path, "vulnerabilities", backend="builtin")) == []
+        assert list(iter_items(path, "components", backend="builtin")) == []
+    
+    def test_invalid_json(self, tmp_path):
+        """Test JSON invalide"""
+        path = tmp_path / "broken.json"
+        path.write_text('{"Results": [{"Vulnerabilities": [{"VulnerabilityID": ')
+        
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_items(path, "Results", "Vulnerabilities", backend="builtin"))
+    
+    def test_unknown_backend(self, tmp_path):
+        """Test backend inconnu"""
+        path = tmp_path / "empty.json"
+        path.write_text("{}")
+        
+        with pytest.raises(ValueError):
+            list(iter_items(path, "Results", backend="yajl"))
+    
+    def test_ijson_backend(self, trivy_report):
+        """Test backend ijson (si installé)"""
+        pytest.importorskip("ijson")
+        path, report = trivy_report
+        
+        builtin = list(iter_trivy_vulnerabilities(path, backend="builtin"))
+        
+        assert list(iter_trivy_vulnerabilities(path, backend="ijson")) == builtin
+
+
+class TestIterFields:
+    """Tests pour la fonction iter_fields"""
+    
+    def test_fields_in_order(self, tmp_path):
+        """Test champs dans l'ordre du fichier, tableaux demandés lus en flux"""
+        path = tmp_path / "sbom.cdx.json"
+        path.write_text(json.dumps({
+            "bomFormat": "CycloneDX",
+            "components": [{"name": "a"}, {"name": "b"}],
+            "dependencies": [],
+            "vulnerabilities": [{"id": "CVE-1"}]
+        }))
+        
+        result = []
+        for key, value in iter_fields(path, streamed=("components", "vulnerabilities")):
+            result.append((key, list(value) if key in ("components", "vulnerabilities") else value))
+        
+        assert result == [
+            ("bomFormat", "CycloneDX"),
+            ("components", [{"name": "a"}, {"name": "b"}]),
+            ("dependencies", []),
+            ("vulnerabilities", [{"id": "CVE-1"}])
+        ]
+    
+    def test_unconsumed_stream_skipped(self, tmp_path):
+        """Test un tableau non consommé est sauté"""
+        path = tmp_path / "sbom.cdx.json"
+        path.write_text(json.dumps({"components": [{"name": "a"}], "version": 1}))
+        
+        keys = [key for key, _ in iter_fields(path, streamed=("components",))]
+        
+        assert keys == ["components", "version"]
+
+
+class TestIterTrivyVulnerabilities:
+    """Tests pour la fonction iter_trivy_vulnerabilities"""
+    
+    def test_only_needed_fields(self, trivy_report):
+        """Test seuls les champs utiles sont conservés"""
+        path, _ = trivy_report
+        
+        result = list(iter_trivy_vulnerabilities(path, backend="builtin"))
+        
+        assert len(result) == 51
+        assert result[0] == {
+            "VulnerabilityID": "CVE-2023-0000",
+            "FixedVersion": "1.0.0",
+            "PkgIdentifier": {"PURL": "pkg:deb/debian/lib0@1.0"}
+        }
+        assert result[-1] == {"VulnerabilityID": "CVE-2024-9999"}
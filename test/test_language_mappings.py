@@ -2,7 +2,9 @@
 import pytest
 from pathlib import Path
 
-from language_mappings import detect_runtime_versions, categorize_component
+from language_mappings import (
+    detect_runtime_versions, detect_runtime_versions_iter, categorize_component, categorize_components,
+)
 
 
 class TestDetectRuntimeVersions:
@@ -246,3 +248,73 @@ class TestCategorizeComponent:
         # qui retourne "dependency-file" pour les fichiers inconnus
         assert result["source_type"] == "dependency-file"
         assert result["source_file"] == "unknown"
+
+
+class TestCategorizeDockerImageDispatch:
+    """Tests de la table de handlers par type de purl (composants d'images Docker)"""
+    
+    @pytest.mark.parametrize("purl,name,expected_type,expected_file", [
+        ("pkg:deb/ubuntu/curl@7.88.1", "curl", "os-package-ubuntu", "Dockerfile (api)"),
+        ("pkg:apk/Alpine/bash@5.2", "bash", "os-package-alpine", "Dockerfile (api)"),
+        ("pkg:rpm/curl@7.61", "curl", "os-package-rhel", "Dockerfile (api)"),
+        ("pkg:pypi/flask@2.3.0", "flask", "python-dependency", "requirements.txt"),
+        ("pkg:npm/node@20.0.0", "usr/local/bin/node", "nodejs-runtime", "Dockerfile (api)"),
+        ("pkg:gradle/org.example/lib@1.0", "lib", "java-dependency", "pom.xml"),
+        ("pkg:maven/com.oracle/openjdk@21", "openjdk", "java-runtime", "Dockerfile (api)"),
+        ("pkg:cargo/serde@1.0", "serde", "rust-dependency", "Cargo.lock"),
+        ("pkg:composer/laravel/framework@10.0", "laravel/framework", "php-dependency", "composer.lock"),
+        ("pkg:nuget/Microsoft.AspNetCore.App@8.0", "Microsoft.AspNetCore.App", "dotnet-runtime", "Dockerfile (api)"),
+        ("pkg:gem/rails@7.1", "rails", "ruby-dependency", "Gemfile.lock"),
+        ("pkg:golang/stdlib@v1.21.0", "stdlib", "go-runtime", "Dockerfile (api)"),
+        ("pkg:generic/tool@1.0", "usr/local/go/bin/gofmt", "go-toolchain", "Dockerfile (api)"),
+        ("pkg:PyPI/flask@2.3.0", "flask", "docker-image", "Dockerfile (api)"),
+        ("", "debian", "os-image-debian", "Dockerfile (api)"),
+        ("", "usr/local/bin/app", "application-binary", "Dockerfile (api)"),
+    ])
+    def test_dispatch(self, purl, name, expected_type, expected_file):
+        """Test un handler par type de purl, mêmes résultats que la chaîne de préfixes"""
+        result = categorize_component(purl, name, "docker-image", "Dockerfile (api)", {"go": "v1.21.0"})
+        
+        assert result["source_type"] == expected_type
+        assert result["source_file"] == expected_file
+    
+    def test_go_toolchain_version_without_golang_purl(self):
+        """Test outil Go sans purl golang enrichi avec la version Go détectée"""
+        result = categorize_component("", "usr/local/go/pkg/tool/linux_amd64/vet", "docker-image", "Dockerfile", {"go": "v1.21.0"})
+        
+        assert result == {"source_type": "go-toolchain", "source_file": "Dockerfile", "version": "v1.21.0"}
+
+
+class TestBatchApi:
+    """Tests pour categorize_components et detect_runtime_versions_iter"""
+    
+    COMPONENTS = [
+        {"name": "curl", "purl": "pkg:deb/debian/curl@7.88.1", "version": "7.88.1"},
+        {"name": "usr/local/go/bin/go", "purl": "", "version": None},
+        {"name": "flask", "purl": "pkg:pypi/flask@2.3.0", "version": "2.3.0"},
+        {"name": "python3", "purl": "pkg:pypi/python3@3.11.2", "version": "3.11.2"},
+        {"name": "stdlib", "purl": "pkg:golang/stdlib@v1.21.0", "version": "v1.21.0"},
+        {"name": "debian"},
+    ]
+    
+    @pytest.mark.parametrize("source", [("docker-image", "Dockerfile (api)"), ("dependency-file", "api/go.sum")])
+    def test_columns_match_per_component(self, source):
+        """Test colonnes parallèles identiques aux appels unitaires"""
+        runtime_versions = {"go": "v1.21.0"}
+        
+        columns = categorize_components(self.COMPONENTS, source, runtime_versions)
+        
+        for i, component in enumerate(self.COMPONENTS):
+            expected = categorize_component(component.get("purl", ""), component.get("name", ""), *source, runtime_versions)
+            assert columns["source_type"][i] == expected["source_type"]
+            assert columns["source_file"][i] == expected["source_file"]
+            assert columns["version"][i] == expected.get("version")
+    
+    def test_runtime_versions_iter_streams(self):
+        """Test dict() du flux égal à detect_runtime_versions, générateur accepté"""
+        components = self.COMPONENTS + [{"name": "python3.12", "purl": "pkg:pypi/python3.12@3.12.0", "version": "3.12.0"}]
+        
+        streamed = dict(detect_runtime_versions_iter(iter(components)))
+        
+        assert streamed == detect_runtime_versions({"components": components})
+        assert streamed == {"python": "3.11.2", "go": "v1.21.0"}
@@ -0,0 +1,173 @@
+"""Tests unitaires pour lockfile_parsers.py"""
+import json
+import pytest
+
+from lockfile_parsers import build_lockfile_sbom, has_native_parser, npm_purl, pypi_purl, write_lockfile_sbom
+
+LOCKFILES = {
+    "requirements.txt": (
+        "# commentaire\n"
+        "-r base.txt\n"
+        "Flask_SQLAlchemy==3.1.1\n"
+        "requests[socks] == 2.31.0 ; python_version >= '3.8'\n"
+        "django>=4.2\n",
+        ["pkg:pypi/flask-sqlalchemy@3.1.1", "pkg:pypi/requests@2.31.0"],
+    ),
+    "package-lock.json": (
+        json.dumps({"lockfileVersion": 3, "packages": {
+            "": {"name": "app", "version": "1.0.0"},
+            "node_modules/lodash": {"version": "4.17.21"},
+            "node_modules/a/node_modules/@babel/core": {"version": "7.24.0"},
+            "node_modules/local": {"resolved": "packages/local", "link": True},
+            "node_modules/jest": {"version": "29.7.0", "dev": True},
+            "node_modules/fsevents": {"version": "2.3.3", "devOptional": True, "optional": True},
+        }}),
+        ["pkg:npm/lodash@4.17.21", "pkg:npm/%40babel/core@7.24.0"],
+    ),
+    "yarn.lock": (
+        "# yarn lockfile v1\n\n"
+        '"@babel/core@^7.0.0", "@babel/core@^7.1.0":\n'
+        '  version "7.24.0"\n'
+        "  dependencies:\n"
+        '    lodash "^4"\n\n'
+        "lodash@^4:\n"
+        '  version "4.17.21"\n',
+        ["pkg:npm/%40babel/core@7.24.0", "pkg:npm/lodash@4.17.21"],
+    ),
+    "go.sum": (
+        "github.com/gin-gonic/gin v1.9.1 h1:abc=\n"
+        "github.com/gin-gonic/gin v1.9.1/go.mod h1:def=\n"
+        "golang.org/x/net v0.17.0/go.mod h1:ghi=\n",
+        ["pkg:golang/github.com/gin-gonic/gin@v1.9.1"],
+    ),
+    "Cargo.lock": (
+        'version = 3\n\n'
+        '[[package]]\nname = "app"\nversion = "0.1.0"\n\n'
+        '[[package]]\nname = "serde"\nversion = "1.0.190"\n'
+        'source = "registry+https://github.com/rust-lang/crates.io-index"\n',
+        ["pkg:cargo/serde@1.0.190"],
+    ),
+    "poetry.lock": (
+        '[[package]]\nname = "Jinja2"\nversion = "3.1.2"\n\n'
+        '[[package]]\nname = "markupsafe"\nversion = "2.1.3"\n',
+        ["pkg:pypi/jinja2@3.1.2", "pkg:pypi/markupsafe@2.1.3"],
+    ),
+    "composer.lock": (
+        json.dumps({"packages": [{"name": "monolog/monolog", "version": "3.5.0"}],
+                    "packages-dev": [{"name": "phpunit/phpunit", "version": "10.4.0"}]}),
+        ["pkg:composer/monolog/monolog@3.5.0"],
+    ),
+    "Gemfile.lock": (
+        "GEM\n"
+        "  remote: https://rubygems.org/\n"
+        "  specs:\n"
+        "    nokogiri (1.15.4-arm64-darwin)\n"
+        "      racc (~> 1.4)\n"
+        "    nokogiri (1.15.4-x86_64-linux)\n"
+        "      racc (~> 1.4)\n"
+        "    rack (3.0.8)\n"
+        "    rails (7.1.2)\n"
+        "      rack (>= 2.2.4)\n\n"
+        "PLATFORMS\n"
+        "  arm64-darwin\n"
+        "  x86_64-linux\n",
+        ["pkg:gem/nokogiri@1.15.4", "pkg:gem/rack@3.0.8", "pkg:gem/rails@7.1.2"],
+    ),
+}
+
+
+class TestPurls:
+    """Tests pour la construction des purls"""
+
+    def test_pypi_purl_normalized(self):
+        """Test nom PyPI normalisé (PEP 503)"""
+        assert pypi_purl("Zope.Interface", "6.1") == "pkg:pypi/zope-interface@6.1"
+
+    def test_npm_scoped_purl(self):
+        """Test le scope npm devient le namespace encodé"""
+        assert npm_purl("@types/node", "20.1.0") == "pkg:npm/%40types/node@20.1.0"
+
+
+class TestParsers:
+    """Tests pour les parseurs de fichiers de dépendances"""
+
+    @pytest.mark.parametrize("filename", sorted(LOCKFILES))
+    def test_parser_purls(self, tmp_path, filename):
+        """Test composants et purls produits pour chaque format"""
+        content, expected = LOCKFILES[filename]
+        dep_file = tmp_path / filename
+        dep_file.write_text(content, encoding="utf-8")
+
+        sbom = build_lockfile_sbom(dep_file, filename)
+
+        assert [c["purl"] for c in sbom["components"]] == expected
+        assert all(c["bom-ref"] == c["purl"] for c in sbom["components"])
+
+    @pytest.mark.parametrize("content", [
+        # yarn v1
+        "# yarn lockfile v1\n\n"
+        "express@^4.18.0:\n"
+        '  version "4.18.2"\n'
+        "  dependencies:\n"
+        '    "@types/shared" "^1.0.0"\n\n'
+        '"@types/shared@^1.0.0":\n'
+        '  version "1.0.1"\n\n'
+        "jest@^29.0.0:\n"
+        '  version "29.7.0"\n'
+        "  dependencies:\n"
+        '    "@types/shared" "^1.0.0"\n'
+        '    pretty-format "^29.7.0"\n\n'
+        "pretty-format@^29.7.0:\n"
+        '  version "29.7.0"\n',
+        # berry
+        "__metadata:\n  version: 8\n\n"
+        '"express@npm:^4.18.0":\n'
+        "  version: 4.18.2\n"
+        "  dependencies:\n"
+        '    "@types/shared": "npm:^1.0.0"\n\n'
+        '"@types/shared@npm:^1.0.0":\n'
+        "  version: 1.0.1\n\n"
+        '"jest@npm:^29.0.0":\n'
+        "  version: 29.7.0\n"
+        "  dependencies:\n"
+        '    pretty-format: "npm:^29.7.0"\n\n'
+        '"pretty-format@npm:^29.7.0":\n'
+        "  version: 29.7.0\n\n"
+        '"app@workspace:.":\n'
+        "  version: 0.0.0-use.local\n",
+    ], ids=["v1", "berry"])
+    def test_yarn_dev_dependencies_excluded(self, tmp_path, content):
+        """Test yarn.lock : paquets atteignables uniquement depuis devDependencies exclus, comme Trivy"""
+        (tmp_path / "package.json").write_text(json.dumps({
+            "dependencies": {"express": "^4.18.0"}, "devDependencies": {"jest": "^29.0.0"},
+        }))
+        dep_file = tmp_path / "yarn.lock"
+        dep_file.write_text(content, encoding="utf-8")
+
+        sbom = build_lockfile_sbom(dep_file, "yarn.lock")
+
+        assert [c["purl"] for c in sbom["components"]] == ["pkg:npm/express@4.18.2", "pkg:npm/%40types/shared@1.0.1"]
+
+    def test_has_native_parser(self, tmp_path):
+        """Test formats non couverts laissés à Trivy"""
+        assert has_native_parser(tmp_path / "api" / "poetry.lock")
+        assert not has_native_parser(tmp_path / "Pipfile.lock")
+        assert not has_native_parser(tmp_path / "pom.xml")
+
+
+class TestLockfileSbom:
+    """Tests pour le SBOM CycloneDX produit"""
+
+    def test_write_lockfile_sbom(self, tmp_path):
+        """Test SBOM annoté, dédupliqué et sans vulnérabilités"""
+        dep_file = tmp_path / "requirements.txt"
+        dep_file.write_text("flask==2.3.0\nFlask==2.3.0\n", encoding="utf-8")
+        out_file = tmp_path / "api__requirements.txt.cdx.json"
+
+        assert write_lockfile_sbom(dep_file, "api/requirements.txt", out_file) == 1
+
+        sbom = json.loads(out_file.read_text(encoding="utf-8"))
+        assert sbom["bomFormat"] == "CycloneDX"
+        assert sbom["metadata"]["properties"] == [{"name": "fulltrivyscan:SourceFile", "value": "api/requirements.txt"}]
+        assert sbom["components"][0]["properties"] == [{"name": "aquasecurity:trivy:PkgType", "value": "pip"}]
+        assert "vulnerabilities" not in sbom
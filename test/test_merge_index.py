@@ -0,0 +1,197 @@
+"""Tests unitaires pour merge_index.py"""
+import pytest
+from pathlib import Path
+import json
+import os
+
+from merge_index import MergeIndex
+import merge_sbom
+from merge_sbom import merge_sboms, list_sbom_files, rekeyed_ref
+from test.synthetic_sbom import SyntheticProject
+
+
+def write_sbom(path, components, vulnerabilities=None):
+    sbom = {
+        "bomFormat": "CycloneDX",
+        "specVersion": "1.6",
+        "metadata": {"tools": {"components": [{"name": "trivy", "version": "0.50.0"}]}},
+        "components": components,
+        "dependencies": [],
+    }
+    if vulnerabilities:
+        sbom["vulnerabilities"] = vulnerabilities
+    path.write_text(json.dumps(sbom))
+    return sbom
+
+
+class TestMergeIndex:
+    """Tests pour la classe MergeIndex"""
+    
+    @pytest.fixture
+    def sbom_dir(self, tmp_path):
+        sbom_dir = tmp_path / "sbom"
+        sbom_dir.mkdir()
+        write_sbom(sbom_dir / "requirements.txt.cdx.json", [
+            {"bom-ref": "uuid-1", "name": "flask", "version": "2.3.0", "purl": "pkg:pypi/flask@2.3.0"}
+        ])
+        write_sbom(sbom_dir / "api-image.cdx.json", [
+            {"bom-ref": "uuid-2", "name": "flask", "version": "2.3.0", "purl": "pkg:pypi/flask@2.3.0"},
+            {"bom-ref": "uuid-3", "name": "curl", "version": "7.88.1", "purl": "pkg:deb/debian/curl@7.88.1"}
+        ], [{"id": "CVE-2023-0001", "affects": [{"ref": "uuid-3"}]}])
+        return sbom_dir
+    
+    def test_sync_adds_inputs(self, sbom_dir, tmp_path):
+        """Test ajout initial des SBOM dans l'index"""
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            stats = index.sync(list_sbom_files(sbom_dir))
+        
+        assert stats == {"added": 2, "updated": 0, "removed": 0, "unchanged": 0}
+    
+    def test_sync_unchanged(self, sbom_dir, tmp_path):
+        """Test seconde synchronisation sans changement"""
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            index.sync(list_sbom_files(sbom_dir))
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            stats = index.sync(list_sbom_files(sbom_dir))
+        
+        assert stats["unchanged"] == 2
+        assert stats["added"] == stats["updated"] == stats["removed"] == 0
+    
+    def test_sync_touched_but_identical(self, sbom_dir, tmp_path):
+        """Test un fichier réécrit à l'identique n'est pas réindexé"""
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            index.sync(list_sbom_files(sbom_dir))
+            sbom_file = sbom_dir / "requirements.txt.cdx.json"
+            stat = sbom_file.stat()
+            os.utime(sbom_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            stats = index.sync(list_sbom_files(sbom_dir))
+        
+        assert stats["unchanged"] == 2
+    
+    def test_sync_updated_and_removed(self, sbom_dir, tmp_path):
+        """Test mise à jour et retrait d'entrées"""
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            index.sync(list_sbom_files(sbom_dir))
+            write_sbom(sbom_dir / "requirements.txt.cdx.json", [
+                {"bom-ref": "uuid-9", "name": "requests", "version": "2.31.0", "purl": "pkg:pypi/requests@2.31.0"}
+            ])
+            (sbom_dir / "api-image.cdx.json").unlink()
+            stats = index.sync(list_sbom_files(sbom_dir))
+            merged = index.build_merged()
+        
+        assert stats["updated"] == 1
+        assert stats["removed"] == 1
+        assert [c["name"] for c in merged["components"]] == ["requests"]
+        assert "vulnerabilities" not in merged
+    
+    def test_build_merged_matches_full_merge(self, sbom_dir, tmp_path):
+        """Test le SBOM régénéré depuis l'index est équivalent à une fusion complète"""
+        sbom_files = list_sbom_files(sbom_dir)
+        expected = merge_sboms([json.loads(f.read_text()) for f in sbom_files])
+        
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            index.sync(sbom_files)
+            merged = index.build_merged()
+        
+        assert merged["components"] == expected["components"]
+        assert merged["vulnerabilities"] == expected["vulnerabilities"]
+        assert merged["metadata"]["tools"] == expected["metadata"]["tools"]
+    
+    def test_build_merged_reused_when_unchanged(self, sbom_dir, tmp_path):
+        """Test le SBOM fusionné est réutilisé si aucune entrée n'a changé, avec un numéro de série neuf"""
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            index.sync(list_sbom_files(sbom_dir))
+            first = index.build_merged()
+            index.sync(list_sbom_files(sbom_dir))
+            second = index.build_merged()
+        
+        assert first["components"] == second["components"]
+        assert first["serialNumber"] != second["serialNumber"]
+    
+    def test_incremental_matches_full_merge(self, sbom_dir, tmp_path):
+        """Test après modification d'une entrée, dépendances et affects réécrits comme une fusion complète"""
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            index.sync(list_sbom_files(sbom_dir))
+            index.build_merged()
+            sbom = write_sbom(sbom_dir / "worker-image.cdx.json", [
+                {"bom-ref": "uuid-7", "name": "flask", "version": "2.3.0", "purl": "pkg:pypi/flask@2.3.0"},
+                {"bom-ref": "uuid-8", "name": "curl", "version": "7.88.1", "purl": "pkg:deb/debian/curl@7.88.1"},
+                {"bom-ref": "uuid-3", "name": "wget", "version": "1.21", "purl": "pkg:deb/debian/wget@1.21"},
+            ], [{"id": "CVE-2023-0001", "affects": [{"ref": "uuid-8"}, {"ref": "uuid-3"}]}])
+            sbom["dependencies"] = [{"ref": "uuid-8", "dependsOn": ["uuid-7", "uuid-3"]}]
+            (sbom_dir / "worker-image.cdx.json").write_text(json.dumps(sbom))
+            stats = index.sync(list_sbom_files(sbom_dir))
+            merged = index.build_merged()
+        
+        expected = merge_sboms([json.loads(f.read_text()) for f in list_sbom_files(sbom_dir)])
+        assert stats["added"] == 1 and stats["unchanged"] == 2
+        # uuid-3 est déjà la ref de curl : wget reçoit la même ref régénérée qu'une fusion complète
+        assert [c["name"] for c in merged["components"]] == ["flask", "curl", "wget"]
+        assert merged["components"][2]["bom-ref"] == rekeyed_ref("pkg:deb/debian/wget@1.21")
+        assert merged["components"] == expected["components"]
+        assert merged["dependencies"] == expected["dependencies"]
+        assert merged["vulnerabilities"] == expected["vulnerabilities"]
+    
+    def test_index_matches_plain_merge(self, sbom_dir, tmp_path, monkeypatch):
+        """Test merge_sbom.py avec et sans --index : même SBOM fusionné (hors numéro de série et horodatage)"""
+        SyntheticProject(300, seed=3).write(sbom_dir)
+        write_sbom(sbom_dir / "0-collisions.cdx.json", [
+            {"bom-ref": "uuid-3", "name": "wget", "version": "1.21", "purl": "pkg:deb/debian/wget@1.21"},
+            {"bom-ref": "uuid-2", "name": "flask", "version": "2.3.0", "purl": "pkg:pypi/flask@2.3.0"},
+        ], [{"id": "CVE-2023-0001", "affects": [{"ref": "uuid-3"}, {"ref": "uuid-2"}]}])
+        monkeypatch.chdir(tmp_path)
+        
+        def merged_document(*argv):
+            merge_sbom.main(list(argv))
+            merged = json.loads((sbom_dir / "merged-sbom.cdx.json").read_text())
+            del merged["serialNumber"], merged["metadata"]["timestamp"]
+            del merged["metadata"]["component"]["bom-ref"]
+            return merged
+        
+        expected = merged_document()
+        assert merged_document("--index", str(tmp_path / "index.sqlite")) == expected
+        # Après une modification incrémentale
+        (sbom_dir / "api-image.cdx.json").unlink()
+        expected = merged_document()
+        assert merged_document("--index", str(tmp_path / "index.sqlite")) == expected
+    
+    def test_only_touched_keys_are_recomputed(self, sbom_dir, tmp_path):
+        """Test une entrée modifiée ne relit pas les lignes des entrées sans clé commune"""
+        write_sbom(sbom_dir / "go.sum.cdx.json", [
+            {"bom-ref": "uuid-5", "name": "cobra", "version": "1.8.0", "purl": "pkg:golang/github.com/spf13/cobra@1.8.0"}
+        ])
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            index.sync(list_sbom_files(sbom_dir))
+            index.build_merged()
+            # Lignes d'entrée illisibles : une fusion complète échouerait
+            index.conn.execute(
+                "UPDATE components SET body = 'corrompu' WHERE identity = 'pkg:golang/github.com/spf13/cobra@1.8.0'"
+            )
+            write_sbom(sbom_dir / "requirements.txt.cdx.json", [
+                {"bom-ref": "uuid-9", "name": "requests", "version": "2.31.0", "purl": "pkg:pypi/requests@2.31.0"}
+            ])
+            index.sync(list_sbom_files(sbom_dir))
+            merged = index.build_merged()
+        
+        assert [c["name"] for c in merged["components"]] == ["flask", "curl", "cobra", "requests"]
+    
+    def test_all_inputs_removed(self, sbom_dir, tmp_path):
+        """Test sans aucune entrée, le SBOM fusionné est un document CycloneDX vide"""
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            index.sync(list_sbom_files(sbom_dir))
+            index.build_merged()
+            stats = index.sync([])
+            merged = index.build_merged()
+        
+        assert stats["removed"] == 2
+        assert merged["bomFormat"] == "CycloneDX"
+        assert merged["components"] == [] and merged["dependencies"] == []
+        assert "vulnerabilities" not in merged
+    
+    def test_find_component_by_identity(self, sbom_dir, tmp_path):
+        """Test recherche des entrées contenant une identité canonique"""
+        with MergeIndex(tmp_path / "index.sqlite") as index:
+            index.sync(list_sbom_files(sbom_dir))
+            paths = index.find_component("pkg:pypi/flask@2.3.0")
+        
+        assert len(paths) == 2
@@ -3,7 +3,7 @@ import pytest
 from pathlib import Path
 import json
 
-from merge_sbom import load_sbom_files, merge_sboms
+from merge_sbom import load_sbom_files, merge_sboms, normalize_purl, component_identity, rekeyed_ref
 
 
 class TestLoadSbomFiles:
@@ -55,6 +55,16 @@ class TestLoadSbomFiles:
         result = load_sbom_files(tmp_path)
         
         assert len(result) == 1
+    
+    def test_load_sbom_files_ignore_merged_output(self, tmp_path):
+        """Test ignore le SBOM fusionné d'une exécution précédente"""
+        sbom_data = {"bomFormat": "CycloneDX"}
+        (tmp_path / "test.cdx.json").write_text(json.dumps(sbom_data))
+        (tmp_path / "merged-sbom.cdx.json").write_text(json.dumps(sbom_data))
+        
+        result = load_sbom_files(tmp_path)
+        
+        assert len(result) == 1
 
 
 class TestMergeSboms:
@@ -273,3 +283,171 @@ class TestMergeSboms:
         
         assert result["specVersion"] == "1.6"
         assert result["bomFormat"] == "CycloneDX"
+
+
+class TestNormalizePurl:
+    """Tests pour la fonction normalize_purl"""
+    
+    def test_normalize_purl_lowercases_type(self):
+        """Test type purl en minuscules"""
+        assert normalize_purl("pkg:PyPI/requests@2.31.0") == "pkg:pypi/requests@2.31.0"
+    
+    def test_normalize_purl_pypi_name(self):
+        """Test normalisation des noms PyPI"""
+        assert normalize_purl("pkg:pypi/Django_Rest@3.0") == "pkg:pypi/django-rest@3.0"
+    
+    def test_normalize_purl_sorts_qualifiers(self):
+        """Test tri des qualifiers"""
+        result = normalize_purl("pkg:deb/debian/curl@7.88.1?distro=debian-12&arch=amd64")
+        
+        assert result == "pkg:deb/debian/curl@7.88.1?arch=amd64&distro=debian-12"
+    
+    def test_normalize_purl_decodes_namespace(self):
+        """Test décodage du namespace npm encodé"""
+        assert normalize_purl("pkg:npm/%40babel/core@7.0.0") == "pkg:npm/@babel/core@7.0.0"
+    
+    def test_normalize_purl_keeps_case_sensitive_types(self):
+        """Test conservation de la casse pour les types sensibles"""
+        assert normalize_purl("pkg:golang/github.com/Foo/Bar@v1.0.0") == "pkg:golang/github.com/Foo/Bar@v1.0.0"
+    
+    def test_normalize_purl_not_a_purl(self):
+        """Test chaîne qui n'est pas un purl"""
+        assert normalize_purl("not-a-purl") == "not-a-purl"
+
+
+class TestComponentIdentity:
+    """Tests pour la fonction component_identity"""
+    
+    def test_identity_from_purl(self):
+        """Test identité depuis le purl, indépendante du bom-ref"""
+        comp1 = {"bom-ref": "uuid-1", "purl": "pkg:pypi/Flask@2.3.0"}
+        comp2 = {"bom-ref": "uuid-2", "purl": "pkg:pypi/flask@2.3.0"}
+        
+        assert component_identity(comp1) == component_identity(comp2)
+    
+    def test_identity_from_name_version_type(self):
+        """Test identité name@version@type sans purl"""
+        component = {"bom-ref": "uuid-1", "name": "php", "version": "8.2.15", "type": "application"}
+        
+        assert component_identity(component) == "php@8.2.15@application"
+    
+    def test_identity_type_distinguishes(self):
+        """Test le type distingue deux composants de même nom"""
+        comp1 = {"name": "openssl", "version": "3.0", "type": "library"}
+        comp2 = {"name": "openssl", "version": "3.0", "type": "application"}
+        
+        assert component_identity(comp1) != component_identity(comp2)
+
+
+class TestMergeSbomsRefRewrite:
+    """Tests pour la réécriture des bom-ref lors de la fusion"""
+    
+    def test_merge_uuid_refs_same_purl(self):
+        """Test un même package avec des bom-ref UUID différents n'apparaît qu'une fois"""
+        sbom1 = {"components": [{"bom-ref": "uuid-a", "name": "curl", "purl": "pkg:deb/debian/curl@7.88.1"}]}
+        sbom2 = {"components": [{"bom-ref": "uuid-b", "name": "curl", "purl": "pkg:deb/debian/curl@7.88.1"}]}
+        
+        result = merge_sboms([sbom1, sbom2])
+        
+        assert len(result["components"]) == 1
+        assert result["components"][0]["bom-ref"] == "uuid-a"
+    
+    def test_merge_rewrites_dependencies(self):
+        """Test les dépendances pointent vers le bom-ref conservé"""
+        sbom1 = {
+            "components": [{"bom-ref": "uuid-a", "name": "curl", "purl": "pkg:deb/debian/curl@7.88.1"}],
+            "dependencies": [{"ref": "root-1", "dependsOn": ["uuid-a"]}]
+        }
+        sbom2 = {
+            "components": [
+                {"bom-ref": "uuid-b", "name": "curl", "purl": "pkg:deb/debian/curl@7.88.1"},
+                {"bom-ref": "uuid-c", "name": "libcurl", "purl": "pkg:deb/debian/libcurl@7.88.1"}
+            ],
+            "dependencies": [
+                {"ref": "root-2", "dependsOn": ["uuid-b"]},
+                {"ref": "uuid-b", "dependsOn": ["uuid-c"]}
+            ]
+        }
+        
+        result = merge_sboms([sbom1, sbom2])
+        deps = {dep["ref"]: dep["dependsOn"] for dep in result["dependencies"]}
+        
+        assert deps["root-2"] == ["uuid-a"]
+        assert deps["uuid-a"] == ["uuid-c"]
+        assert "uuid-b" not in deps
+    
+    def test_merge_rewrites_vulnerability_affects(self):
+        """Test les affects d'une même CVE sont réécrits et unifiés"""
+        sbom1 = {
+            "components": [{"bom-ref": "uuid-a", "name": "curl", "purl": "pkg:deb/debian/curl@7.88.1"}],
+            "vulnerabilities": [{"id": "CVE-2023-0001", "affects": [{"ref": "uuid-a"}]}]
+        }
+        sbom2 = {
+            "components": [
+                {"bom-ref": "uuid-b", "name": "curl", "purl": "pkg:deb/debian/curl@7.88.1"},
+                {"bom-ref": "uuid-c", "name": "wget", "purl": "pkg:deb/debian/wget@1.21"}
+            ],
+            "vulnerabilities": [{"id": "CVE-2023-0001", "affects": [{"ref": "uuid-b"}, {"ref": "uuid-c"}]}]
+        }
+        
+        result = merge_sboms([sbom1, sbom2])
+        
+        assert len(result["vulnerabilities"]) == 1
+        refs = [affect["ref"] for affect in result["vulnerabilities"][0]["affects"]]
+        assert refs == ["uuid-a", "uuid-c"]
+    
+    def test_merge_keeps_properties_of_duplicates(self):
+        """Test les propriétés des doublons sont conservées sur le composant fusionné"""
+        sbom1 = {"components": [{
+            "bom-ref": "pkg:pypi/flask@2.3.0", "purl": "pkg:pypi/flask@2.3.0",
+            "properties": [{"name": "aquasecurity:trivy:PkgType", "value": "pip"}]
+        }]}
+        sbom2 = {"components": [{
+            "bom-ref": "pkg:pypi/flask@2.3.0", "purl": "pkg:pypi/flask@2.3.0",
+            "properties": [{"name": "aquasecurity:trivy:PkgType", "value": "python-pkg"}]
+        }]}
+        
+        result = merge_sboms([sbom1, sbom2])
+        
+        values = [prop["value"] for prop in result["components"][0]["properties"]]
+        assert values == ["pip", "python-pkg"]
+    
+    def test_merge_rekeys_colliding_bom_ref(self):
+        """Test deux composants distincts partageant une bom-ref : le second reçoit une ref unique"""
+        sbom1 = {
+            "components": [{"bom-ref": "app", "name": "api", "version": "1.0", "type": "application"}],
+            "dependencies": [{"ref": "app", "dependsOn": []}],
+        }
+        sbom2 = {
+            "components": [
+                {"bom-ref": "app", "name": "worker", "version": "2.0", "type": "application"},
+                {"bom-ref": "uuid-c", "name": "celery", "purl": "pkg:pypi/celery@5.3.0"},
+            ],
+            "dependencies": [{"ref": "app", "dependsOn": ["uuid-c"]}],
+            "vulnerabilities": [{"id": "CVE-2023-0002", "affects": [{"ref": "app"}]}],
+        }
+        
+        result = merge_sboms([sbom1, sbom2])
+        refs = [component["bom-ref"] for component in result["components"]]
+        worker_ref = result["components"][1]["bom-ref"]
+        deps = {dep["ref"]: dep.get("dependsOn", []) for dep in result["dependencies"]}
+        
+        assert len(set(refs)) == 3
+        assert refs[0] == "app" and worker_ref == rekeyed_ref("worker@2.0@application")
+        assert deps["app"] == []
+        assert deps[worker_ref] == ["uuid-c"]
+        assert result["vulnerabilities"][0]["affects"] == [{"ref": worker_ref}]
+    
+    def test_merge_does_not_mutate_inputs(self):
+        """Test les documents d'entrée restent intacts (propriétés, bom-ref)"""
+        sbom1 = {"components": [{"name": "flask", "purl": "pkg:pypi/flask@2.3.0",
+                                 "properties": [{"name": "a", "value": "1"}]}]}
+        sbom2 = {"components": [{"bom-ref": "uuid-b", "name": "flask", "purl": "pkg:pypi/flask@2.3.0",
+                                 "properties": [{"name": "b", "value": "2"}]}]}
+        
+        result = merge_sboms([sbom1, sbom2])
+        
+        assert result["components"][0]["bom-ref"] == "uuid-b"
+        assert len(result["components"][0]["properties"]) == 2
+        assert sbom1["components"][0] == {"name": "flask", "purl": "pkg:pypi/flask@2.3.0",
+                                          "properties": [{"name": "a", "value": "1"}]}
@@ -0,0 +1,581 @@
+"""Tests unitaires pour metadata.py"""
+import pytest
+from pathlib import Path
+import json
+import shutil
+import sqlite3
+
+import metadata
+from metadata import detect_fix_status, load_source_sboms, source_info_for
+from metadata import build_fixed_version_index, lookup_fixed_version
+from metadata import VulnerabilityRollup, describe_vulnerability
+from severity import vulnerability_severity
+from metadata import categorize_merged_component, categorize_merged_components
+from attribution import LockfileIndex
+from json_stream import iter_trivy_vulnerabilities
+from component_model import SourceInfo, ComponentSource
+from sbom_io import SbomReader, index_path_for, write_sbom
+from slim_sbom import text_store_path_for, write_slim_sbom
+from merge_sbom import iter_sbom_files, merge_sboms
+
+
+class TestDetectFixStatus:
+    """Tests pour la fonction detect_fix_status"""
+    
+    def test_fixed(self):
+        """Test statut fixed si une version corrigée existe"""
+        assert detect_fix_status("2.0.0", []) == "fixed"
+    
+    def test_patched_no_version_bump(self):
+        """Test statut patched-no-version-bump"""
+        assert detect_fix_status(None, [{"status": "affected"}]) == "patched-no-version-bump"
+    
+    def test_unknown(self):
+        """Test statut unknown"""
+        assert detect_fix_status(None, [{"status": "affected", "version": "1.0"}]) == "unknown"
+
+
+class TestLoadSourceSboms:
+    """Tests pour la fonction load_source_sboms"""
+    
+    @pytest.fixture
+    def sbom_dir(self, tmp_path):
+        sbom_dir = tmp_path / "sbom"
+        sbom_dir.mkdir()
+        (sbom_dir / "api-image.cdx.json").write_text(json.dumps({"components": [
+            {"bom-ref": "uuid-1", "name": "stdlib", "purl": "pkg:golang/stdlib@1.21.0", "version": "1.21.0"},
+            {"bom-ref": "uuid-2", "name": "curl", "purl": "pkg:deb/debian/curl@7.88.1", "version": "7.88.1"}
+        ]}))
+        (sbom_dir / "requirements.txt.cdx.json").write_text(json.dumps({"components": [
+            {"purl": "pkg:pypi/flask@2.3.0", "name": "flask", "version": "2.3.0"}
+        ]}))
+        (sbom_dir / "merged-sbom.cdx.json").write_text(json.dumps({"components": [
+            {"bom-ref": "merged-only", "name": "ignored"}
+        ]}))
+        return sbom_dir
+    
+    def test_runtime_versions(self, sbom_dir):
+        """Test détection des versions runtime"""
+        runtime_versions, _ = load_source_sboms(sbom_dir)
+        
+        assert runtime_versions == {"go": "1.21.0"}
+    
+    def test_ref_to_source(self, sbom_dir):
+        """Test mapping ref -> source"""
+        _, ref_to_source = load_source_sboms(sbom_dir)
+        
+        assert ref_to_source["uuid-1"] == SourceInfo("docker-image", "Dockerfile (api)")
+        assert ref_to_source["pkg:pypi/flask@2.3.0"] == SourceInfo("dependency-file", "requirements.txt")
+        assert "merged-only" not in ref_to_source
+    
+    def test_source_shared_per_file(self, sbom_dir):
+        """Test une seule instance de source par fichier"""
+        _, ref_to_source = load_source_sboms(sbom_dir)
+        
+        assert ref_to_source["uuid-1"] is ref_to_source["uuid-2"]
+    
+    def test_each_file_read_once(self, sbom_dir, monkeypatch):
+        """Test chaque SBOM par source n'est décodé qu'une seule fois"""
+        calls = []
+        original_load = json.load
+        
+        def counting_load(f, *args, **kwargs):
+            calls.append(Path(f.name).name)
+            return original_load(f, *args, **kwargs)
+        
+        monkeypatch.setattr(metadata.json, "load", counting_load)
+        load_source_sboms(sbom_dir)
+        
+        assert sorted(calls) == ["api-image.cdx.json", "requirements.txt.cdx.json"]
+    
+    def test_source_info_for(self):
+        """Test détermination de la source depuis le nom de fichier"""
+        assert source_info_for(Path("package-lock.json.cdx.json")) == SourceInfo("dependency-file", "package-lock.json")
+        assert source_info_for(Path("worker-image.cdx.json")) == SourceInfo("docker-image", "Dockerfile (worker)")
+        assert source_info_for(Path("my-image__yarn.lock.cdx.json"), "my-image/yarn.lock") == \
+            SourceInfo("dependency-file", "my-image/yarn.lock")
+    
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_annotated_source_file_and_attribution(self, sbom_dir, stream):
+        """Test chemin réel lu dans metadata.properties et index purl -> fichiers de dépendances"""
+        for directory in ("web", "api"):
+            (sbom_dir / f"{directory}__requirements.txt.cdx.json").write_text(json.dumps({
+                "metadata": {"properties": [{"name": "fulltrivyscan:SourceFile", "value": f"{directory}/requirements.txt"}]},
+                "components": [{"purl": "pkg:pypi/Flask@2.3.0", "name": "flask", "version": "2.3.0"}],
+            }))
+        attribution = LockfileIndex()
+        
+        _, ref_to_source = load_source_sboms(sbom_dir, {} if stream else None, attribution)
+        
+        assert ref_to_source["pkg:pypi/Flask@2.3.0"].source_file in ("api/requirements.txt", "web/requirements.txt")
+        expected = "api/requirements.txt, requirements.txt, web/requirements.txt"
+        assert attribution.lookup("pkg:pypi/flask@2.3.0") == expected
+        assert attribution.lookup("pkg:pypi/flask@2.3.0?foo=bar") == expected
+        assert attribution.lookup("pkg:deb/debian/curl@7.88.1") is None
+
+
+class TestCachedEnrichment:
+    """Tests pour l'enrichissement incrémental avec cache"""
+    
+    @pytest.fixture
+    def sbom_dir(self, tmp_path):
+        sbom_dir = tmp_path / "sbom"
+        sbom_dir.mkdir()
+        (sbom_dir / "merged-sbom.cdx.json").write_text(json.dumps({
+            "bomFormat": "CycloneDX",
+            "components": [
+                {"bom-ref": "uuid-1", "name": "flask", "purl": "pkg:pypi/flask@2.3.0"},
+                {"bom-ref": "uuid-2", "name": "requests", "purl": "pkg:pypi/requests@2.31.0"}
+            ],
+            "dependencies": []
+        }))
+        return sbom_dir
+    
+    @pytest.fixture
+    def fake_trivy(self, monkeypatch):
+        """Remplace Trivy : flask est vulnérable, les autres non"""
+        scanned = []
+        
+        def fake_run_trivy_sbom(input_sbom, output, output_format):
+            sbom = json.loads(Path(input_sbom).read_text())
+            scanned.append([c["name"] for c in sbom["components"]])
+            flask = [c for c in sbom["components"] if c["name"] == "flask"]
+            if output_format == "cyclonedx":
+                vulns = [{"id": "CVE-1", "affects": [{"ref": c["bom-ref"]} for c in flask]}] if flask else []
+                Path(output).write_text(json.dumps(dict(sbom, vulnerabilities=vulns)))
+            else:
+                vulns = [{"VulnerabilityID": "CVE-1", "FixedVersion": "2.3.3",
+                          "PkgIdentifier": {"BOMRef": c["bom-ref"], "PURL": c["purl"]}} for c in flask]
+                Path(output).write_text(json.dumps({"Results": [{"Vulnerabilities": vulns}]}))
+        
+        monkeypatch.setattr(metadata, "run_trivy_sbom", fake_run_trivy_sbom)
+        monkeypatch.setattr(metadata, "trivy_db_version", lambda: "2:2026-01-01")
+        return scanned
+    
+    def test_first_run_scans_everything(self, sbom_dir, fake_trivy, tmp_path):
+        """Test premier passage : tous les composants sont analysés"""
+        output, fixed = metadata.run_trivy_sbom_enrichment(sbom_dir, tmp_path / "cache.sqlite")
+        
+        assert fake_trivy == [["flask", "requests"], ["flask", "requests"]]
+        assert fixed[("CVE-1", "uuid-1")] == "2.3.3"
+        enriched = json.loads(output.read_text())
+        assert enriched["vulnerabilities"] == [{"id": "CVE-1", "affects": [{"ref": "uuid-1"}]}]
+    
+    def test_second_run_skips_trivy(self, sbom_dir, fake_trivy, tmp_path):
+        """Test second passage sans changement : Trivy n'est pas relancé"""
+        metadata.run_trivy_sbom_enrichment(sbom_dir, tmp_path / "cache.sqlite")
+        fake_trivy.clear()
+        
+        output, fixed = metadata.run_trivy_sbom_enrichment(sbom_dir, tmp_path / "cache.sqlite")
+        
+        assert fake_trivy == []
+        assert fixed[("CVE-1", "uuid-1")] == "2.3.3"
+        assert json.loads(output.read_text())["vulnerabilities"][0]["affects"] == [{"ref": "uuid-1"}]
+    
+    def test_only_new_components_scanned(self, sbom_dir, fake_trivy, tmp_path):
+        """Test seuls les nouveaux composants sont envoyés à Trivy"""
+        metadata.run_trivy_sbom_enrichment(sbom_dir, tmp_path / "cache.sqlite")
+        fake_trivy.clear()
+        merged = json.loads((sbom_dir / "merged-sbom.cdx.json").read_text())
+        merged["components"].append({"bom-ref": "uuid-3", "name": "jinja2", "purl": "pkg:pypi/jinja2@3.1.2"})
+        (sbom_dir / "merged-sbom.cdx.json").write_text(json.dumps(merged))
+        
+        metadata.run_trivy_sbom_enrichment(sbom_dir, tmp_path / "cache.sqlite")
+        
+        assert fake_trivy == [["jinja2"], ["jinja2"]]
+    
+    def test_component_without_purl_not_a_miss(self, sbom_dir, fake_trivy, tmp_path):
+        """Test un composant sans purl ne relance pas Trivy, mais accompagne les composants à analyser"""
+        merged = json.loads((sbom_dir / "merged-sbom.cdx.json").read_text())
+        merged["components"].insert(0, {"bom-ref": "uuid-os", "type": "operating-system", "name": "debian",
+                                        "version": "12.4"})
+        (sbom_dir / "merged-sbom.cdx.json").write_text(json.dumps(merged))
+        metadata.run_trivy_sbom_enrichment(sbom_dir, tmp_path / "cache.sqlite")
+        fake_trivy.clear()
+        
+        output, fixed = metadata.run_trivy_sbom_enrichment(sbom_dir, tmp_path / "cache.sqlite")
+        
+        assert fake_trivy == []
+        assert fixed[("CVE-1", "uuid-1")] == "2.3.3"
+        merged["components"].append({"bom-ref": "uuid-3", "name": "jinja2", "purl": "pkg:pypi/jinja2@3.1.2"})
+        (sbom_dir / "merged-sbom.cdx.json").write_text(json.dumps(merged))
+        
+        metadata.run_trivy_sbom_enrichment(sbom_dir, tmp_path / "cache.sqlite")
+        
+        assert fake_trivy == [["debian", "jinja2"], ["debian", "jinja2"]]
+
+
+class TestFixedVersionIndex:
+    """Tests pour l'index (CVE, paquet) -> FixedVersion"""
+    
+    @pytest.fixture
+    def trivy_json(self, tmp_path):
+        report = tmp_path / "merged-sbom.enriched.json"
+        report.write_text(json.dumps({"Results": [
+            {"Target": "image-a", "Vulnerabilities": [
+                {"VulnerabilityID": "CVE-1", "FixedVersion": "1.1.1w",
+                 "PkgIdentifier": {"PURL": "pkg:deb/debian/openssl@1.1.1n", "BOMRef": "uuid-a"}},
+                {"VulnerabilityID": "CVE-2", "FixedVersion": "",
+                 "PkgIdentifier": {"PURL": "pkg:deb/debian/curl@7.88.1", "BOMRef": "uuid-c"}}
+            ]},
+            {"Target": "image-b", "Vulnerabilities": [
+                {"VulnerabilityID": "CVE-1", "FixedVersion": "3.0.13",
+                 "PkgIdentifier": {"PURL": "pkg:deb/debian/openssl@3.0.11", "BOMRef": "uuid-b"}}
+            ]}
+        ]}))
+        return iter_trivy_vulnerabilities(report)
+    
+    def test_fixed_version_per_package(self, trivy_json):
+        """Test chaque paquet garde sa propre version corrigée"""
+        index = build_fixed_version_index(trivy_json)
+        
+        assert lookup_fixed_version(index, "CVE-1", "uuid-a", None) == "1.1.1w"
+        assert lookup_fixed_version(index, "CVE-1", "uuid-b", None) == "3.0.13"
+    
+    def test_lookup_by_purl(self, trivy_json):
+        """Test repli sur le purl normalisé quand le bom-ref est inconnu"""
+        index = build_fixed_version_index(trivy_json)
+        
+        assert lookup_fixed_version(index, "CVE-1", "other-ref", "pkg:deb/debian/openssl@3.0.11") == "3.0.13"
+    
+    def test_no_fixed_version(self, trivy_json):
+        """Test vulnérabilité sans version corrigée"""
+        index = build_fixed_version_index(trivy_json)
+        
+        assert lookup_fixed_version(index, "CVE-2", "uuid-c", "pkg:deb/debian/curl@7.88.1") is None
+        assert lookup_fixed_version(index, "CVE-3", "uuid-a", None) is None
+
+
+class TestVulnerabilityRollup:
+    """Tests pour la sévérité, describe_vulnerability et les index inversés"""
+    
+    @pytest.fixture
+    def component_sources(self):
+        return {
+            "uuid-1": ComponentSource("flask", "2.3.0", "pkg:pypi/flask@2.3.0", "requirements.txt", "python-dependency"),
+            "uuid-2": ComponentSource("curl", "7.88.1", "pkg:deb/debian/curl@7.88.1", "Dockerfile (api)", "os-package-debian"),
+        }
+    
+    def test_vulnerability_severity_highest(self):
+        """Test la sévérité la plus grave est retenue"""
+        vuln = {"ratings": [{"severity": "medium"}, {"severity": "critical"}, {"severity": "low"}]}
+        
+        assert vulnerability_severity(vuln) == "critical"
+        assert vulnerability_severity({}) == "unknown"
+    
+    def test_describe_vulnerability(self, component_sources):
+        """Test construction d'une entrée de vulnérabilité"""
+        vuln = {
+            "id": "CVE-1",
+            "ratings": [{"severity": "high"}],
+            "affects": [
+                {"ref": "uuid-1", "versions": [{"version": "2.3.3", "status": "unaffected"}]},
+                {"ref": "unknown-ref"}
+            ]
+        }
+        
+        record = describe_vulnerability(vuln, component_sources, {})
+        
+        assert record["vulnerability_id"] == "CVE-1"
+        assert record["severity"] == "high"
+        assert len(record["affected_packages"]) == 1
+        assert record["affected_packages"][0]["fixed_version"] == "2.3.3"
+        assert record["affected_packages"][0]["fix_status"] == "fixed"
+    
+    def test_describe_vulnerability_no_known_package(self, component_sources):
+        """Test vulnérabilité sans paquet connu"""
+        assert describe_vulnerability({"id": "CVE-1", "affects": [{"ref": "x"}]}, component_sources, {}) is None
+    
+    def test_rollup_indexes(self, component_sources):
+        """Test index inversés alimentés pendant la passe"""
+        rollup = VulnerabilityRollup()
+        vulns = [
+            {"id": "CVE-1", "ratings": [{"severity": "critical"}], "affects": [{"ref": "uuid-1"}, {"ref": "uuid-2"}]},
+            {"id": "CVE-2", "ratings": [{"severity": "low"}], "affects": [{"ref": "uuid-2"}]},
+        ]
+        
+        for vuln in vulns:
+            describe_vulnerability(vuln, component_sources, {}, rollup)
+        indexes = rollup.as_dict()
+        
+        assert indexes["component_vulnerabilities"] == {"uuid-1": ["CVE-1"], "uuid-2": ["CVE-1", "CVE-2"]}
+        assert indexes["source_file_severity"] == {
+            "requirements.txt": {"critical": 1},
+            "Dockerfile (api)": {"critical": 1, "low": 1},
+        }
+        assert indexes["source_type_severity"]["os-package-debian"] == {"critical": 1, "low": 1}
+    
+    def test_rollup_counts_each_lockfile(self):
+        """Test paquet déclaré par plusieurs fichiers de dépendances : compté pour chacun, pas pour la chaîne jointe"""
+        rollup = VulnerabilityRollup()
+        component_sources = {"uuid-1": ComponentSource("flask", "2.3.0", "pkg:pypi/flask@2.3.0",
+                                                       "api/requirements.txt, worker/requirements.txt",
+                                                       "python-dependency")}
+        
+        describe_vulnerability({"id": "CVE-1", "ratings": [{"severity": "high"}], "affects": [{"ref": "uuid-1"}]},
+                               component_sources, {}, rollup)
+        
+        assert rollup.source_file_severity == {"api/requirements.txt": {"high": 1}, "worker/requirements.txt": {"high": 1}}
+        assert rollup.source_type_severity == {"python-dependency": {"high": 1}}
+
+
+class TestCategorizeMergedComponents:
+    """Tests pour la fonction categorize_merged_components"""
+    
+    @pytest.fixture
+    def components(self):
+        components = []
+        for i in range(40):
+            components.append({"bom-ref": f"go-{i}", "name": f"usr/local/go/pkg/tool/linux_amd64/tool{i}",
+                               "purl": f"pkg:golang/usr/local/go/pkg/tool/linux_amd64/tool{i}"})
+            components.append({"bom-ref": f"deb-{i}", "name": f"lib{i}", "version": "1.0",
+                               "purl": f"pkg:deb/debian/lib{i}@1.0"})
+            components.append({"bom-ref": f"req-{i}", "name": f"pkg{i}", "version": "2.0",
+                               "purl": f"pkg:pypi/pkg{i}@2.0"})
+        components.append({"name": "sans-ref"})
+        return components
+    
+    def test_parallel_identical_to_serial(self, components):
+        """Test la catégorisation par lots sur un pool de processus donne le même résultat"""
+        ref_to_source = {f"req-{i}": SourceInfo("dependency-file", "requirements.txt") for i in range(40)}
+        ref_to_source.update({f"go-{i}": SourceInfo("docker-image", "Dockerfile (api)") for i in range(40)})
+        ref_to_source.update({f"deb-{i}": SourceInfo("docker-image", "Dockerfile (api)") for i in range(40)})
+        runtime_versions = {"go": "v1.24.11"}
+        serial_components = json.loads(json.dumps(components))
+        
+        serial = categorize_merged_components(serial_components, ref_to_source, runtime_versions)
+        parallel = categorize_merged_components(components, ref_to_source, runtime_versions, jobs=2, chunk_size=16)
+        
+        assert list(parallel.items()) == list(serial.items())
+        assert components == serial_components
+        assert serial["go-0"] == ComponentSource("tool0", "v1.24.11", "pkg:golang/usr/local/go/pkg/tool/linux_amd64/tool0",
+                                                 "Dockerfile (api)", "go-toolchain")
+    
+    def test_interleaved_sources_match_per_component(self, components):
+        """Test lots découpés en séquences de même source : résultat de la catégorisation unitaire"""
+        sources = [SourceInfo("dependency-file", "requirements.txt"), SourceInfo("docker-image", "Dockerfile (api)")]
+        ref_to_source = {
+            component["bom-ref"]: sources[i % 3 == 0]
+            for i, component in enumerate(components) if "bom-ref" in component
+        }
+        expected_components = json.loads(json.dumps(components))
+        expected = dict(filter(None, (
+            categorize_merged_component(component, ref_to_source, {"go": "v1"}) for component in expected_components
+        )))
+        
+        batched = categorize_merged_components(components, ref_to_source, {"go": "v1"}, chunk_size=7)
+        
+        assert list(batched.items()) == list(expected.items())
+        assert components == expected_components
+    
+    def test_toolchain_counters_logged_once(self, components, caplog):
+        """Test un seul message agrégé au lieu d'une ligne par outil toolchain"""
+        ref_to_source = {f"go-{i}": SourceInfo("docker-image", "Dockerfile (api)") for i in range(40)}
+        
+        with caplog.at_level("INFO"):
+            categorize_merged_components(components, ref_to_source, {})
+        
+        toolchain_lines = [record.message for record in caplog.records if "🔧" in record.message]
+        assert toolchain_lines == ["  🔧 Toolchains catégorisées : go-toolchain=40"]
+
+
+class TestGenerateMetadata:
+    """Tests de bout en bout de generate_metadata (Trivy simulé)"""
+    
+    @pytest.fixture
+    def project(self, tmp_path, monkeypatch):
+        sbom_dir = tmp_path / "sbom"
+        sbom_dir.mkdir()
+        image_sbom = {"components": [
+            {"bom-ref": "uuid-1", "name": "stdlib", "version": "v1.21.0", "purl": "pkg:golang/stdlib@v1.21.0"},
+            {"bom-ref": "uuid-2", "name": "usr/local/go/bin/go", "purl": "pkg:golang/usr/local/go/bin/go"},
+            {"bom-ref": "uuid-3", "name": "curl", "version": "7.88.1", "purl": "pkg:deb/debian/curl@7.88.1"},
+            {"bom-ref": "uuid-4", "name": "flask", "version": "2.3.0", "purl": "pkg:pypi/flask@2.3.0"}
+        ]}
+        lock_sbom = {
+            "metadata": {"properties": [{"name": "fulltrivyscan:SourceFile", "value": "api/requirements.txt"}]},
+            "components": [
+                {"bom-ref": "pkg:pypi/flask@2.3.0", "name": "flask", "version": "2.3.0", "purl": "pkg:pypi/flask@2.3.0"}
+            ]
+        }
+        (sbom_dir / "api-image.cdx.json").write_text(json.dumps(image_sbom))
+        (sbom_dir / "api__requirements.txt.cdx.json").write_text(json.dumps(lock_sbom))
+        merged = {
+            "bomFormat": "CycloneDX",
+            "serialNumber": "urn:uuid:00000000-0000-4000-8000-000000000001",
+            "metadata": {"timestamp": "2026-01-01T00:00:00Z"},
+            "components": image_sbom["components"] + lock_sbom["components"],
+            "dependencies": []
+        }
+        (sbom_dir / "merged-sbom.cdx.json").write_text(json.dumps(merged))
+        
+        def fake_run_trivy_sbom(input_sbom, output, output_format):
+            sbom = json.loads(Path(input_sbom).read_text())
+            if output_format == "cyclonedx":
+                sbom["vulnerabilities"] = [
+                    {"id": "CVE-1", "ratings": [{"severity": "critical"}], "description": "Texte détaillé",
+                     "affects": [{"ref": "uuid-3"}, {"ref": "pkg:pypi/flask@2.3.0"}]},
+                    {"id": "CVE-2", "ratings": [{"severity": "medium"}], "affects": [{"ref": "uuid-3"}]}
+                ]
+                Path(output).write_text(json.dumps(sbom))
+            else:
+                Path(output).write_text(json.dumps({"Results": [{"Vulnerabilities": [
+                    {"VulnerabilityID": "CVE-1", "FixedVersion": "7.88.2",
+                     "PkgIdentifier": {"BOMRef": "uuid-3", "PURL": "pkg:deb/debian/curl@7.88.1"}},
+                    {"VulnerabilityID": "CVE-1", "FixedVersion": "2.3.3",
+                     "PkgIdentifier": {"BOMRef": "pkg:pypi/flask@2.3.0", "PURL": "pkg:pypi/flask@2.3.0"}}
+                ]}]}))
+        
+        monkeypatch.setattr(metadata, "run_trivy_sbom", fake_run_trivy_sbom)
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("GITHUB_REPOSITORY", "owner/repo")
+        return sbom_dir
+    
+    def test_metadata_json(self, project):
+        """Test contenu de metadata.json"""
+        metadata.generate_metadata()
+        
+        result = json.loads((project / "metadata.json").read_text())
+        
+        assert result["repository"] == "owner/repo"
+        assert result["stats"] == {"total_components": 5, "total_vulnerabilities": 2}
+        assert result["component_sources"]["uuid-2"]["package_name"] == "go"
+        assert result["component_sources"]["uuid-2"]["version"] == "v1.21.0"
+        assert result["component_sources"]["uuid-2"]["source_type"] == "go-toolchain"
+        cve1 = result["vulnerabilities"][0]
+        fixed = {p["package_name"]: p["fixed_version"] for p in cve1["affected_packages"]}
+        assert fixed == {"curl": "7.88.2", "flask": "2.3.3"}
+        assert result["indexes"]["component_vulnerabilities"]["uuid-3"] == ["CVE-1", "CVE-2"]
+        assert result["indexes"]["source_file_severity"]["api/requirements.txt"] == {"critical": 1}
+        # Composant d'image attribué au fichier de dépendances réel déclarant le même purl
+        assert result["component_sources"]["uuid-4"]["source_file"] == "api/requirements.txt"
+        assert result["component_sources"]["uuid-4"]["source_type"] == "python-dependency"
+    
+    def test_merged_sbom_rewritten(self, project):
+        """Test le SBOM fusionné est réécrit avec les noms nettoyés"""
+        metadata.generate_metadata()
+        
+        merged = json.loads((project / "merged-sbom.cdx.json").read_text())
+        names = [c["name"] for c in merged["components"]]
+        
+        assert "go" in names
+        assert len(merged["vulnerabilities"]) == 2
+    
+    def test_delta_against_previous(self, project, tmp_path):
+        """Test delta.json écrit avec --previous"""
+        previous = tmp_path / "previous-metadata.json"
+        previous.write_text(json.dumps({"commit": "old", "vulnerabilities": [
+            {"vulnerability_id": "CVE-2", "severity": "medium", "affected_packages": [
+                {"package_name": "curl", "fix_status": "unknown", "fixed_version": None,
+                 "source_file": "Dockerfile (api)", "purl": "pkg:deb/debian/curl@7.88.1"}
+            ]},
+            {"vulnerability_id": "CVE-0", "severity": "low", "affected_packages": [
+                {"package_name": "bash", "source_file": "Dockerfile (api)", "purl": "pkg:deb/debian/bash@5.2"}
+            ]}
+        ]}))
+        
+        metadata.generate_metadata(previous=previous)
+        
+        delta = json.loads((project / "delta.json").read_text())
+        assert delta["stats"] == {"new": 2, "resolved": 1, "changed": 0}
+    
+    @pytest.mark.parametrize("max_entries", [None, 2])
+    def test_delta_history_bootstrap(self, project, tmp_path, monkeypatch, max_entries):
+        """Test --previous sur la base --sqlite pas encore créée, puis exécution suivante hors GitHub Actions"""
+        monkeypatch.delenv("GITHUB_RUN_ID", raising=False)
+        db_path = tmp_path / "history.sqlite"
+        
+        metadata.generate_metadata(sqlite_path=db_path, previous=db_path, max_memory_entries=max_entries)
+        
+        delta = json.loads((project / "delta.json").read_text())
+        assert delta["previous"] is None
+        assert delta["stats"] == {"new": 3, "resolved": 0, "changed": 0}
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM runs").fetchone() == (1,)
+        
+        metadata.generate_metadata(sqlite_path=db_path, previous=db_path, max_memory_entries=max_entries)
+        
+        delta = json.loads((project / "delta.json").read_text())
+        assert delta["previous"]["run_id"] == "unknown"
+        assert delta["stats"] == {"new": 0, "resolved": 0, "changed": 0}
+    
+    @pytest.mark.parametrize("max_entries", [None, 2])
+    def test_stale_text_store_ignored(self, project, max_entries):
+        """Test un fichier annexe d'une exécution précédente ne rend pas le SBOM allégé"""
+        merged_path = project / "merged-sbom.cdx.json"
+        text_store_path_for(merged_path).write_text(
+            '{"serialNumber": "urn:uuid:00000000-0000-4000-8000-00000000dead", "texts": {}}'
+        )
+        
+        metadata.generate_metadata(max_memory_entries=max_entries)
+        
+        assert "Texte détaillé" in merged_path.read_text()
+        assert json.loads(text_store_path_for(merged_path).read_text())["texts"] == {}
+    
+    @pytest.mark.parametrize("max_entries", [0, 2, 1000])
+    @pytest.mark.parametrize("slim", [False, True])
+    def test_out_of_core_identical(self, project, tmp_path, max_entries, slim):
+        """Test le mode mémoire bornée produit les mêmes fichiers, octet pour octet"""
+        merged_path = project / "merged-sbom.cdx.json"
+        write = write_slim_sbom if slim else write_sbom
+        write(json.loads(merged_path.read_text()), merged_path, index_path_for(merged_path))
+        pristine = tmp_path / "pristine"
+        shutil.copytree(project, pristine)
+        
+        metadata.generate_metadata(sqlite_path=tmp_path / "in-memory.sqlite")
+        expected = {path.name: path.read_bytes() for path in project.iterdir() if path.suffix == ".json"}
+        shutil.rmtree(project)
+        shutil.copytree(pristine, project)
+        
+        metadata.generate_metadata(sqlite_path=tmp_path / "bounded.sqlite", max_memory_entries=max_entries)
+        result = {path.name: path.read_bytes() for path in project.iterdir() if path.suffix == ".json"}
+        
+        assert result == expected
+        assert not list(project.glob(".spill-*"))
+        if slim:
+            assert "Texte détaillé" not in result["merged-sbom.cdx.json"].decode("utf-8")
+        assert SbomReader(merged_path).vulnerability("CVE-2")["id"] == "CVE-2"
+        counts = [
+            sqlite3.connect(tmp_path / name).execute("SELECT COUNT(*) FROM affected_packages").fetchone()[0]
+            for name in ("in-memory.sqlite", "bounded.sqlite")
+        ]
+        assert counts == [3, 3]
+    
+    @pytest.mark.parametrize("max_entries", [None, 2])
+    def test_rekeyed_component_keeps_source(self, tmp_path, monkeypatch, max_entries):
+        """Test fusion puis métadonnées : un composant dont la bom-ref a été régénérée garde sa source"""
+        sbom_dir = tmp_path / "sbom"
+        sbom_dir.mkdir()
+        api_sbom = {"components": [
+            {"bom-ref": "app", "name": "api", "version": "1.0", "type": "application"},
+            {"bom-ref": "uuid-1", "name": "curl", "version": "7.88.1", "purl": "pkg:deb/debian/curl@7.88.1"},
+        ]}
+        lock_sbom = {
+            "metadata": {"properties": [{"name": "fulltrivyscan:SourceFile", "value": "worker/requirements.txt"}]},
+            "components": [
+                {"bom-ref": "app", "name": "worker", "version": "2.0", "type": "application"},
+                {"bom-ref": "uuid-1", "name": "celery", "version": "5.3.0", "purl": "pkg:pypi/celery@5.3.0"},
+            ],
+        }
+        (sbom_dir / "api-image.cdx.json").write_text(json.dumps(api_sbom))
+        (sbom_dir / "worker__requirements.txt.cdx.json").write_text(json.dumps(lock_sbom))
+        merged = merge_sboms(iter_sbom_files(sbom_dir))
+        (sbom_dir / "merged-sbom.cdx.json").write_text(json.dumps(merged))
+        
+        def fake_run_trivy_sbom(input_sbom, output, output_format):
+            sbom = json.loads(Path(input_sbom).read_text())
+            Path(output).write_text(json.dumps(sbom if output_format == "cyclonedx" else {"Results": []}))
+        
+        monkeypatch.setattr(metadata, "run_trivy_sbom", fake_run_trivy_sbom)
+        monkeypatch.chdir(tmp_path)
+        metadata.generate_metadata(max_memory_entries=max_entries)
+        
+        sources = {
+            source["package_name"]: source["source_file"]
+            for source in json.loads((sbom_dir / "metadata.json").read_text())["component_sources"].values()
+        }
+        assert len({component["bom-ref"] for component in merged["components"]}) == 4
+        assert sources == {
+            "api": "Dockerfile (api)", "curl": "Dockerfile (api)",
+            "worker": "worker/requirements.txt", "celery": "worker/requirements.txt",
+        }
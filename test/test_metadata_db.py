@@ -0,0 +1,121 @@
+"""Tests unitaires pour metadata_db.py"""
+import pytest
+from pathlib import Path
+import sqlite3
+
+from metadata_db import export_metadata_sqlite, iter_run_affected_packages, latest_run
+
+
+@pytest.fixture
+def sample_metadata():
+    return {
+        "generated_at": "2026-01-01T00:00:00Z",
+        "repository": "owner/repo",
+        "branch": "main",
+        "commit": "abc123",
+        "run_id": "42",
+        "component_sources": {
+            "uuid-1": {"package_name": "flask", "version": "2.3.0", "purl": "pkg:pypi/flask@2.3.0",
+                       "source_file": "requirements.txt", "source_type": "python-dependency"},
+            "uuid-2": {"package_name": "curl", "version": "7.88.1", "purl": "pkg:deb/debian/curl@7.88.1",
+                       "source_file": "Dockerfile (api)", "source_type": "os-package-debian"},
+        },
+        "vulnerabilities": [
+            {"vulnerability_id": "CVE-1", "severity": "high", "affected_packages": [
+                {"package_name": "flask", "installed_version": "2.3.0", "fixed_version": "2.3.3",
+                 "fix_status": "fixed", "source_file": "requirements.txt",
+                 "source_type": "python-dependency", "purl": "pkg:pypi/flask@2.3.0"},
+                {"package_name": "curl", "installed_version": "7.88.1", "fixed_version": None,
+                 "fix_status": "unknown", "source_file": "Dockerfile (api)",
+                 "source_type": "os-package-debian", "purl": "pkg:deb/debian/curl@7.88.1"}
+            ]}
+        ],
+    }
+
+
+class TestExportMetadataSqlite:
+    """Tests pour la fonction export_metadata_sqlite"""
+    
+    def test_tables_filled(self, tmp_path, sample_metadata):
+        """Test insertion des composants, vulnérabilités et paquets affectés"""
+        db_path = tmp_path / "metadata.sqlite"
+        
+        run = export_metadata_sqlite(sample_metadata, db_path)
+        
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT repository, commit_sha FROM runs WHERE id = ?", (run,)).fetchone() == ("owner/repo", "abc123")
+        assert conn.execute("SELECT COUNT(*) FROM components").fetchone()[0] == 2
+        assert conn.execute("SELECT vulnerability_id, severity FROM vulnerabilities").fetchall() == [("CVE-1", "high")]
+        assert conn.execute("SELECT COUNT(*) FROM affected_packages").fetchone()[0] == 2
+        conn.close()
+    
+    def test_query_by_purl(self, tmp_path, sample_metadata):
+        """Test requête des vulnérabilités d'un purl"""
+        db_path = tmp_path / "metadata.sqlite"
+        export_metadata_sqlite(sample_metadata, db_path)
+        
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute(
+            "SELECT vulnerability_id, fixed_version FROM affected_packages WHERE purl = ?",
+            ("pkg:pypi/flask@2.3.0",)
+        ).fetchall()
+        conn.close()
+        
+        assert rows == [("CVE-1", "2.3.3")]
+    
+    def test_append_runs(self, tmp_path, sample_metadata):
+        """Test ajout de plusieurs exécutions dans la même base"""
+        db_path = tmp_path / "metadata.sqlite"
+        
+        first = export_metadata_sqlite(sample_metadata, db_path)
+        second = export_metadata_sqlite(dict(sample_metadata, run_id="43"), db_path)
+        
+        conn = sqlite3.connect(db_path)
+        assert second > first
+        assert conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM affected_packages WHERE run = ?", (second,)).fetchone()[0] == 2
+        conn.close()
+    
+    def test_indexes_created(self, tmp_path, sample_metadata):
+        """Test index sur purl, vulnerability_id et source_file"""
+        db_path = tmp_path / "metadata.sqlite"
+        export_metadata_sqlite(sample_metadata, db_path)
+        
+        conn = sqlite3.connect(db_path)
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        
+        assert {"idx_affected_purl", "idx_affected_vulnerability_id", "idx_affected_source_file"} <= indexes
+
+
+class TestReadRuns:
+    """Tests pour latest_run et iter_run_affected_packages"""
+    
+    def test_latest_run_same_repository_and_branch(self, tmp_path, sample_metadata):
+        """Test la dernière exécution du même dépôt et de la même branche, hors exécution courante"""
+        db_path = tmp_path / "metadata.sqlite"
+        expected = export_metadata_sqlite(sample_metadata, db_path)
+        export_metadata_sqlite(dict(sample_metadata, repository="owner/other", run_id="50"), db_path)
+        export_metadata_sqlite(dict(sample_metadata, branch="feature", run_id="51"), db_path)
+        export_metadata_sqlite(dict(sample_metadata, run_id="52"), db_path)
+        current = {"repository": "owner/repo", "branch": "main", "run_id": "52"}
+        
+        assert latest_run(db_path)["run_id"] == "52"
+        assert latest_run(db_path, current)["run"] == expected
+        assert latest_run(db_path, dict(current, repository="owner/unknown")) is None
+        # Hors GitHub Actions, run_id "unknown" n'exclut rien ; seul exclude_run exclut l'exécution courante
+        local = export_metadata_sqlite(dict(sample_metadata, run_id="unknown"), db_path)
+        assert latest_run(db_path, dict(current, run_id="unknown"))["run"] == local
+        assert latest_run(db_path, dict(current, run_id="unknown"), exclude_run=local)["run_id"] == "52"
+    
+    def test_affected_packages_distinct(self, tmp_path, sample_metadata):
+        """Test une vulnérabilité enregistrée deux fois ne duplique pas ses paquets affectés"""
+        db_path = tmp_path / "metadata.sqlite"
+        vuln = sample_metadata["vulnerabilities"][0]
+        run = export_metadata_sqlite(dict(sample_metadata, vulnerabilities=[vuln, vuln]), db_path)
+        
+        rows = list(iter_run_affected_packages(db_path, run))
+        
+        assert [(row["vulnerability_id"], row["package_name"], row["severity"]) for row in rows] == [
+            ("CVE-1", "flask", "high"), ("CVE-1", "curl", "high"),
+        ]
@@ -0,0 +1,114 @@
+"""Tests unitaires pour metrics.py"""
+from metrics import MetricSet, collect, write_metrics
+from tracing import Span
+from test.fake_tools import FakeTools, run_pipeline, write_repository
+
+
+def make_span(name, seconds, **attributes):
+    span = Span(name, attributes)
+    span.duration_us = int(seconds * 1e6)
+    return span
+
+
+def sample(metrics, name, **labels):
+    labels = tuple(sorted(labels.items()))
+    return next((value for (_, sample_name, sample_labels), value in metrics.samples.items()
+                 if sample_name == name and sample_labels == labels), None)
+
+
+class TestCollect:
+    """Tests pour collect()"""
+
+    def test_scan_metrics(self):
+        """Test durées par type d'analyse, conteneurs démarrés et octets écrits"""
+        spans = [
+            make_span("scan_dependency_file", 0.2, file="requirements.txt", native=False, components=10,
+                      bytes_written=1000),
+            make_span("scan_dependency_file", 0.001, file="go.sum", native=True, components=5, bytes_written=500),
+            make_span("docker_build", 3.0, image="sbom-scan-api"),
+            make_span("scan_image", 4.0, image="sbom-scan-api", bytes_written=2000),
+            make_span("probe_container", 0.5, image="sbom-scan-api", command="which"),
+            make_span("probe_container", 0.5, image="sbom-scan-api", command="node"),
+            make_span("runtime_probe", 1.0, image="sbom-scan-api", components=1),
+        ]
+        metrics = collect(spans, "trivy_scan", 8.7)
+
+        starts = "fulltrivyscan_container_starts_total"
+        assert sample(metrics, starts, process="trivy_scan", kind="trivy_fs") == 1
+        assert sample(metrics, starts, process="trivy_scan", kind="trivy_image") == 1
+        assert sample(metrics, starts, process="trivy_scan", kind="runtime_probe") == 2
+        scans = "fulltrivyscan_scan_duration_seconds"
+        assert sample(metrics, scans + "_count", process="trivy_scan", kind="native_lockfile") == 1
+        assert sample(metrics, scans + "_sum", process="trivy_scan", kind="image") == 4.0
+        assert sample(metrics, scans + "_bucket", process="trivy_scan", kind="image_build", le="2.5") == 0
+        assert sample(metrics, scans + "_bucket", process="trivy_scan", kind="image_build", le="5") == 1
+        assert sample(metrics, scans + "_bucket", process="trivy_scan", kind="image_build", le="+Inf") == 1
+        assert sample(metrics, "fulltrivyscan_components_processed_total",
+                      process="trivy_scan", stage="scan_dependency_file") == 15
+        assert sample(metrics, "fulltrivyscan_written_bytes_total", process="trivy_scan", stage="scan_image") == 2000
+        assert sample(metrics, "fulltrivyscan_run_duration_seconds", process="trivy_scan") == 8.7
+        # Les conteneurs de sonde ne sont pas des étapes
+        assert sample(metrics, "fulltrivyscan_stage_duration_seconds_count",
+                      process="trivy_scan", stage="probe_container") is None
+
+    def test_cache_and_errors(self):
+        """Test succès/échecs du cache d'enrichissement et étapes en erreur"""
+        spans = [
+            make_span("enrichment_cache_lookup", 0.1, components=100, hits=80, misses=20),
+            make_span("vulnerabilities", 0.3, vulnerabilities=42),
+            make_span("write_metadata", 0.2, error="OSError"),
+        ]
+        metrics = collect(spans, "metadata", 1.0)
+
+        assert sample(metrics, "fulltrivyscan_enrichment_cache_hits_total", process="metadata") == 80
+        assert sample(metrics, "fulltrivyscan_enrichment_cache_misses_total", process="metadata") == 20
+        assert sample(metrics, "fulltrivyscan_vulnerabilities_processed_total",
+                      process="metadata", stage="vulnerabilities") == 42
+        assert sample(metrics, "fulltrivyscan_stage_errors_total", process="metadata", stage="write_metadata") == 1
+
+
+class TestMetricsFile:
+    """Tests pour le format texte et l'écriture du fichier"""
+
+    def test_render_and_parse(self):
+        """Test une famille par bloc HELP/TYPE, buckets ordonnés, relecture identique"""
+        metrics = collect([make_span("merge", 0.03, components=7)], "merge_sbom", 0.05)
+        metrics.inc("fulltrivyscan_stage_errors_total", process="merge_sbom", stage='write "slim"\n')
+        text = metrics.render()
+
+        lines = text.splitlines()
+        assert lines.count("# TYPE fulltrivyscan_stage_duration_seconds histogram") == 1
+        buckets = [line for line in lines if line.startswith("fulltrivyscan_stage_duration_seconds_bucket")]
+        assert 'le="0.025"' in buckets[2] and 'le="0.05"' in buckets[3] and 'le="+Inf"' in buckets[-1]
+        assert 'stage="write \\"slim\\"\\n"' in text
+        assert MetricSet.parse(text).render() == text
+
+    def test_write_merges_processes(self, tmp_path):
+        """Test chaque script remplace ses propres métriques et conserve celles des autres"""
+        metrics_file = tmp_path / "textfile" / "fulltrivyscan.prom"
+        write_metrics(metrics_file, [make_span("discovery", 0.01, dependency_files=3)], "trivy_scan", 1.0)
+        write_metrics(metrics_file, [make_span("merge", 0.02, components=10)], "merge_sbom", 2.0)
+        write_metrics(metrics_file, [make_span("merge", 0.02, components=4)], "merge_sbom", 3.0)
+
+        metrics = MetricSet.parse(metrics_file.read_text(encoding="utf-8"))
+        assert sample(metrics, "fulltrivyscan_run_duration_seconds", process="trivy_scan") == 1.0
+        assert sample(metrics, "fulltrivyscan_run_duration_seconds", process="merge_sbom") == 3.0
+        assert sample(metrics, "fulltrivyscan_components_processed_total", process="merge_sbom", stage="merge") == 4
+        assert [path.name for path in metrics_file.parent.iterdir()] == ["fulltrivyscan.prom"]
+
+    def test_pipeline_metrics(self, tmp_path):
+        """Test --metrics-file sur les trois scripts (docker/trivy simulés) : un seul fichier"""
+        repo = tmp_path / "repo"
+        write_repository(repo, lockfiles=2, dockerfiles=1)
+        metrics_file = tmp_path / "fulltrivyscan.prom"
+        run_pipeline(repo, FakeTools(tmp_path / "bin").install(), "--metrics-file", str(metrics_file))
+
+        metrics = MetricSet.parse(metrics_file.read_text(encoding="utf-8"))
+        assert sample(metrics, "fulltrivyscan_container_starts_total", process="trivy_scan", kind="trivy_fs") == 2
+        assert sample(metrics, "fulltrivyscan_container_starts_total", process="trivy_scan", kind="trivy_image") == 1
+        for process in ("trivy_scan", "merge_sbom", "metadata"):
+            assert sample(metrics, "fulltrivyscan_peak_memory_bytes", process=process) > 0
+        assert sample(metrics, "fulltrivyscan_vulnerabilities_processed_total",
+                      process="metadata", stage="vulnerabilities") > 0
+        # Sans --trace, aucune trace n'est écrite
+        assert not (repo / "sbom" / "trace.json").exists()
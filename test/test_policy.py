@@ -0,0 +1,109 @@
+"""Tests unitaires pour policy.py"""
+import pytest
+from pathlib import Path
+import json
+
+from policy import Policy, PolicyGate, is_fixable, load_allow_list
+
+
+def vulnerability(vuln_id, severity, fixed=None):
+    versions = [{"version": "1.0", "status": "affected"}]
+    if fixed:
+        versions.append({"version": fixed, "status": "unaffected"})
+    return {"id": vuln_id, "ratings": [{"severity": severity}], "affects": [{"ref": "uuid-1", "versions": versions}]}
+
+
+class TestPolicy:
+    """Tests pour la classe Policy"""
+    
+    def test_threshold(self):
+        """Test seules les sévérités au moins aussi graves que le seuil bloquent"""
+        sbom = {"vulnerabilities": [vulnerability("CVE-1", "high"), vulnerability("CVE-2", "medium")]}
+        
+        assert [v["vulnerability_id"] for v in Policy("high").violations(sbom)] == ["CVE-1"]
+        assert Policy("critical").violations(sbom) == []
+    
+    def test_fixable_only(self):
+        """Test filtre sur les vulnérabilités corrigeables"""
+        sbom = {"vulnerabilities": [vulnerability("CVE-1", "critical"), vulnerability("CVE-2", "critical", "1.1")]}
+        
+        result = Policy("critical", fixable_only=True).violations(sbom)
+        
+        assert [v["vulnerability_id"] for v in result] == ["CVE-2"]
+        assert result[0]["fixable"] is True
+    
+    def test_allow_list(self, tmp_path):
+        """Test ids autorisés depuis la ligne de commande et un fichier"""
+        allow_file = tmp_path / "allow.txt"
+        allow_file.write_text("# accepté\nCVE-2  # faux positif\n")
+        sbom = {"vulnerabilities": [vulnerability("CVE-1", "critical"), vulnerability("CVE-2", "critical")]}
+        
+        allowed = load_allow_list(["CVE-1"], allow_file)
+        
+        assert allowed == {"CVE-1", "CVE-2"}
+        assert Policy("critical", allow=allowed).violations(sbom) == []
+    
+    def test_unknown_severity(self):
+        """Test sévérité de seuil invalide"""
+        with pytest.raises(ValueError):
+            Policy("urgent")
+    
+    def test_is_fixable(self):
+        """Test détection d'une version corrigée"""
+        assert is_fixable(vulnerability("CVE-1", "high", "1.1"))
+        assert not is_fixable(vulnerability("CVE-1", "high"))
+
+    def test_fixable_only_trivy_output(self):
+        """Test --fixable-only sur des vulnérabilités telles que Trivy les produit (CycloneDX et JSON)"""
+        # Extrait de `trivy fs --format cyclonedx` : versions seulement "affected", correctif dans recommendation
+        fixed = {
+            "id": "CVE-2023-32681",
+            "source": {"name": "ghsa", "url": "https://github.com/advisories?query=type%3Areviewed+ecosystem%3Apip"},
+            "ratings": [
+                {"source": {"name": "ghsa"}, "score": 6.1, "severity": "medium", "method": "CVSSv31",
+                 "vector": "CVSS:3.1/AV:N/AC:H/PR:N/UI:R/S:C/C:H/I:N/A:N"},
+                {"source": {"name": "nvd"}, "score": 6.1, "severity": "medium", "method": "CVSSv31"},
+            ],
+            "cwes": [200],
+            "description": "Requests is a HTTP library. Since Requests 2.3.0, ...",
+            "recommendation": "Upgrade requests to version 2.31.0",
+            "published": "2023-05-26T18:15:14+00:00",
+            "affects": [{"ref": "pkg:pypi/requests@2.28.0", "versions": [{"version": "2.28.0", "status": "affected"}]}],
+        }
+        unfixed = {
+            "id": "CVE-2011-3374",
+            "ratings": [{"source": {"name": "debian"}, "severity": "low"}],
+            "affects": [{"ref": "pkg:deb/debian/apt@2.6.1?arch=amd64&distro=debian-12.4",
+                         "versions": [{"version": "2.6.1", "status": "affected"}]}],
+        }
+        sbom = {"vulnerabilities": [fixed, unfixed]}
+
+        result = Policy("low", fixable_only=True).violations(sbom)
+
+        assert [v["vulnerability_id"] for v in result] == ["CVE-2023-32681"]
+        # Sortie JSON de Trivy (Results[].Vulnerabilities[])
+        assert is_fixable({"VulnerabilityID": "CVE-2023-32681", "PkgName": "requests",
+                           "InstalledVersion": "2.28.0", "FixedVersion": "2.31.0", "Severity": "MEDIUM"})
+        assert not is_fixable({"VulnerabilityID": "CVE-2011-3374", "PkgName": "apt",
+                               "InstalledVersion": "2.6.1", "FixedVersion": "", "Severity": "LOW"})
+
+
+class TestPolicyGate:
+    """Tests pour la classe PolicyGate"""
+    
+    def test_partial_report(self, tmp_path):
+        """Test rapport partiel : sources analysées et non analysées"""
+        sbom_path = tmp_path / "requirements.txt.cdx.json"
+        sbom_path.write_text(json.dumps({"vulnerabilities": [vulnerability("CVE-1", "critical")]}))
+        gate = PolicyGate(Policy("critical"), [
+            ("dependency-file", "requirements.txt"), ("dockerfile", "api/Dockerfile")
+        ])
+        
+        assert gate.check("dependency-file", "requirements.txt", sbom_path) is True
+        report = gate.write_report(tmp_path / "policy-report.json")
+        
+        assert report["status"] == "failed"
+        assert [s["source"] for s in report["scanned"]] == ["requirements.txt"]
+        assert report["not_scanned"] == [{"kind": "dockerfile", "source": "api/Dockerfile"}]
+        assert report["violations"][0]["source"] == "requirements.txt"
+        assert json.loads((tmp_path / "policy-report.json").read_text()) == report
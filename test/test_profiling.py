@@ -0,0 +1,115 @@
+"""Tests unitaires pour profiling.py"""
+import pstats
+import sys
+import tracemalloc
+
+import pytest
+
+import profiling
+from profiling import enable_profiling, peak_rss_bytes, profile_stage, write_profiles
+from test.fake_tools import FakeTools, run_pipeline, write_repository
+
+
+def allocate(count):
+    return [str(i) * 10 for i in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def no_profiler():
+    profiling.disable_profiling()
+    yield
+    profiling.disable_profiling()
+
+
+class TestProfileStage:
+    """Tests pour Profiler et profile_stage()"""
+
+    def test_disabled_by_default(self):
+        """Test sans profilage actif : contexte nul partagé, tracemalloc non démarré"""
+        assert profile_stage("merge") is profile_stage("categorize")
+        with profile_stage("merge"):
+            pass
+        assert not tracemalloc.is_tracing()
+
+    def test_stage_stats(self):
+        """Test durée, appels cumulés, pic tracemalloc et allocations retenues par étape"""
+        profiler = enable_profiling(top=5)
+        kept = []
+        for _ in range(2):
+            with profile_stage("merge"):
+                kept.append(allocate(20000))
+
+        stats = profiler.stages["merge"]
+        assert stats.calls == 2
+        assert stats.seconds > 0
+        assert stats.peak_traced >= stats.current_traced > 0
+        assert len(stats.top) == 5
+        assert stats.top[0].traceback[0].filename == __file__
+
+    def test_nested_stage_counted_in_parent(self):
+        """Test une étape imbriquée n'a pas de profil propre (un seul profileur actif)"""
+        profiler = enable_profiling()
+        with profile_stage("enrichment"):
+            with profile_stage("trivy_sbom"):
+                allocate(10)
+
+        assert list(profiler.profiles) == ["enrichment"]
+
+    def test_exception_still_recorded(self):
+        """Test une étape interrompue par une exception est mesurée et l'exception propagée"""
+        profiler = enable_profiling()
+        with pytest.raises(ValueError):
+            with profile_stage("write_sbom"):
+                raise ValueError("disque plein")
+
+        assert profiler.stages["write_sbom"].calls == 1
+        with profile_stage("merge"):
+            pass
+        assert "merge" in profiler.profiles
+
+    def test_peak_rss(self):
+        """Test pic RSS disponible sous Linux"""
+        if sys.platform != "linux":
+            pytest.skip("ru_maxrss en Kio uniquement sous Linux")
+        assert peak_rss_bytes() > 1024 * 1024
+
+
+class TestWriteProfiles:
+    """Tests pour l'export des profils"""
+
+    def test_write_profiles(self, tmp_path):
+        """Test un fichier pstats par étape et un rapport mémoire par script"""
+        enable_profiling()
+        with profile_stage("categorize"):
+            allocate(1000)
+        with profile_stage("write_metadata"):
+            pass
+        profile_dir = write_profiles(tmp_path, "metadata")
+
+        assert sorted(path.name for path in profile_dir.iterdir()) == [
+            "metadata.categorize.pstats", "metadata.memory.txt", "metadata.write_metadata.pstats",
+        ]
+        functions = {name for _, _, name in pstats.Stats(str(profile_dir / "metadata.categorize.pstats")).stats}
+        assert "allocate" in functions
+        report = (profile_dir / "metadata.memory.txt").read_text(encoding="utf-8")
+        assert "## categorize : 1 appel(s)" in report
+        assert "Pic RSS du processus" in report
+
+    def test_write_without_profiling(self, tmp_path):
+        """Test écriture refusée si le profilage n'a pas été activé"""
+        with pytest.raises(RuntimeError):
+            write_profiles(tmp_path, "merge_sbom")
+
+    def test_pipeline_profile(self, tmp_path):
+        """Test --profile sur les trois scripts (docker/trivy simulés)"""
+        repo = tmp_path / "repo"
+        write_repository(repo, lockfiles=2, dockerfiles=1)
+        run_pipeline(repo, FakeTools(tmp_path / "bin").install(), "--profile")
+
+        names = {path.name for path in (repo / "sbom" / "profile").iterdir()}
+        assert {
+            "trivy_scan.discovery.pstats", "trivy_scan.scan_dependency_file.pstats", "trivy_scan.memory.txt",
+            "merge_sbom.merge.pstats", "merge_sbom.write_sbom.pstats", "merge_sbom.memory.txt",
+            "metadata.load_source_sboms.pstats", "metadata.enrichment.pstats", "metadata.categorize.pstats",
+            "metadata.vulnerabilities.pstats", "metadata.write_metadata.pstats", "metadata.memory.txt",
+        } <= names
@@ -0,0 +1,120 @@
+"""Tests unitaires pour rule_engine.py"""
+import json
+import pytest
+
+import language_mappings
+from rule_engine import BUNDLED_RULES, PrefixTrie, RuleEngine, SuffixTrie
+
+
+class TestTries:
+    """Tests pour PrefixTrie et SuffixTrie"""
+
+    def test_prefix_trie(self):
+        """Test préfixes trouvés du plus court au plus long, première valeur conservée"""
+        trie = PrefixTrie([("usr/", 2), ("usr/bin/", 1), ("usr/", 5)])
+
+        assert list(trie.matches("usr/bin/ls")) == [2, 1]
+        assert trie.first("usr/bin/ls") == 1
+        assert trie.first("opt/x") is None
+        assert trie.has_prefix_of("usr/lib")
+        assert not trie.has_prefix_of("us")
+
+    def test_suffix_trie(self):
+        """Test plus petit rang parmi les suffixes correspondants"""
+        trie = SuffixTrie([("requirements.txt", 3), (".txt", 7)])
+
+        assert trie.first("api/requirements.txt") == 3
+        assert trie.first("notes.txt") == 7
+        assert trie.first("notes.md") is None
+
+
+class TestRuleEngine:
+    """Tests pour la classe RuleEngine"""
+
+    def test_bundled_ruleset(self):
+        """Test le jeu embarqué reproduit la catégorisation historique"""
+        engine = RuleEngine.from_file(BUNDLED_RULES)
+
+        assert engine.categorize_dependency_file("api/go.sum")["source_type"] == "go-dependency"
+        assert engine.categorize_dependency_file("web/yarn.lock")["source_type"] == "nodejs-dependency"
+        assert engine.categorize_dependency_file("README.md")["source_type"] == "dependency-file"
+        assert engine.categorize_docker_component(
+            "pkg:deb/ubuntu/curl@8.5.0", "curl", "Dockerfile", {})["source_type"] == "os-package-ubuntu"
+        assert engine.categorize_docker_component(
+            "", "Alpine", "Dockerfile", {})["source_type"] == "os-image-alpine"
+
+    def test_contains_rule_beats_later_suffix_rule(self):
+        """Test une sous-chaîne d'une règle antérieure l'emporte sur un suffixe plus loin"""
+        engine = RuleEngine({"dependency_files": {"rules": [
+            {"source_type": "go-dependency", "contains": ["go.sum"]},
+            {"source_type": "nodejs-dependency", "suffixes": ["yarn.lock"]},
+        ]}})
+
+        assert engine.categorize_dependency_file("go.sum/yarn.lock")["source_type"] == "go-dependency"
+
+    def test_runtime_keep_first_and_last(self):
+        """Test keep=first garde la première version, keep=last la dernière"""
+        engine = RuleEngine({"runtime_versions": [
+            {"runtime": "go", "name_equals": ["stdlib"], "keep": "last"},
+            {"runtime": "java", "name_contains_ci": ["jdk"], "keep": "first"},
+        ]})
+        sbom = {"components": [
+            {"name": "stdlib", "version": "1.21"},
+            {"name": "OpenJDK", "version": "17"},
+            {"name": "stdlib", "version": "1.22"},
+            {"name": "jdk-tools", "version": "21"},
+            {"name": "stdlib", "version": None},
+        ]}
+
+        assert engine.detect_runtime_versions(sbom) == {"go": "1.22", "java": "17"}
+
+    def test_invalid_rules(self):
+        """Test clé inconnue et modèle sans default_distro refusés"""
+        with pytest.raises(ValueError, match="name_regex"):
+            RuleEngine({"docker_image": {"rules": [{"name_regex": "x", "source_type": "x"}]}})
+        with pytest.raises(ValueError, match="default_distro"):
+            RuleEngine({"docker_image": {"rules": [{"purl_types": ["deb"], "source_type": "os-{distro}"}]}})
+
+    def test_hundreds_of_rules(self):
+        """Test un jeu de plusieurs centaines de règles : dispatch par type et par suffixe"""
+        ruleset = {
+            "dependency_files": {"rules": [
+                {"source_type": f"lang{i}-dependency", "suffixes": [f"lock{i}.json"]} for i in range(300)
+            ]},
+            "docker_image": {"rules": [
+                {"purl_types": [f"type{i}"], "source_type": f"type{i}-package"} for i in range(300)
+            ] + [{"name_prefixes": [f"app{i}/" for i in range(300)], "source_type": "application-binary"}]},
+        }
+        engine = RuleEngine(ruleset)
+
+        assert engine.categorize_dependency_file("a/lock42.json")["source_type"] == "lang42-dependency"
+        assert engine.categorize_dependency_file("a/lock1000.json")["source_type"] == "dependency-file"
+        assert engine.categorize_docker_component(
+            "pkg:type299/x@1", "x", "Dockerfile", {})["source_type"] == "type299-package"
+        assert engine.categorize_docker_component(
+            "", "app250/bin/x", "Dockerfile", {})["source_type"] == "application-binary"
+        assert engine.categorize_docker_component(
+            "", "lib/x", "Dockerfile", {})["source_type"] == "docker-image"
+
+
+class TestRulesOverride:
+    """Tests pour le remplacement du jeu de règles"""
+
+    @pytest.fixture(autouse=True)
+    def restore_default(self, monkeypatch):
+        monkeypatch.delenv("FULLTRIVYSCAN_RULES", raising=False)
+        yield
+        language_mappings.load_rules()
+
+    def test_env_var_override(self, tmp_path, monkeypatch):
+        """Test FULLTRIVYSCAN_RULES remplace le jeu embarqué"""
+        rules = json.loads(BUNDLED_RULES.read_text(encoding="utf-8"))
+        rules["dependency_files"]["rules"].insert(0, {"source_type": "bazel-dependency", "suffixes": ["MODULE.bazel"]})
+        rules_path = tmp_path / "rules.json"
+        rules_path.write_text(json.dumps(rules), encoding="utf-8")
+        monkeypatch.setenv("FULLTRIVYSCAN_RULES", str(rules_path))
+
+        language_mappings.load_rules()
+
+        assert language_mappings.categorize_dependency_file("MODULE.bazel")["source_type"] == "bazel-dependency"
+        assert language_mappings.categorize_dependency_file("go.sum")["source_type"] == "go-dependency"
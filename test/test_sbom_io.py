@@ -0,0 +1,182 @@
+"""Tests unitaires pour sbom_io.py"""
+import pytest
+from pathlib import Path
+import json
+import os
+import shutil
+
+from sbom_io import write_sbom, index_path_for, SbomWriter, SbomReader, StaleIndexError
+from sbom_io import JsonArrayStream, JsonObjectStream, dump_streamed
+
+
+@pytest.fixture
+def sample_merged_sbom():
+    return {
+        "bomFormat": "CycloneDX",
+        "specVersion": "1.6",
+        "metadata": {"tools": {"components": [{"name": "trivy", "version": "0.50.0"}]}},
+        "components": [
+            {"bom-ref": "uuid-1", "name": "flask", "version": "2.3.0", "purl": "pkg:pypi/flask@2.3.0"},
+            {"bom-ref": "uuid-2", "name": "libé", "version": "1.0", "purl": "pkg:deb/debian/lib@1.0"}
+        ],
+        "dependencies": [],
+        "vulnerabilities": [
+            {"id": "CVE-2023-0001", "description": "ligne 1\nligne 2", "affects": [{"ref": "uuid-1"}]}
+        ]
+    }
+
+
+class TestWriteSbom:
+    """Tests pour la fonction write_sbom"""
+    
+    def test_output_identical_to_json_dump(self, tmp_path, sample_merged_sbom):
+        """Test sortie octet pour octet identique à json.dump(indent=2)"""
+        output = tmp_path / "merged-sbom.cdx.json"
+        
+        write_sbom(sample_merged_sbom, output, index_path_for(output))
+        
+        expected = json.dumps(sample_merged_sbom, indent=2, ensure_ascii=False).encode("utf-8")
+        assert output.read_bytes() == expected
+    
+    def test_empty_sections(self, tmp_path):
+        """Test sections vides et document vide"""
+        for sbom in ({}, {"components": []}, {"components": [], "version": 1}):
+            output = tmp_path / "empty.cdx.json"
+            write_sbom(sbom, output)
+            
+            assert output.read_bytes() == json.dumps(sbom, indent=2).encode("utf-8")
+    
+    def test_index_path_for(self):
+        """Test nom du fichier d'index, hors motif *.cdx.json"""
+        result = index_path_for(Path("sbom/merged-sbom.cdx.json"))
+        
+        assert result == Path("sbom/merged-sbom.cdx.idx.sqlite")
+        assert not result.name.endswith(".cdx.json")
+    
+    def test_no_index_by_default(self, tmp_path, sample_merged_sbom):
+        """Test aucun index écrit sans index_path"""
+        output = tmp_path / "merged-sbom.cdx.json"
+        
+        write_sbom(sample_merged_sbom, output)
+        
+        assert not index_path_for(output).exists()
+    
+    def test_streaming_writer(self, tmp_path):
+        """Test écriture élément par élément"""
+        output = tmp_path / "stream.cdx.json"
+        with SbomWriter(output) as writer:
+            writer.write_field("bomFormat", "CycloneDX")
+            writer.begin_array("components")
+            for i in range(3):
+                writer.write_item({"bom-ref": f"ref-{i}"})
+            writer.end_array()
+        
+        assert json.loads(output.read_text()) == {
+            "bomFormat": "CycloneDX",
+            "components": [{"bom-ref": "ref-0"}, {"bom-ref": "ref-1"}, {"bom-ref": "ref-2"}]
+        }
+
+
+class TestDumpStreamed:
+    """Tests pour la fonction dump_streamed"""
+    
+    def test_identical_to_json_dump(self, tmp_path):
+        """Test sortie identique à json.dump(indent=2), flux imbriqués compris"""
+        document = {
+            "generated_at": "2026-01-01T00:00:00Z",
+            "sources": {"uuid-1": {"name": "é"}, "uuid-2": {"name": "b"}},
+            "items": [{"id": 1, "tags": ["a"]}, {"id": 2, "tags": []}],
+            "empty": {},
+            "nested": {"refs": {"uuid-1": ["CVE-1"]}, "counts": {"high": 2}},
+        }
+        expected = tmp_path / "expected.json"
+        with open(expected, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2, ensure_ascii=False)
+        
+        streamed = {
+            "generated_at": document["generated_at"],
+            "sources": JsonObjectStream(document["sources"]),
+            "items": JsonArrayStream(iter(document["items"])),
+            "empty": JsonObjectStream(iter([])),
+            "nested": {"refs": JsonObjectStream(document["nested"]["refs"]), "counts": {"high": 2}},
+        }
+        output = tmp_path / "output.json"
+        with open(output, "w", encoding="utf-8") as f:
+            dump_streamed(JsonObjectStream(streamed.items()), f)
+        
+        assert output.read_bytes() == expected.read_bytes()
+
+
+class TestSbomReader:
+    """Tests pour la classe SbomReader"""
+    
+    @pytest.fixture
+    def indexed_sbom(self, tmp_path, sample_merged_sbom):
+        output = tmp_path / "merged-sbom.cdx.json"
+        write_sbom(sample_merged_sbom, output, index_path_for(output))
+        return output
+    
+    def test_component_by_ref(self, indexed_sbom, sample_merged_sbom):
+        """Test lecture d'un composant par bom-ref"""
+        with SbomReader(indexed_sbom) as reader:
+            assert reader.component("uuid-2") == sample_merged_sbom["components"][1]
+            assert reader.component("missing") is None
+    
+    def test_component_by_purl(self, indexed_sbom):
+        """Test lecture des composants par purl"""
+        with SbomReader(indexed_sbom) as reader:
+            result = reader.components_by_purl("pkg:pypi/flask@2.3.0")
+        
+        assert [c["bom-ref"] for c in result] == ["uuid-1"]
+    
+    def test_vulnerability_by_id(self, indexed_sbom):
+        """Test lecture d'une vulnérabilité par id"""
+        with SbomReader(indexed_sbom) as reader:
+            result = reader.vulnerability("CVE-2023-0001")
+        
+        assert result["description"] == "ligne 1\nligne 2"
+    
+    def test_stale_index(self, indexed_sbom):
+        """Test index obsolète détecté"""
+        indexed_sbom.write_text("{}")
+        
+        with pytest.raises(StaleIndexError):
+            SbomReader(indexed_sbom)
+    
+    def test_stale_index_same_size(self, indexed_sbom):
+        """Test SBOM réécrit à taille identique, mtime conservé : octets de tête/fin vérifiés"""
+        content = indexed_sbom.read_bytes()
+        stat = indexed_sbom.stat()
+        indexed_sbom.write_bytes(content.replace(b"2.3.0", b"2.3.1", 1))
+        os.utime(indexed_sbom, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        
+        with pytest.raises(StaleIndexError):
+            SbomReader(indexed_sbom)
+    
+    def test_index_copied_with_new_mtime(self, indexed_sbom, tmp_path):
+        """Test SBOM et index copiés (artifact d'un autre job) avec un nouveau mtime : l'index reste utilisable"""
+        copy_dir = tmp_path / "artifact"
+        copy_dir.mkdir()
+        copy = copy_dir / indexed_sbom.name
+        for source, target in ((indexed_sbom, copy), (index_path_for(indexed_sbom), index_path_for(copy))):
+            shutil.copyfile(source, target)
+            os.utime(target, ns=(0, source.stat().st_mtime_ns + 3_600_000_000_000))
+        
+        with SbomReader(copy) as reader:
+            assert reader.vulnerability("CVE-2023-0001")["description"] == "ligne 1\nligne 2"
+    
+    def test_index_of_another_sbom(self, indexed_sbom):
+        """Test index d'un autre SBOM (nom enregistré différent) refusé"""
+        copy = indexed_sbom.with_name("other-sbom.cdx.json")
+        shutil.copy2(indexed_sbom, copy)
+        
+        with pytest.raises(StaleIndexError):
+            SbomReader(copy, index_path_for(indexed_sbom))
+    
+    def test_missing_index(self, tmp_path):
+        """Test index absent"""
+        sbom_file = tmp_path / "merged-sbom.cdx.json"
+        sbom_file.write_text("{}")
+        
+        with pytest.raises(FileNotFoundError):
+            SbomReader(sbom_file)
@@ -0,0 +1,132 @@
+"""Tests unitaires pour slim_sbom.py"""
+import pytest
+from pathlib import Path
+import json
+
+from slim_sbom import slim_sbom, restore_sbom, text_store_path_for, write_slim_sbom, load_full_sbom
+from slim_sbom import TextStoreWriter, owns_text_store, slim_vulnerability
+from sbom_io import write_sbom
+
+
+@pytest.fixture
+def sbom_with_vulns():
+    advisories = [{"url": "https://example.com/advisory"}]
+    return {
+        "bomFormat": "CycloneDX",
+        "serialNumber": "urn:uuid:00000000-0000-4000-8000-000000000001",
+        "components": [{"bom-ref": "uuid-1", "name": "curl"}],
+        "vulnerabilities": [
+            {
+                "id": "CVE-2023-0001",
+                "description": "Texte partagé " * 50,
+                "advisories": advisories,
+                "affects": [{"ref": "uuid-1"}]
+            },
+            {
+                "id": "CVE-2023-0002",
+                "description": "Texte partagé " * 50,
+                "advisories": advisories,
+                "references": [{"id": "GHSA-xxxx", "source": {"name": "GitHub"}}],
+                "properties": [{"name": "custom", "value": "1"}],
+                "affects": [{"ref": "uuid-1"}]
+            },
+            {"id": "CVE-2023-0003", "affects": []}
+        ]
+    }
+
+
+class TestSlimSbom:
+    """Tests pour les fonctions slim_sbom / restore_sbom"""
+    
+    def test_heavy_fields_removed(self, sbom_with_vulns):
+        """Test les champs volumineux sont retirés"""
+        slim, _ = slim_sbom(sbom_with_vulns)
+        
+        for vuln in slim["vulnerabilities"]:
+            assert "description" not in vuln
+            assert "advisories" not in vuln
+            assert "references" not in vuln
+    
+    def test_texts_stored_once(self, sbom_with_vulns):
+        """Test chaque texte unique n'est stocké qu'une fois"""
+        _, store = slim_sbom(sbom_with_vulns)
+        
+        # description partagée + advisories partagés + references
+        assert len(store["texts"]) == 3
+    
+    def test_round_trip(self, sbom_with_vulns):
+        """Test aller-retour sans perte"""
+        original = json.loads(json.dumps(sbom_with_vulns))
+        
+        restored = restore_sbom(*slim_sbom(sbom_with_vulns))
+        
+        assert restored == original
+    
+    def test_input_not_modified(self, sbom_with_vulns):
+        """Test le SBOM d'entrée n'est pas modifié"""
+        original = json.loads(json.dumps(sbom_with_vulns))
+        
+        slim_sbom(sbom_with_vulns)
+        
+        assert sbom_with_vulns == original
+    
+    def test_missing_text(self, sbom_with_vulns):
+        """Test erreur explicite si un texte manque dans le store"""
+        slim, _ = slim_sbom(sbom_with_vulns)
+        
+        with pytest.raises(KeyError):
+            restore_sbom(slim, {"texts": {}})
+    
+    def test_sbom_without_vulnerabilities(self):
+        """Test SBOM sans vulnérabilités"""
+        sbom = {"components": []}
+        
+        slim, store = slim_sbom(sbom)
+        
+        assert slim == sbom
+        assert store == {"texts": {}}
+
+
+class TestSlimFiles:
+    """Tests pour l'écriture et la relecture des fichiers allégés"""
+    
+    def test_text_store_path_for(self):
+        """Test nom du fichier annexe, hors motif *.cdx.json"""
+        result = text_store_path_for(Path("sbom/merged-sbom.cdx.json"))
+        
+        assert result == Path("sbom/merged-sbom.vuln-text.json")
+    
+    def test_write_and_load_full(self, tmp_path, sbom_with_vulns):
+        """Test écriture allégée puis relecture complète"""
+        original = json.loads(json.dumps(sbom_with_vulns))
+        output = tmp_path / "merged-sbom.cdx.json"
+        
+        write_slim_sbom(sbom_with_vulns, output)
+        
+        assert text_store_path_for(output).exists()
+        assert "Texte partagé" not in output.read_text()
+        assert load_full_sbom(output) == original
+    
+    def test_streamed_store_identical(self, tmp_path, sbom_with_vulns):
+        """Test écriture en flux du fichier annexe identique à write_slim_sbom"""
+        output = tmp_path / "merged-sbom.cdx.json"
+        slim = write_slim_sbom(sbom_with_vulns, output)
+        streamed = tmp_path / "streamed.vuln-text.json"
+        
+        with TextStoreWriter(streamed, sbom_with_vulns.get("serialNumber")) as store:
+            vulnerabilities = [slim_vulnerability(vuln, store) for vuln in sbom_with_vulns["vulnerabilities"]]
+        
+        assert vulnerabilities == slim["vulnerabilities"]
+        assert streamed.read_bytes() == text_store_path_for(output).read_bytes()
+    
+    def test_text_store_owned_by_sbom(self, tmp_path, sbom_with_vulns):
+        """Test le fichier annexe n'appartient qu'au SBOM écrit avec lui (même serialNumber)"""
+        output = tmp_path / "merged-sbom.cdx.json"
+        assert not owns_text_store(output.with_name("absent.cdx.json"))
+        write_slim_sbom(sbom_with_vulns, output)
+        
+        assert owns_text_store(output)
+        
+        # Nouvelle fusion sans --slim : le fichier annexe précédent est orphelin
+        write_sbom(dict(sbom_with_vulns, serialNumber="urn:uuid:00000000-0000-4000-8000-000000000002"), output)
+        assert not owns_text_store(output)
@@ -0,0 +1,56 @@
+"""Tests unitaires pour spill_store.py"""
+import pytest
+from pathlib import Path
+
+from spill_store import SpillDict
+from component_model import SourceInfo
+
+
+class TestSpillDict:
+    """Tests pour la classe SpillDict"""
+    
+    def test_in_memory_below_threshold(self, tmp_path):
+        """Test aucun fichier créé sous le seuil"""
+        with SpillDict(10, tmp_path) as store:
+            store["a"] = 1
+            store["b"] = 2
+            
+            assert not store.spilled
+            assert store["a"] == 1
+            assert list(tmp_path.iterdir()) == []
+    
+    def test_spills_past_threshold(self, tmp_path):
+        """Test bascule sur disque au-delà du seuil, contenu et ordre conservés"""
+        with SpillDict(2, tmp_path) as store:
+            for key in ("c", "a", "b", "d"):
+                store[key] = [key]
+            store["a"] = ["a2"]
+            
+            assert store.spilled
+            assert len(store) == 4
+            assert store["a"] == ["a2"]
+            assert "d" in store and "z" not in store
+            assert store.get("z") is None
+            assert list(store.items()) == [("c", ["c"]), ("a", ["a2"]), ("b", ["b"]), ("d", ["d"])]
+        
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_tuple_keys_and_setdefault(self, tmp_path):
+        """Test clés tuple et setdefault (première valeur conservée)"""
+        with SpillDict(1, tmp_path) as store:
+            store.setdefault(("CVE-1", "uuid-1"), "1.0")
+            store.setdefault(("CVE-1", "uuid-2"), "2.0")
+            store.setdefault(("CVE-1", "uuid-1"), "9.9")
+            
+            assert store.get(("CVE-1", "uuid-1")) == "1.0"
+            assert store.get(("CVE-1", "uuid-2")) == "2.0"
+    
+    def test_value_type(self, tmp_path):
+        """Test reconstruction des enregistrements compacts"""
+        with SpillDict(0, tmp_path, value_type=SourceInfo) as store:
+            store["uuid-1"] = SourceInfo("docker-image", "Dockerfile (api)")
+            
+            assert store["uuid-1"] == SourceInfo("docker-image", "Dockerfile (api)")
+        
+        with pytest.raises(KeyError):
+            store["uuid-1"]
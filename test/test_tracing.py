@@ -0,0 +1,99 @@
+"""Tests unitaires pour tracing.py"""
+import json
+
+import pytest
+
+import tracing
+from tracing import NULL_SPAN, enable_tracing, span, summarize, write_trace
+from test.fake_tools import FakeTools, run_pipeline, write_repository
+
+
+@pytest.fixture(autouse=True)
+def no_tracer():
+    tracing.disable_tracing()
+    yield
+    tracing.disable_tracing()
+
+
+class TestTracer:
+    """Tests pour Tracer et span()"""
+
+    def test_disabled_by_default(self):
+        """Test sans traçage actif : étape nulle partagée, rien n'est enregistré"""
+        with span("merge", sboms=3) as s:
+            s.set(components=10)
+
+        assert s is NULL_SPAN
+
+    def test_nested_spans_and_attributes(self):
+        """Test attributs initiaux et ajoutés, imbrication, erreur enregistrée"""
+        tracer = enable_tracing()
+        with span("merge", sboms=2) as outer:
+            with span("parse_sbom", file="a.cdx.json"):
+                pass
+            outer.set(components=5)
+        with pytest.raises(ValueError):
+            with span("write_sbom"):
+                raise ValueError("disque plein")
+
+        spans = {s.name: s for s in tracer.spans}
+        assert spans["merge"].attributes == {"sboms": 2, "components": 5}
+        assert spans["merge"].start_us <= spans["parse_sbom"].start_us
+        assert spans["parse_sbom"].start_us + spans["parse_sbom"].duration_us <= \
+            spans["merge"].start_us + spans["merge"].duration_us
+        assert spans["write_sbom"].attributes == {"error": "ValueError"}
+
+    def test_summarize(self):
+        """Test agrégation par processus et par étape, durée totale décroissante"""
+        events = [
+            {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "trivy_scan"}},
+            {"name": "scan_image", "ph": "X", "pid": 1, "ts": 0, "dur": 3000},
+            {"name": "scan_image", "ph": "X", "pid": 1, "ts": 5000, "dur": 1000},
+            {"name": "discovery", "ph": "X", "pid": 1, "ts": 0, "dur": 10},
+        ]
+
+        assert summarize(events) == [
+            ("trivy_scan", "scan_image", 2, 4000, 3000),
+            ("trivy_scan", "discovery", 1, 10, 10),
+        ]
+
+
+class TestWriteTrace:
+    """Tests pour l'export Chrome trace"""
+
+    def test_append_and_reset(self, tmp_path):
+        """Test les scripts s'ajoutent à la même trace ; reset repart de zéro"""
+        enable_tracing()
+        with span("discovery"):
+            pass
+        write_trace(tmp_path, "trivy_scan", reset=True)
+        tracing.disable_tracing()
+        enable_tracing()
+        with span("merge"):
+            pass
+        trace_path = write_trace(tmp_path, "merge_sbom")
+
+        trace = json.loads(trace_path.read_text(encoding="utf-8"))
+        assert [e["name"] for e in trace["traceEvents"] if e["ph"] == "X"] == ["discovery", "merge"]
+        assert [e["args"]["name"] for e in trace["traceEvents"] if e["ph"] == "M"] == ["trivy_scan", "merge_sbom"]
+        assert "merge_sbom" in (tmp_path / "trace-summary.txt").read_text(encoding="utf-8")
+
+        write_trace(tmp_path, "trivy_scan", reset=True)
+        trace = json.loads(trace_path.read_text(encoding="utf-8"))
+        assert [e["name"] for e in trace["traceEvents"] if e["ph"] == "X"] == ["merge"]
+
+    def test_pipeline_trace(self, tmp_path):
+        """Test --trace sur les trois scripts (docker/trivy simulés) : une étape par phase du pipeline"""
+        repo = tmp_path / "repo"
+        write_repository(repo, lockfiles=2, dockerfiles=1)
+        run_pipeline(repo, FakeTools(tmp_path / "bin").install(), "--trace")
+
+        events = json.loads((repo / "sbom" / "trace.json").read_text(encoding="utf-8"))["traceEvents"]
+        names = {event["name"] for event in events if event["ph"] == "X"}
+        assert {
+            "discovery", "scan_dependency_file", "docker_build", "scan_image", "runtime_probe", "remove_image",
+            "parse_sbom", "merge", "write_sbom", "load_source_sboms", "enrichment", "trivy_sbom",
+            "categorize", "vulnerabilities", "write_metadata",
+        } <= names
+        scans = [event["args"] for event in events if event["name"] == "scan_dependency_file"]
+        assert {"file", "components", "bytes_written"} <= scans[0].keys()
@@ -3,8 +3,13 @@ import pytest
 from pathlib import Path
 import tempfile
 import shutil
+import subprocess
 
-from trivy_scan import extract_build_args, find_dockerfiles, find_dependency_files
+import json
+
+import trivy_scan
+from trivy_scan import dependency_sbom_name, extract_build_args, find_dockerfiles, find_dependency_files, run_scan
+from policy import Policy
 
 
 class TestExtractBuildArgs:
@@ -219,3 +224,101 @@ class TestFindDependencyFiles:
         result = find_dependency_files(tmp_path)
         
         assert len(result) == 0
+
+
+class TestRunScan:
+    """Tests pour la fonction run_scan (docker simulé)"""
+    
+    @pytest.fixture
+    def project(self, tmp_path, monkeypatch):
+        (tmp_path / "requirements.txt").write_text("flask==2.3.0\n")
+        (tmp_path / "api").mkdir()
+        (tmp_path / "api" / "Dockerfile").write_text("FROM python:3.13\n")
+        commands = []
+        
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            if "--output" in cmd:
+                output = tmp_path / cmd[cmd.index("--output") + 1][len("/project/"):]
+                vulnerabilities = []
+                if cmd[-1].endswith("requirements.txt"):
+                    vulnerabilities = [{"id": "CVE-1", "ratings": [{"severity": "critical"}],
+                                        "affects": [{"ref": "pkg:pypi/flask@2.3.0"}]}]
+                output.write_text(json.dumps({"components": [], "vulnerabilities": vulnerabilities}))
+            return subprocess.CompletedProcess(cmd, 0, "", "")
+        
+        monkeypatch.setattr(trivy_scan.subprocess, "run", fake_run)
+        monkeypatch.setattr(trivy_scan, "detect_runtime_components", lambda image_tag: [])
+        return tmp_path, commands
+    
+    def test_without_policy(self, project):
+        """Test toutes les sources sont analysées sans politique"""
+        root_dir, commands = project
+        
+        assert run_scan(root_dir) == 0
+        assert (root_dir / "sbom" / "api-image.cdx.json").exists()
+        assert not (root_dir / "sbom" / "policy-report.json").exists()
+    
+    def test_nested_dependency_files_annotated(self, project):
+        """Test un SBOM par chemin (pas d'écrasement) annoté avec le fichier scanné"""
+        root_dir, commands = project
+        (root_dir / "web").mkdir()
+        (root_dir / "web" / "requirements.txt").write_text("django==5.0\n")
+        
+        assert run_scan(root_dir) == 0
+        
+        for sbom_name, source_file in [("requirements.txt.cdx.json", "requirements.txt"),
+                                       ("web__requirements.txt.cdx.json", "web/requirements.txt")]:
+            sbom = json.loads((root_dir / "sbom" / sbom_name).read_text())
+            assert sbom["metadata"]["properties"] == [{"name": "fulltrivyscan:SourceFile", "value": source_file}]
+    
+    def test_dependency_sbom_names_distinct(self):
+        """Test noms de SBOM distincts pour des chemins qui ne diffèrent que par / et _"""
+        paths = ["a__b/x.lock", "a/b__x.lock", "a_/_b/x.lock", "a/_/b/x.lock", "my_service/go.sum"]
+        names = [dependency_sbom_name(path) for path in paths]
+        
+        assert len(set(names)) == len(paths)
+        assert dependency_sbom_name("api/requirements.txt") == "api__requirements.txt.cdx.json"
+        assert names[-1] == "my_-service__go.sum.cdx.json"
+    
+    def test_policy_stops_early(self, project):
+        """Test arrêt dès la première violation, sans build des images"""
+        root_dir, commands = project
+        
+        assert run_scan(root_dir, Policy("critical")) == 1
+        
+        assert not any(cmd[:2] == ["docker", "build"] for cmd in commands)
+        report = json.loads((root_dir / "sbom" / "policy-report.json").read_text())
+        assert report["status"] == "failed"
+        assert report["not_scanned"] == [{"kind": "dockerfile", "source": "api/Dockerfile"}]
+    
+    def test_policy_passes(self, project):
+        """Test rapport passed quand la vulnérabilité est autorisée"""
+        root_dir, commands = project
+        
+        assert run_scan(root_dir, Policy("critical", allow={"CVE-1"})) == 0
+        
+        report = json.loads((root_dir / "sbom" / "policy-report.json").read_text())
+        assert report["status"] == "passed"
+        assert len(report["scanned"]) == 2
+    
+    def test_native_lockfiles_skip_trivy_fs(self, project):
+        """Test --native-lockfiles : requirements.txt lu sans conteneur, SBOM annoté"""
+        root_dir, commands = project
+        
+        assert run_scan(root_dir, native_lockfiles=True) == 0
+        
+        assert not any(cmd[-1].endswith("requirements.txt") for cmd in commands)
+        sbom = json.loads((root_dir / "sbom" / "requirements.txt.cdx.json").read_text())
+        assert [c["purl"] for c in sbom["components"]] == ["pkg:pypi/flask@2.3.0"]
+        assert sbom["metadata"]["properties"] == [{"name": "fulltrivyscan:SourceFile", "value": "requirements.txt"}]
+    
+    def test_native_lockfiles_with_policy_use_trivy(self, project):
+        """Test --native-lockfiles avec --fail-on : lockfiles scannés par Trivy, la politique voit leurs vulnérabilités"""
+        root_dir, commands = project
+        
+        assert run_scan(root_dir, Policy("critical"), native_lockfiles=True) == 1
+        
+        assert any(cmd[-1].endswith("requirements.txt") for cmd in commands)
+        report = json.loads((root_dir / "sbom" / "policy-report.json").read_text())
+        assert [v["vulnerability_id"] for v in report["violations"]] == ["CVE-1"]